@@ -0,0 +1,154 @@
+"""
+End-to-end benchmark of one discovery run over a replayed corpus.
+
+    python bench/bench_replay.py [--sizes 100,1000,10000,100000] [--api-latency-ms 20] [--page-latency-ms 50]
+    python bench/bench_replay.py --corpus data/replay [--post]
+
+Each size gets a synthetic corpus (tweets with repeats of the same project,
+scam and link-less tweets, pages that verify / point at the wrong account /
+carry no handle / 404) and a fresh scratch database, then goes through
+bot.run() with the replay clients and page fetcher. Reports candidates per
+second, DB rows written and commits, X API calls, page fetches and per-stage
+latency from the run report. --corpus benchmarks a recorded corpus instead.
+"""
+from __future__ import annotations
+import argparse
+import contextlib
+import dataclasses
+import io
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+from src.bot import run  # noqa: E402
+from src.config import load_cfg  # noqa: E402
+from src.db import connect  # noqa: E402
+from src.replay import Corpus, ReplayAdapter, replay_clients, replay_http  # noqa: E402
+from src import instrument  # noqa: E402
+
+TWITTER_EPOCH_MS = 1288834974657
+STAGES = ("search", "search_page", "filter", "verify_wave", "fetch_page", "handle_lookup", "scoring", "db_flush",
+          "card_render", "media_upload", "create_tweet")
+
+
+def synthetic(n: int) -> Corpus:
+    """n tweets over n/4 projects; a third of the projects verify, a third point at the wrong account."""
+    c = Corpus()
+    base = (int(time.time() * 1000) - TWITTER_EPOCH_MS) << 22
+    projects = max(1, n // 4)
+    for p in range(projects):
+        dom = f"proj{p}.xyz"
+        c.add_user({"id": str(10_000_000 + p), "username": f"proj{p}", "url": f"https://{dom}",
+                    "description": f"official {dom}"})
+        if p % 10 == 9:
+            continue  # page 404s
+        if p % 3 == 0:
+            head = f"<meta name='twitter:site' content='@proj{p}'>"
+        elif p % 3 == 1:
+            head = f"<meta name='twitter:site' content='@fan{p % 50}'>"
+        else:
+            head = ""
+        c.add_page(f"https://{dom}", f"<html><head><title>{dom}</title>{head}</head><body>{'docs ' * 200}</body></html>",
+                   etag=f'W/"{p}"')
+    for u in range(50):
+        c.add_user({"id": str(20_000_000 + u), "username": f"fan{u}", "description": "airdrop hunter"})
+    for k in range(n):
+        p = k % projects
+        dom = f"proj{p}.xyz"
+        if k % 17 == 0:
+            text = f"PROJ{p} airdrop: send eth to claim https://{dom}"
+        elif k % 13 == 0:
+            text = f"PROJ{p} airdrop soon, link in bio"
+        elif k % 11 == 0:
+            text = f"PROJ{p} airdrop live https://bit.ly/p{p}"
+        else:
+            text = f"PROJ{p} airdrop live #{k}! official docs quest points snapshot https://{dom}"
+        urls = [{"expanded_url": u, "url": "https://t.co/x"} for u in text.split() if u.startswith("https://")]
+        c.add_payload({"data": {"id": str(base + k), "author_id": str(20_000_000 + k % 50), "text": text,
+                                "entities": {"urls": urls} if urls else None}})
+    return c
+
+
+class WriteCounter:
+    """sqlite trace callback counting commits."""
+
+    def __init__(self):
+        self.commits = 0
+
+    def __call__(self, sql: str) -> None:
+        if sql.lstrip().upper().startswith("COMMIT"):
+            self.commits += 1
+
+
+def bench(cfg, corpus: Corpus, api_latency_s: float, page_latency_s: float) -> dict:
+    with tempfile.TemporaryDirectory() as tmp:
+        cfg = dataclasses.replace(cfg, results_per_run=len(corpus.tweets),
+                                  run_report_path=str(Path(tmp) / "report.json"), prom_textfile_path="")
+        conn = connect(Path(tmp) / "bench.sqlite3")
+        writes = WriteCounter()
+        conn.set_trace_callback(writes)
+        clients = replay_clients(corpus, api_latency_s)
+        http = replay_http(cfg, corpus, page_latency_s)
+        adapter = http.session.get_adapter("https://")
+        changes = conn.total_changes
+        t0 = time.perf_counter()
+        with contextlib.redirect_stdout(io.StringIO()):
+            run(cfg, clients, conn, http, scheduled=False)
+        secs = time.perf_counter() - t0
+        rows = conn.total_changes - changes
+        conn.close()
+        http.close()
+    report = instrument.current().report()
+    return {
+        "tweets": len(corpus.tweets), "secs": secs, "rows": rows, "commits": writes.commits,
+        "api": sum(clients[0].limiter.calls.values()),
+        "pages": adapter.requests if isinstance(adapter, ReplayAdapter) else 0,
+        "stages": report["stages"], "counters": report["counters"],
+    }
+
+
+def main() -> int:
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--sizes", default="100,1000,10000,100000")
+    ap.add_argument("--corpus", type=Path, help="recorded corpus (directory or SQLite capture) instead of synthetic")
+    ap.add_argument("--api-latency-ms", type=float, default=20.0)
+    ap.add_argument("--page-latency-ms", type=float, default=50.0)
+    ap.add_argument("--post", action="store_true", help="post through the fake write client instead of DRY_RUN")
+    a = ap.parse_args()
+
+    cfg = dataclasses.replace(load_cfg(), dry_run=not a.post, queue_max_per_run=0, weekly_digest=False,
+                              sponsored_mode=False, metrics_enabled=True)
+    if a.corpus:
+        runs = [("corpus", lambda: Corpus.load(a.corpus))]
+    else:
+        runs = [(s, lambda s=s: synthetic(int(s))) for s in a.sizes.split(",") if s.strip()]
+
+    print(f"api latency {a.api_latency_ms:g} ms, page latency {a.page_latency_ms:g} ms, "
+          f"verify concurrency {cfg.verify_concurrency}, search concurrency {cfg.search_concurrency}")
+    print(f"{'tweets':>8} {'secs':>8} {'cand/s':>9} {'db rows':>8} {'commits':>8} {'api':>6} {'pages':>6}  "
+          f"posted/queued/rejected")
+    results = []
+    for _, make in runs:
+        r = bench(cfg, make(), a.api_latency_ms / 1000, a.page_latency_ms / 1000)
+        results.append(r)
+        ctr = r["counters"]
+        queued = sum(n for k, n in ctr.items() if k.startswith("queued_"))
+        rejected = sum(n for k, n in ctr.items() if k.startswith("reject_"))
+        posted = ctr.get("posted", 0) + ctr.get("dry_run_post", 0)
+        print(f"{r['tweets']:>8} {r['secs']:>8.2f} {r['tweets'] / r['secs']:>9,.0f} {r['rows']:>8} "
+              f"{r['commits']:>8} {r['api']:>6} {r['pages']:>6}  {posted}/{queued}/{rejected}")
+
+    for r in results:
+        print(f"\nstages @ {r['tweets']} tweets{'':<10}{'count':>8} {'p50 ms':>9} {'p95 ms':>9} {'total ms':>10}")
+        for name in STAGES:
+            s = r["stages"].get(name)
+            if s:
+                print(f"  {name:<30}{s['count']:>8} {s['p50_ms']:>9.2f} {s['p95_ms']:>9.2f} {s['total_ms']:>10.1f}")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
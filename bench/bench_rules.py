@@ -0,0 +1,99 @@
+"""
+Micro-benchmark for the scoring rule engine.
+
+    python bench/bench_rules.py [--tweets 10000] [--rules 1000]
+
+Builds a synthetic rule set (block phrases, hints, penalties) and a corpus of
+tweet-sized texts, then reports per-tweet cost of RuleSet (word-level index:
+one tokenization, each token probes only the patterns starting with it)
+against the naive per-rule substring loop it replaced.
+"""
+from __future__ import annotations
+import argparse
+import random
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+from src.rules import RuleSet  # noqa: E402
+
+VOCAB = [
+    "airdrop", "testnet", "points", "quest", "snapshot", "claim", "wallet", "bridge", "swap", "stake",
+    "official", "docs", "blog", "github", "mirror", "season", "rewards", "campaign", "early", "users",
+    "link", "dm", "join", "discord", "mainnet", "token", "eligible", "farm", "galxe", "zealy",
+]
+
+
+def make_rules(n: int, rng: random.Random) -> dict:
+    words = [f"w{k}" for k in range(n)]
+    n_block = n // 4
+    n_pen = n // 10
+    return {
+        "block": [f"{w} fee" for w in words[:n_block]],
+        "hints": [{"pattern": w, "weight": rng.randint(1, 8)} for w in words[n_block:n - n_pen]],
+        "penalties": [{"pattern": w, "weight": -rng.randint(1, 8), "unless": ["link*"]} for w in words[n - n_pen:]],
+    }
+
+
+def make_tweets(n: int, n_rules: int, rng: random.Random) -> list[str]:
+    out = []
+    for k in range(n):
+        toks = [rng.choice(VOCAB) for _ in range(rng.randint(15, 45))]
+        for _ in range(rng.randint(0, 3)):
+            toks.insert(rng.randrange(len(toks)), f"w{rng.randrange(n_rules)}")
+        out.append(" ".join(toks) + f" #{k} https://p{k}.xyz")
+    return out
+
+
+def naive(spec: dict, text: str, url: str, verified: bool) -> tuple[bool, int]:
+    t = text.lower()
+    if any(p in t for p in spec["block"]):
+        return True, 0
+    s = 50 + (20 if verified else 0)
+    for h in spec["hints"]:
+        if h["pattern"] in t:
+            s += h["weight"]
+    for p in spec["penalties"]:
+        if p["pattern"] in t and "link" not in t:
+            s += p["weight"]
+    return False, max(0, min(100, s))
+
+
+def main() -> int:
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--tweets", type=int, default=10_000)
+    ap.add_argument("--rules", type=int, default=1_000)
+    ap.add_argument("--seed", type=int, default=7)
+    a = ap.parse_args()
+
+    rng = random.Random(a.seed)
+    spec = make_rules(a.rules, rng)
+    tweets = make_tweets(a.tweets, a.rules, rng)
+
+    t0 = time.perf_counter()
+    rs = RuleSet(spec)
+    compile_s = time.perf_counter() - t0
+
+    t0 = time.perf_counter()
+    for k, t in enumerate(tweets):
+        if not rs.blocked(t):
+            rs.score(t, f"https://p{k}.xyz", k % 2 == 0)
+    engine_s = time.perf_counter() - t0
+
+    t0 = time.perf_counter()
+    for k, t in enumerate(tweets):
+        naive(spec, t, f"https://p{k}.xyz", k % 2 == 0)
+    naive_s = time.perf_counter() - t0
+
+    n = len(tweets)
+    print(f"rules={a.rules} tweets={n}")
+    print(f"compile          {compile_s * 1e3:9.1f} ms")
+    print(f"RuleSet          {engine_s * 1e6 / n:9.1f} us/tweet  ({n / engine_s:,.0f} tweets/s)")
+    print(f"naive substring  {naive_s * 1e6 / n:9.1f} us/tweet  ({n / naive_s:,.0f} tweets/s)")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,159 @@
+"""
+Local stand-in for the X v2 filtered stream, for exercising MODE=stream.
+
+    python bench/fake_stream.py --file recorded.jsonl [--port 8765] [--rate 20]
+    python bench/fake_stream.py --synthetic 200 --disconnect-after 50
+
+    STREAM_BASE_URL=http://127.0.0.1:8765 MODE=stream DRY_RUN=1 python run_bot.py
+
+--file holds one recorded stream payload per line ({"data": {...},
+"includes": {"users": [...]}}, exactly as the stream sends them). Tweets
+are replayed once, in order, across reconnects; keep-alive newlines are
+sent while idle. --disconnect-after drops the connection every N tweets to
+test reconnects. /2/tweets/search/stream/rules keeps rules in memory.
+"""
+from __future__ import annotations
+import argparse
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+
+STREAM_PATH = "/2/tweets/search/stream"
+TWITTER_EPOCH_MS = 1288834974657
+
+
+def synthetic(n: int) -> list[dict]:
+    base = ((int(time.time() * 1000) - TWITTER_EPOCH_MS) << 22)
+    out = []
+    for k in range(n):
+        dom = f"proj{k}.xyz"
+        out.append({
+            "data": {
+                "id": str(base + k), "author_id": str(k + 1),
+                "text": f"PROJ{k} airdrop live! official docs quest points snapshot https://{dom}",
+                "entities": {"urls": [{"expanded_url": f"https://{dom}", "url": "https://t.co/x"}]},
+            },
+            "includes": {"users": [{"id": str(k + 1), "username": f"proj{k}", "url": f"https://{dom}"}]},
+            "matching_rules": [{"id": "1", "tag": "kw:synthetic"}],
+        })
+    return out
+
+
+class State:
+    def __init__(self, payloads: list[dict], rate: float, disconnect_after: int, keepalive_s: float):
+        self.payloads = payloads
+        self.rate = rate
+        self.disconnect_after = disconnect_after
+        self.keepalive_s = keepalive_s
+        self.cursor = 0
+        self.lock = threading.Lock()
+        self.rules: dict[str, dict] = {}
+        self.next_rule = 1
+
+    def take(self) -> dict | None:
+        with self.lock:
+            if self.cursor >= len(self.payloads):
+                return None
+            p = self.payloads[self.cursor]
+            self.cursor += 1
+            return p
+
+
+def handler(state: State):
+    class H(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def log_message(self, *a):
+            pass
+
+        def _json(self, code: int, body: dict) -> None:
+            raw = json.dumps(body).encode()
+            self.send_response(code)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(raw)))
+            self.end_headers()
+            self.wfile.write(raw)
+
+        def do_GET(self):
+            path = self.path.split("?")[0]
+            if path == STREAM_PATH + "/rules":
+                return self._json(200, {"data": list(state.rules.values()), "meta": {"result_count": len(state.rules)}})
+            if path != STREAM_PATH:
+                return self._json(404, {"title": "Not Found"})
+            self.send_response(200)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Transfer-Encoding", "chunked")
+            self.end_headers()
+            sent, idle = 0, time.monotonic()
+            try:
+                while True:
+                    p = state.take()
+                    if p is None:
+                        if time.monotonic() - idle >= state.keepalive_s:
+                            self._chunk(b"\r\n")
+                            idle = time.monotonic()
+                        time.sleep(0.05)
+                        continue
+                    self._chunk(json.dumps(p).encode() + b"\r\n")
+                    sent += 1
+                    idle = time.monotonic()
+                    if state.disconnect_after and sent >= state.disconnect_after:
+                        break
+                    if state.rate > 0:
+                        time.sleep(1.0 / state.rate)
+                self.wfile.write(b"0\r\n\r\n")
+            except (BrokenPipeError, ConnectionResetError):
+                pass
+            self.close_connection = True
+
+        def _chunk(self, data: bytes) -> None:
+            self.wfile.write(f"{len(data):x}\r\n".encode() + data + b"\r\n")
+            self.wfile.flush()
+
+        def do_POST(self):
+            if self.path.split("?")[0] != STREAM_PATH + "/rules":
+                return self._json(404, {"title": "Not Found"})
+            body = json.loads(self.rfile.read(int(self.headers.get("Content-Length") or 0)) or b"{}")
+            created = []
+            for r in body.get("add", []):
+                rid = str(state.next_rule)
+                state.next_rule += 1
+                state.rules[rid] = {"id": rid, "value": r["value"], "tag": r.get("tag")}
+                created.append(state.rules[rid])
+            for rid in (body.get("delete") or {}).get("ids", []):
+                state.rules.pop(str(rid), None)
+            return self._json(200, {"data": created, "meta": {"summary": {"created": len(created)}}})
+
+    return H
+
+
+def main() -> int:
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--file", type=Path)
+    ap.add_argument("--synthetic", type=int, default=0)
+    ap.add_argument("--port", type=int, default=8765)
+    ap.add_argument("--rate", type=float, default=20.0, help="tweets per second (0 = as fast as possible)")
+    ap.add_argument("--disconnect-after", type=int, default=0)
+    ap.add_argument("--keepalive", type=float, default=20.0)
+    a = ap.parse_args()
+
+    payloads = []
+    if a.file:
+        with open(a.file, "r", encoding="utf-8") as fh:
+            payloads = [json.loads(line) for line in fh if line.strip()]
+    payloads += synthetic(a.synthetic)
+
+    state = State(payloads, a.rate, a.disconnect_after, a.keepalive)
+    srv = ThreadingHTTPServer(("127.0.0.1", a.port), handler(state))
+    print(f"fake stream on http://127.0.0.1:{a.port}{STREAM_PATH} ({len(payloads)} tweets)")
+    try:
+        srv.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -1,10 +1,34 @@
 import os
 from src.config import load_cfg
-from src.bot import run, approve_and_post
+from src.bot import run, approve_and_post, maintain, rescore, stream
+from src.daemon import daemon
+from src.replay import replay, record
+from src.review import review_export, review_import
+from src.workers import produce, work
 
 if __name__ == "__main__":
     cfg = load_cfg()
     mode = os.getenv("MODE", "run").strip().lower()
     if mode == "approve":
         raise SystemExit(approve_and_post(cfg))
+    if mode == "maintain":
+        raise SystemExit(maintain(cfg))
+    if mode == "rescore":
+        raise SystemExit(rescore(cfg))
+    if mode == "stream":
+        raise SystemExit(stream(cfg))
+    if mode == "daemon":
+        raise SystemExit(daemon(cfg))
+    if mode == "replay":
+        raise SystemExit(replay(cfg))
+    if mode == "record":
+        raise SystemExit(record(cfg))
+    if mode == "review_export":
+        raise SystemExit(review_export(cfg))
+    if mode == "review_import":
+        raise SystemExit(review_import(cfg))
+    if mode == "produce":
+        raise SystemExit(produce(cfg))
+    if mode == "work":
+        raise SystemExit(work(cfg))
     raise SystemExit(run(cfg))
@@ -1,18 +1,33 @@
 from __future__ import annotations
+import requests
 import tweepy
 import datetime as _dt
+import time as _time
+import signal
+import threading
+from pathlib import Path
 
 from src.db import (
-    connect, mark_seen, has_dupe, insert_drop, mark_posted,
+    connect, filter_unseen, Batch, insert_drop, mark_posted, mark_drop_failed, count_posted_since,
     inc_post_counter, get_post_counter, top_recent_drops,
-    get_last_digest_day, set_last_digest_day, today_utc,
-    enqueue_review, log_metric, approve_top, pop_approved, remove_from_queue
+    get_last_digest_day, set_last_digest_day, today_utc, get_shard_stats, update_shard_stats,
+    get_meta, set_meta, prune, rescore_table,
+    log_metric, approve_top, pop_approved, remove_from_queue_by_key, remove_from_queue_many,
+    get_verify_cache, put_verify_cache_many, verify_cache_fresh, open_post_jobs, get_drop, find_drop,
+    queue_priority, expire_queue, reprioritize_queue, update_queue_verification, now
 )
-from src.x_search import search_candidates, extract_best_url
-from src.verify import host, is_https, is_shortener, is_social_only, domain_allowed, verify_official
-from src.scoring import hard_block, score as score_fn
+from src.x_search import build_queries, search_candidates, extract_best_url, matches_keywords, hold_back, SEARCH_PAGE_MAX
+from src.verify import host, is_https, is_shortener, is_social_only, domain_allowed, verify_many, USER_LOOKUP_BATCH
+from src.scoring import hard_block, score_batch
 from src.compose import build_thread, project_name_from_text, build_sponsored_thread, build_weekly_digest
-from src.posting import post_thread
+from src.posting import post_thread, prepare_media, resume_thread, PostAbandoned
+from src.card import gc_cards
+from src.net import HttpClient
+from src.config import load_accounts, account_prefix, ACCOUNT_ONLY
+from src.ratelimit import RateLimiter, Scheduled
+from src import instrument
+from src.x_stream import StreamClient, StreamIngestor, build_rules
+from src.dedup import DedupIndex, fingerprint, project_key, registrable_domain
 
 DAY_MAP = {"MON": 0, "TUE": 1, "WED": 2, "THU": 3, "FRI": 4, "SAT": 5, "SUN": 6}
 
@@ -34,34 +49,149 @@ def cta_line(cfg) -> str | None:
     return (cfg.cta_text + " " + cfg.link_hub_url).strip()
 
 
-def make_clients(cfg) -> tuple[tweepy.Client, tweepy.Client, tweepy.API]:
+def emit(cfg, sink, event: str, detail: str | None = None, **fields) -> None:
     """
-    read_client: bearer-token (search, lookups)
-    write_client: OAuth1 user context (create_tweet)
-    api_v1: OAuth1 for media upload (v1.1)
+    Count an event for the run report and, with METRICS_ENABLED, store it as
+    a metrics row (sink: a Batch or a connection). fields: name, score, ref, value.
+    """
+    instrument.count(event)
+    if not cfg.metrics_enabled:
+        return
+    if isinstance(sink, Batch):
+        sink.log_metric(event, detail, **fields)
+    else:
+        log_metric(sink, event, detail, **fields)
+
+
+def api_calls_since(limiter, before: dict[str, int]) -> dict[str, int]:
+    if limiter is None:
+        return {}
+    return {k: n - before.get(k, 0) for k, n in limiter.calls.items() if n - before.get(k, 0)}
+
+
+def write_report(cfg, rec: instrument.Recorder, api_calls: dict[str, int], **summary) -> dict:
+    """Run report (RUN_REPORT_PATH JSON, and PROM_TEXTFILE_PATH if set) for one run's recorder."""
+    report = rec.report(api_calls=api_calls, **summary)
+    try:
+        if cfg.run_report_path:
+            instrument.write_json(cfg.run_report_path, report)
+        if cfg.prom_textfile_path:
+            instrument.write_prometheus(cfg.prom_textfile_path, report)
+    except OSError as e:
+        print(f"Run report write failed: {e}")
+    return report
+
+
+def prefilter(cfg, c) -> tuple[str | None, str | None, str | None]:
+    """
+    Local (no network) checks. Returns (url, reject_event, reject_detail);
+    reject_event is None when the candidate should go on to verification.
+    """
+    if hard_block(c["text"]):
+        return None, "reject_hard_block", c["tweet_id"]
+
+    url = extract_best_url(c)
+    if not url:
+        return None, "reject_no_url", c["tweet_id"]
+
+    d = host(url)
+    if cfg.require_https and not is_https(url):
+        return url, "reject_not_https", url
+    if cfg.block_shorteners and is_shortener(d):
+        return url, "reject_shortener", d or ""
+    if cfg.reject_social_only and is_social_only(d):
+        return url, "reject_social_only", d or ""
+    if not domain_allowed(cfg.allowlist_domains, d):
+        return url, "reject_allowlist", d or ""
+    return url, None, None
+
+
+def author_profiles(candidates) -> dict[str, dict]:
+    """Profiles already returned by the search expansion, keyed by lower-case username."""
+    out = {}
+    for c in candidates:
+        p = c.get("author_profile")
+        if p and p.get("username"):
+            out[p["username"].lower()] = p
+    return out
+
+
+def verify_urls(cfg, conn, read_client, urls: list[str], known_profiles: dict[str, dict] | None = None,
+                http: HttpClient | None = None, max_age_h: float | None = None) -> list[tuple[bool, str | None, str | None] | None]:
+    """
+    verify_official for a batch of urls through verify_cache (max_age_h: also re-check older entries).
+    None for a url whose handle lookup was rate limited; it is not cached.
     """
+    by_domain = {}
+    jobs = []
+    for url in urls:
+        d = host(url)
+        if d in by_domain:
+            continue
+        row = get_verify_cache(conn, d)
+        if verify_cache_fresh(row, cfg.verify_ttl_ok_h, cfg.verify_ttl_neg_h, cfg.verify_ttl_err_h, max_age_h):
+            by_domain[d] = (bool(row["verified"]), d, row["handle"])
+            continue
+        by_domain[d] = None
+        jobs.append((url, row))
+
+    fresh = verify_many(read_client, jobs, cfg.verify_concurrency, known_profiles, cfg.fetch_max_bytes, http)
+    limited = {r["domain"] for r in fresh if r["outcome"] == "rate_limited"}
+    put_verify_cache_many(conn, [r for r in fresh if r["domain"] not in limited])
+    for r in fresh:
+        by_domain[r["domain"]] = (r["verified"], r["domain"], r["handle"])
+
+    return [None if host(url) in limited else by_domain.get(host(url)) or (False, host(url), None) for url in urls]
+
+
+def make_read_client(cfg, limiter: RateLimiter):
+    """Bearer-token (app-only) client for search and lookups."""
     if not cfg.bearer:
         raise ValueError("Missing X_BEARER_TOKEN")
+    return Scheduled(tweepy.Client(bearer_token=cfg.bearer, wait_on_rate_limit=False), limiter)
 
-    # Read/search client (app-only)
-    read_client = tweepy.Client(bearer_token=cfg.bearer, wait_on_rate_limit=True)
 
-    # Write client (user context) -> REQUIRED for posting
+def make_write_clients(cfg, limiter: RateLimiter):
+    """OAuth1 user-context clients: (write_client for create_tweet, api_v1 for media upload)."""
     if not (cfg.api_key and cfg.api_secret and cfg.access_token and cfg.access_secret):
-        raise ValueError("Missing OAuth1 keys (X_API_KEY/X_API_SECRET/X_ACCESS_TOKEN/X_ACCESS_SECRET)")
+        p = account_prefix(cfg.account) if cfg.account else ""
+        raise ValueError("Missing OAuth1 keys (" + "/".join(p + k for k in ACCOUNT_ONLY) + ")"
+                         + (f" for account {cfg.account}" if cfg.account else ""))
 
     write_client = tweepy.Client(
         consumer_key=cfg.api_key,
         consumer_secret=cfg.api_secret,
         access_token=cfg.access_token,
         access_token_secret=cfg.access_secret,
-        wait_on_rate_limit=True,
+        wait_on_rate_limit=False,
     )
 
     auth = tweepy.OAuth1UserHandler(cfg.api_key, cfg.api_secret, cfg.access_token, cfg.access_secret)
     api_v1 = tweepy.API(auth)
+    return Scheduled(write_client, limiter), Scheduled(api_v1, limiter)
 
-    return read_client, write_client, api_v1
+
+def make_clients(cfg) -> tuple[tweepy.Client, tweepy.Client, tweepy.API]:
+    """
+    read_client: bearer-token (search, lookups)
+    write_client: OAuth1 user context (create_tweet)
+    api_v1: OAuth1 for media upload (v1.1)
+    """
+    # one limiter for all three: per-endpoint budgets, posting waits, search/verification defer
+    limiter = RateLimiter()
+    return (make_read_client(cfg, limiter),) + make_write_clients(cfg, limiter)
+
+
+def make_http(cfg) -> HttpClient:
+    """Pooled client for official-page fetches, sized to the verification pool."""
+    return HttpClient(
+        pool_size=max(cfg.verify_concurrency, cfg.http_per_host),
+        connect_timeout=cfg.http_connect_timeout,
+        read_timeout=cfg.http_read_timeout,
+        total_timeout=cfg.http_total_timeout,
+        retries=cfg.http_retries,
+        per_host=cfg.http_per_host,
+    )
 
 
 def maybe_post_weekly_digest(cfg, conn, write_client, api_v1):
@@ -93,246 +223,692 @@ def maybe_post_weekly_digest(cfg, conn, write_client, api_v1):
     root_id = post_thread(
         write_client, api_v1, digest,
         cfg.card_title, "WEEKLY DIGEST", cfg.card_footer,
-        self_reply_enabled=False, self_reply_text=""
+        self_reply_enabled=False, self_reply_text="", conn=conn, job_key=f"digest:{today}"
     )
     set_last_digest_day(conn, today)
     inc_post_counter(conn)
-    if cfg.metrics_enabled:
-        log_metric(conn, "weekly_digest_posted", root_id)
+    emit(cfg, conn, "weekly_digest_posted", ref=root_id)
     print(f"Posted weekly digest root: {root_id}")
 
 
-def run(cfg) -> int:
-    try:
-        read_client, write_client, api_v1 = make_clients(cfg)
-    except Exception as e:
-        print(str(e))
-        return 2
+def posts_left_today(cfg, conn) -> int | None:
+    """What MAX_POSTS_PER_DAY (rolling 24h, drops posted from this database) still allows; None = no cap."""
+    if not cfg.max_posts_per_day:
+        return None
+    return max(0, cfg.max_posts_per_day - count_posted_since(conn, 24))
+
+
+def drop_failed(cfg, conn, job_key: str) -> None:
+    """The thread of an abandoned drop:<id> job will never go out: retire the drop and its queue item."""
+    kind, _, ref = job_key.partition(":")
+    drop = get_drop(conn, int(ref)) if kind == "drop" else None
+    if drop is None:
+        return
+    mark_drop_failed(conn, drop["id"])
+    remove_from_queue_by_key(conn, drop["dupe_key"])
+    emit(cfg, conn, "post_abandoned", name=drop["name"], ref=job_key)
+
+
+def resume_posts(cfg, conn, write_client, api_v1, before_post=None) -> int:
+    """Finish threads a previous run left incomplete. Returns how many were completed."""
+    done = 0
+    for job in open_post_jobs(conn):
+        key = job["job_key"]
+        try:
+            if before_post is not None:
+                before_post()
+            root_id = resume_thread(write_client, api_v1, conn, key)
+        except PostAbandoned as e:
+            drop_failed(cfg, conn, key)
+            print(f"Resume {key} failed: {e}")
+            continue
+        except Exception as e:
+            print(f"Resume {key} failed: {e}")
+            continue
+        kind, _, ref = key.partition(":")
+        if kind == "drop":
+            drop = get_drop(conn, int(ref))
+            if drop is not None:
+                mark_posted(conn, drop["id"], root_id)
+                remove_from_queue_by_key(conn, drop["dupe_key"])
+        elif kind == "digest":
+            set_last_digest_day(conn, ref)
+        inc_post_counter(conn)
+        done += 1
+        emit(cfg, conn, "post_resumed", key, ref=root_id)
+        print(f"Resumed {key}: root {root_id}")
+    return done
 
+
+def maybe_prune(cfg, conn, force: bool = False) -> None:
+    """Retention/compaction, at most once every PRUNE_EVERY_DAYS unless forced."""
+    today = today_utc()
+    last = get_meta(conn, "last_prune_day")
+    if not force and last and (_dt.date.fromisoformat(today) - _dt.date.fromisoformat(last)).days < cfg.prune_every_days:
+        return
+    counts = prune(conn, cfg.seen_retention_days, cfg.metrics_retention_days)
+    counts["cards"] = gc_cards(cfg.card_cache_days)
+    counts["review_queue"] = expire_queue(conn, cfg.queue_ttl_days)
+    set_meta(conn, "last_prune_day", today)
+    print("Pruned " + ", ".join(f"{k}={v}" for k, v in counts.items()))
+
+
+def maintain(cfg) -> int:
     conn = connect()
+    maybe_prune(cfg, conn, force=True)
+    for a in load_accounts(cfg):
+        maybe_prune(a, connect(Path(a.account_db_path)), force=True)
+    return 0
 
-    maybe_post_weekly_digest(cfg, conn, write_client, api_v1)
-
-    # Sponsored mode
-    if cfg.sponsored_mode and cfg.sponsored_project and cfg.sponsored_official_url:
-        cta = cta_line(cfg) if should_add_cta(cfg, conn) else None
-        thread = build_sponsored_thread(
-            cfg.sponsored_title, cfg.sponsored_project, cfg.sponsored_official_url,
-            cfg.sponsored_note, cfg.sponsored_tag, cfg.account_tag, cta
-        )
-        print("\n--- SPONSORED THREAD PREVIEW ---")
-        for t in thread:
-            print(t, "\n")
 
-        if cfg.dry_run:
-            inc_post_counter(conn)
-            if cfg.metrics_enabled:
-                log_metric(conn, "sponsored_dry_run", cfg.sponsored_project)
-            return 0
-
-        root_id = post_thread(
-            write_client, api_v1, thread,
-            cfg.card_title, f"{cfg.sponsored_project} | SPONSORED", cfg.card_footer,
-            cfg.self_reply_enabled, cfg.self_reply_text
-        )
+def rescore(cfg, conn=None) -> int:
+    """Offline: re-apply the current scoring rules to the whole review_queue and drops history (every account's)."""
+    if cfg.accounts and conn is None:
+        return max(rescore(a, connect(Path(a.account_db_path))) for a in load_accounts(cfg))
+    conn = conn or connect()
+    tag = f"[{cfg.account}] " if cfg.account else ""
+    t0 = _time.perf_counter()
+    for table in ("review_queue", "drops"):
+        scored, changed = rescore_table(conn, table, score_batch)
+        print(f"{tag}Rescored {table}: {scored} rows, {changed} changed")
+    reprioritize_queue(conn, cfg.queue_half_life_h, force=True)
+    print(f"{tag}Rescore done in {_time.perf_counter() - t0:.2f}s")
+    return 0
+
+
+def search_results_budget(wanted: int, limiter) -> int:
+    """RESULTS_PER_RUN, capped by the search calls left in the current window (0 = skip search)."""
+    left = limiter.left("search") if limiter is not None else None
+    if left is None:
+        return wanted
+    return min(wanted, left * SEARCH_PAGE_MAX)
+
+
+def sponsored_enabled(cfg) -> bool:
+    return bool(cfg.sponsored_mode and cfg.sponsored_project and cfg.sponsored_official_url)
+
+
+def post_sponsored(cfg, conn, write_client, api_v1) -> None:
+    cta = cta_line(cfg) if should_add_cta(cfg, conn) else None
+    thread = build_sponsored_thread(
+        cfg.sponsored_title, cfg.sponsored_project, cfg.sponsored_official_url,
+        cfg.sponsored_note, cfg.sponsored_tag, cfg.account_tag, cta
+    )
+    print("\n--- SPONSORED THREAD PREVIEW ---")
+    for t in thread:
+        print(t, "\n")
+
+    if cfg.dry_run:
         inc_post_counter(conn)
-        if cfg.metrics_enabled:
-            log_metric(conn, "sponsored_posted", root_id)
-        print(f"Posted sponsored root: {root_id}")
-        return 0
+        emit(cfg, conn, "sponsored_dry_run", name=cfg.sponsored_project)
+        return
 
-    candidates = search_candidates(read_client, cfg.keywords, cfg.lang, cfg.results_per_run)
-    print(f"Found {len(candidates)} candidates")
+    root_id = post_thread(
+        write_client, api_v1, thread,
+        cfg.card_title, f"{cfg.sponsored_project} | SPONSORED", cfg.card_footer,
+        cfg.self_reply_enabled, cfg.self_reply_text, conn=conn,
+        job_key=f"sponsored:{_dt.datetime.now(_dt.timezone.utc):%Y%m%dT%H%M%S}"
+    )
+    inc_post_counter(conn)
+    emit(cfg, conn, "sponsored_posted", name=cfg.sponsored_project, ref=root_id)
+    print(f"Posted sponsored root: {root_id}")
 
+
+def process_candidates(cfg, clients, conn, http, candidates: list[dict], vconn=None,
+                       max_posts: int | None = None, before_post=None,
+                       deferred: list[dict] | None = None) -> tuple[int, int, int]:
+    """
+    Filter, verify, score and queue/post one batch of candidates. Returns (posted, queued, rejected).
+    Candidates whose lookup was rate limited are left unseen and appended to `deferred`.
+    """
+    max_posts = cfg.max_posts_per_run if max_posts is None else max_posts
+    day_left = posts_left_today(cfg, conn)
+    if day_left is not None and day_left < max_posts:
+        print(f"MAX_POSTS_PER_DAY: {day_left} post(s) left in the last 24h")
+        max_posts = day_left
+    read_client, write_client, api_v1 = clients
     posted = 0
     queued = 0
     rejected = 0
 
+    # Stage 1: cheap local filters. Rejected tweets are marked seen right away;
+    # survivors are only marked seen once they are actually processed below.
+    # Near-duplicates (same project, or same wording as something already
+    # posted/queued/earlier in this batch) collapse here, before any network.
+    batch = Batch(conn)
+    t0 = _time.perf_counter()
+    index = DedupIndex.load(conn, cfg.seen_retention_days)
+    unseen = set(filter_unseen(conn, [c["tweet_id"] for c in candidates]))
+    survivors = []
     for c in candidates:
         tid = c["tweet_id"]
-        if not mark_seen(conn, tid):
-            continue
-
-        text = c["text"]
-        if hard_block(text):
-            rejected += 1
-            if cfg.metrics_enabled:
-                log_metric(conn, "reject_hard_block", tid)
+        if tid not in unseen:
             continue
-
-        url = extract_best_url(c)
-        if not url:
+        unseen.discard(tid)
+        url, reason, detail = prefilter(cfg, c)
+        if not reason:
+            proj, fp = project_key(url), fingerprint(c["text"])
+            why = index.match(proj, fp)
+            if why:
+                reason, detail = "reject_near_dupe", f"{why}:{proj or tid}"
+        if reason:
+            batch.mark_seen(tid)
             rejected += 1
-            if cfg.metrics_enabled:
-                log_metric(conn, "reject_no_url", tid)
+            emit(cfg, batch, reason, detail)
             continue
+        index.add(project=proj, fp=fp)
+        survivors.append((c, url, fp))
+    instrument.current().observe("filter", (_time.perf_counter() - t0) * 1000)
+    batch.flush()
+
+    # Stage 2: the unverified part of the score is local, so score every
+    # survivor as if verified first. Anything that cannot reach the queue even
+    # then is dropped without a single fetch; the rest is verified in
+    # descending order of that upper bound.
+    if survivors:
+        bounds, _ = score_batch([c["text"] for c, _, _ in survivors], [url for _, url, _ in survivors],
+                                [True] * len(survivors))
+        ranked = []
+        for (c, url, fp), ub in zip(survivors, bounds):
+            if ub < cfg.queue_min_score:
+                batch.mark_seen(c["tweet_id"])
+                rejected += 1
+                emit(cfg, batch, "reject_low_potential", ref=c["tweet_id"], score=ub)
+                continue
+            ranked.append((ub, c, url, fp))
+        ranked.sort(key=lambda x: x[0], reverse=True)  # stable: ties keep newest-first order
+        survivors = [(c, url, fp) for _, c, url, fp in ranked]
+        batch.flush()
+
+    def posts_full() -> bool:
+        return not cfg.auto_post or posted >= max_posts
+
+    def queue_full() -> bool:
+        return cfg.queue_max_per_run > 0 and queued >= cfg.queue_max_per_run
+
+    # Stage 3: verify in waves (pages on a bounded pool, handles in one
+    # batched user lookup per wave) until the post and queue budgets are met,
+    # then score/queue/post each wave in ranked order. Waves shrink to what
+    # is still needed so few pages are fetched for nothing.
+    known = author_profiles(candidates)
+    limiter = getattr(read_client, "limiter", None)
+    held: list[dict] = []
+    start = 0
+    while start < len(survivors) and not (posts_full() and queue_full()):
+        if held or (limiter is not None and limiter.left("users") == 0):
+            # lookups would only be refused; the rest stays unseen for the next window
+            held += [c for c, _, _ in survivors[start:]]
+            start = len(survivors)
+            break
+        need = (0 if posts_full() else max_posts - posted) + \
+               (0 if queue_full() else (cfg.queue_max_per_run - queued if cfg.queue_max_per_run > 0 else USER_LOOKUP_BATCH))
+        wave_size = min(USER_LOOKUP_BATCH, max(cfg.verify_concurrency, need))
+        wave = survivors[start:start + wave_size]
+        start += len(wave)
+        with instrument.stage("verify_wave"):
+            results = verify_urls(cfg, vconn or conn, read_client, [url for _, url, _ in wave], known, http)
+        scores, _ = score_batch([c["text"] for c, _, _ in wave], [url for _, url, _ in wave],
+                                [bool(r and r[0]) for r in results])
+
+        for (c, url, fp), res, sc in zip(wave, results, scores):
+            if res is None:
+                held.append(c)
+                continue
+            verified, domain, handle = res
+            tid = c["tweet_id"]
+            batch.mark_seen(tid)
+            text = c["text"]
+
+            name = project_name_from_text(text)
+            key = dupe_key(name, registrable_domain(domain))
+
+            if key in index.keys:
+                rejected += 1
+                emit(cfg, batch, "reject_dupe", name=name, ref=key)
+                continue
+
+            def enqueue(reason: str, event: str) -> None:
+                nonlocal queued, rejected
+                if queue_full():
+                    rejected += 1
+                    emit(cfg, batch, "reject_queue_full", name=name, score=sc, ref=tid)
+                    return
+                batch.enqueue_review(key, name, url, domain, verified, sc, reason, tid, text, fp, handle,
+                                     queue_priority(sc, _time.time(), cfg.queue_half_life_h))
+                index.add(key)
+                queued += 1
+                emit(cfg, batch, event, name=name, score=sc, ref=tid)
+
+            if cfg.only_verified and not verified:
+                if sc >= cfg.queue_min_score:
+                    enqueue("not_verified", "queued_not_verified")
+                else:
+                    rejected += 1
+                    emit(cfg, batch, "reject_not_verified_low", name=name, score=sc, ref=tid)
+                continue
+
+            min_needed = cfg.min_score_verified if verified else cfg.min_score_unverified
+            if sc < min_needed:
+                if sc >= cfg.queue_min_score:
+                    enqueue(f"below_threshold({min_needed})", "queued_below_threshold")
+                else:
+                    rejected += 1
+                    emit(cfg, batch, "reject_low_score", name=name, score=sc, ref=tid)
+                continue
+
+            if not cfg.auto_post:
+                enqueue("auto_post_disabled", "queued_auto_disabled")
+                continue
+
+            if posts_full():
+                # post-worthy but over MAX_POSTS_PER_RUN: keep it for the approve flow
+                enqueue("post_limit_reached", "queued_post_limit")
+                continue
+
+            if before_post is not None:
+                before_post()
+            card_project = f"{name} | {'VERIFIED' if verified else 'WATCH'}"
+            # card render/upload runs in the background while the thread is prepared
+            media = None if cfg.dry_run else prepare_media(api_v1, conn, cfg.card_title, card_project, cfg.card_footer)
+            drop_id = insert_drop(conn, key, name, url, domain, verified, sc, fp, text)
+            index.add(key)
+            cta = cta_line(cfg) if should_add_cta(cfg, conn) else None
+            thread = build_thread(name, url, sc, verified, handle, cfg.account_tag, cta, cfg.template_rotation)
+
+            print("\n--- THREAD PREVIEW ---")
+            for t in thread:
+                print(t, "\n")
+
+            if cfg.dry_run:
+                inc_post_counter(conn)
+                posted += 1
+                emit(cfg, batch, "dry_run_post", name=name, score=sc, ref=tid)
+                continue
+
+            # checkpoint: everything decided so far is durable before we post
+            batch.flush()
+
+            # posting uses write_client
+            root_id = post_thread(
+                write_client, api_v1, thread, cfg.card_title, card_project, cfg.card_footer,
+                cfg.self_reply_enabled, cfg.self_reply_text, conn=conn, media=media, job_key=f"drop:{drop_id}"
+            )
+            mark_posted(conn, drop_id, root_id)
+            inc_post_counter(conn)
+            posted += 1
+            emit(cfg, batch, "posted", name=name, score=sc, ref=root_id)
+            print(f"Posted root: {root_id}")
 
-        d = host(url)
+        batch.flush()
 
-        if cfg.require_https and not is_https(url):
-            rejected += 1
-            if cfg.metrics_enabled:
-                log_metric(conn, "reject_not_https", url)
-            continue
-        if cfg.block_shorteners and is_shortener(d):
-            rejected += 1
-            if cfg.metrics_enabled:
-                log_metric(conn, "reject_shortener", d or "")
-            continue
-        if cfg.reject_social_only and is_social_only(d):
-            rejected += 1
-            if cfg.metrics_enabled:
-                log_metric(conn, "reject_social_only", d or "")
-            continue
-        if not domain_allowed(cfg.allowlist_domains, d):
-            rejected += 1
-            if cfg.metrics_enabled:
-                log_metric(conn, "reject_allowlist", d or "")
-            continue
-
-        # verify uses read_client (lookups)
-        verified, domain, handle = verify_official(read_client, url)
+    if start < len(survivors) and posts_full() and queue_full():
+        # QUEUE_MAX_PER_RUN: these are dropped for good (search has moved past them)
+        print(f"Budgets met; dropped {len(survivors) - start} lower-potential candidates unverified")
+    if held:
+        print(f"User lookups rate limited (resets in {limiter.reset_in('users') if limiter else 0:.0f}s); "
+              f"{len(held)} candidates left unseen for the next run")
+        if deferred is not None:
+            deferred += held
 
-        name = project_name_from_text(text)
-        key = dupe_key(name, domain)
+    return posted, queued, rejected
 
-        if has_dupe(conn, key):
-            rejected += 1
-            if cfg.metrics_enabled:
-                log_metric(conn, "reject_dupe", key)
-            continue
 
-        sc = score_fn(text, url, verified)
-
-        if cfg.only_verified and not verified:
-            if sc >= cfg.queue_min_score:
-                enqueue_review(conn, key, name, url, domain, verified, sc, "not_verified", tid, text)
-                queued += 1
-                if cfg.metrics_enabled:
-                    log_metric(conn, "queued_not_verified", f"{name}|{sc}")
-            else:
-                rejected += 1
-                if cfg.metrics_enabled:
-                    log_metric(conn, "reject_not_verified_low", f"{name}|{sc}")
-            continue
-
-        min_needed = cfg.min_score_verified if verified else cfg.min_score_unverified
-        if sc < min_needed:
-            if sc >= cfg.queue_min_score:
-                enqueue_review(conn, key, name, url, domain, verified, sc, f"below_threshold({min_needed})", tid, text)
-                queued += 1
-                if cfg.metrics_enabled:
-                    log_metric(conn, "queued_below_threshold", f"{name}|{sc}")
-            else:
-                rejected += 1
-                if cfg.metrics_enabled:
-                    log_metric(conn, "reject_low_score", f"{name}|{sc}")
-            continue
+def prefetch_verification(cfg, read_client, conn, http, candidates: list[dict]) -> int:
+    """
+    Verify into verify_cache what process_candidates() would verify, without marking anything seen.
+    Returns urls verified.
+    """
+    limiter = getattr(read_client, "limiter", None)
+    if limiter is not None and limiter.left("users") == 0:
+        return 0
+    passed = []
+    for c in candidates:
+        url, reason, _ = prefilter(cfg, c)
+        if not reason:
+            passed.append((c, url))
+    if not passed:
+        return 0
+    bounds, _ = score_batch([c["text"] for c, _ in passed], [url for _, url in passed], [True] * len(passed))
+    urls = [url for (_, url), ub in zip(passed, bounds) if ub >= cfg.queue_min_score]
+    if urls:
+        with instrument.stage("verify_wave"):
+            verify_urls(cfg, conn, read_client, urls, author_profiles(candidates), http)
+    return len(urls)
+
+
+def search_pass(cfg, read_client, conn, keywords: list[str]) -> tuple[list[dict], list[dict]]:
+    """Sharded search for keywords within the rate budget. Returns (candidates, shard_runs)."""
+    limiter = getattr(read_client, "limiter", None)
+    queries, dropped = build_queries(keywords, cfg.lang, cfg.search_query_max_len)
+    for k in dropped:
+        print(f"Keyword too long for a search query, skipped: {k[:40]}")
+    results = search_results_budget(cfg.results_per_run, limiter)
+    candidates, shard_runs = [], []
+    if results:
+        with instrument.stage("search"):
+            candidates, shard_runs = search_candidates(
+                read_client, queries, results, get_shard_stats(conn), cfg.search_concurrency
+            )
+    else:
+        print(f"Search budget exhausted (resets in {limiter.reset_in('search'):.0f}s); skipping search")
+    print(f"Found {len(candidates)} candidates across {len(shard_runs)} of {len(queries)} search shard(s)")
+    return candidates, shard_runs
+
+
+def union_keywords(profiles) -> list[str]:
+    """Every account's keywords once (case-insensitive), in first-seen order."""
+    out, have = [], set()
+    for a in profiles:
+        for k in a.keywords:
+            if k.lower() not in have:
+                have.add(k.lower())
+                out.append(k)
+    return out
+
+
+def run_accounts(cfg, scheduled: bool = True) -> int:
+    """ACCOUNTS: one shared search and verification pass, then filter/score/queue/post per account."""
+    profiles = load_accounts(cfg)
+    try:
+        # search/lookup limits are per app, posting limits per account
+        read_client = make_read_client(cfg, RateLimiter())
+        accounts = [(a, (read_client,) + make_write_clients(a, RateLimiter())) for a in profiles]
+    except Exception as e:
+        print(str(e))
+        return 2
 
-        if not cfg.auto_post:
-            enqueue_review(conn, key, name, url, domain, verified, sc, "auto_post_disabled", tid, text)
-            queued += 1
-            if cfg.metrics_enabled:
-                log_metric(conn, "queued_auto_disabled", f"{name}|{sc}")
+    shared = connect()
+    http = make_http(cfg)
+    rec = instrument.reset("run")
+    limiters = {id(c.limiter): c.limiter for _, cl in accounts for c in cl if hasattr(c, "limiter")}
+    before = {k: dict(lim.calls) for k, lim in limiters.items()}
+
+    active = []
+    for a, (_, write_client, api_v1) in accounts:
+        conn = connect(Path(a.account_db_path))
+        if not a.dry_run:
+            resume_posts(a, conn, write_client, api_v1)
+        if scheduled:
+            maybe_post_weekly_digest(a, conn, write_client, api_v1)
+        if scheduled and sponsored_enabled(a):
+            post_sponsored(a, conn, write_client, api_v1)
             continue
+        active.append((a, (read_client, write_client, api_v1), conn))
+
+    candidates, shard_runs = search_pass(cfg, read_client, shared, union_keywords([a for a, _, _ in active]))
+    summary = {}
+    deferred: list[dict] = []
+    for a, clients, conn in active:
+        mine = [c for c in candidates if matches_keywords(c["text"], a.keywords)]
+        posted, queued, rejected = process_candidates(a, clients, conn, http, mine, vconn=shared, deferred=deferred)
+        maybe_prune(a, conn)
+        summary[a.account] = {"candidates": len(mine), "posted": posted, "queued": queued, "rejected": rejected}
+        print(f"[{a.account}] {len(mine)} candidates: posted(or would post) {posted} | queued {queued} | rejected {rejected}")
+
+    hold_back(shard_runs, [c["tweet_id"] for c in deferred])
+    update_shard_stats(shared, shard_runs)
+    maybe_prune(cfg, shared)
+
+    calls = {}
+    for k, lim in limiters.items():
+        for name, n in api_calls_since(lim, before[k]).items():
+            calls[name] = calls.get(name, 0) + n
+    print(f"Run done for {len(profiles)} account(s); API calls: " + ", ".join(f"{k}={v}" for k, v in sorted(calls.items())))
+    report = write_report(cfg, rec, calls, candidates=len(candidates), accounts=summary)
+    emit(cfg, shared, "run_done", value=report["duration_s"])
+    return 0
 
-        drop_id = insert_drop(conn, key, name, url, domain, verified, sc)
-        cta = cta_line(cfg) if should_add_cta(cfg, conn) else None
-        thread = build_thread(name, url, sc, verified, handle, cfg.account_tag, cta, cfg.template_rotation)
 
-        print("\n--- THREAD PREVIEW ---")
-        for t in thread:
-            print(t, "\n")
+def run(cfg, clients=None, conn=None, http=None, scheduled: bool = True) -> int:
+    """One discovery pass; clients/conn/http may be passed in warm (daemon), scheduled=False skips the side jobs."""
+    if cfg.accounts and clients is None:
+        return run_accounts(cfg, scheduled)
+    try:
+        read_client, write_client, api_v1 = clients or make_clients(cfg)
+    except Exception as e:
+        print(str(e))
+        return 2
 
-        if cfg.dry_run:
-            inc_post_counter(conn)
-            posted += 1
-            if cfg.metrics_enabled:
-                log_metric(conn, "dry_run_post", f"{name}|{sc}")
-            if posted >= cfg.max_posts_per_run:
-                break
-            continue
+    conn = conn or connect()
+    http = http or make_http(cfg)
+    rec = instrument.reset("run")
+    limiter = getattr(read_client, "limiter", None)
+    calls_before = dict(limiter.calls) if limiter is not None else {}
+
+    if not cfg.dry_run:
+        resume_posts(cfg, conn, write_client, api_v1)
+    if scheduled:
+        maybe_post_weekly_digest(cfg, conn, write_client, api_v1)
+
+    # Sponsored mode replaces discovery for this run
+    if scheduled and sponsored_enabled(cfg):
+        post_sponsored(cfg, conn, write_client, api_v1)
+        write_report(cfg, rec, api_calls_since(limiter, calls_before))
+        return 0
 
-        # posting uses write_client
-        root_id = post_thread(
-            write_client, api_v1, thread,
-            cfg.card_title, f"{name} | {'VERIFIED' if verified else 'WATCH'}", cfg.card_footer,
-            cfg.self_reply_enabled, cfg.self_reply_text
-        )
-        mark_posted(conn, drop_id, root_id)
-        inc_post_counter(conn)
-        posted += 1
-        if cfg.metrics_enabled:
-            log_metric(conn, "posted", f"{name}|{root_id}|{sc}")
-        print(f"Posted root: {root_id}")
+    candidates, shard_runs = search_pass(cfg, read_client, conn, cfg.keywords)
+    deferred: list[dict] = []
+    posted, queued, rejected = process_candidates(cfg, (read_client, write_client, api_v1), conn, http, candidates,
+                                                  deferred=deferred)
 
-        if posted >= cfg.max_posts_per_run:
-            break
+    # advance the per-shard high-water marks only once the batch has been handled,
+    # and not past what is left for the next run
+    hold_back(shard_runs, [c["tweet_id"] for c in deferred])
+    update_shard_stats(conn, shard_runs)
+    maybe_prune(cfg, conn)
 
     print(f"Run done. Posted(or would post) {posted} | queued {queued} | rejected {rejected}")
+    if limiter is not None:
+        print("API budget: " + limiter.summary())
+    report = write_report(cfg, rec, api_calls_since(limiter, calls_before), candidates=len(candidates),
+                          posted=posted, queued=queued, rejected=rejected)
+    emit(cfg, conn, "run_done", value=report["duration_s"])
     return 0
 
 
-def approve_and_post(cfg) -> int:
+def stream(cfg, stop=None) -> int:
+    """MODE=stream: feed the filtered stream through process_candidates() in small batches."""
+    if cfg.accounts:
+        print("MODE=stream does not support ACCOUNTS; unset ACCOUNTS or use MODE=run / MODE=produce + MODE=work")
+        return 2
     try:
-        read_client, write_client, api_v1 = make_clients(cfg)
+        clients = make_clients(cfg)
     except Exception as e:
         print(str(e))
         return 2
+    rules, dropped = build_rules(cfg.keywords, cfg.lang, cfg.search_query_max_len)
+    for k in dropped:
+        print(f"[stream] keyword too long for a rule, skipped: {k[:40]}")
+    sc = StreamClient(cfg.bearer, cfg.stream_base_url)
+    try:
+        added, deleted = sc.sync_rules(rules)
+    except requests.RequestException as e:
+        # e.g. 403 on access tiers without the filtered stream
+        print(f"[stream] rule sync failed: {e}")
+        sc.close()
+        return 2
+    print(f"[stream] rules synced (+{added} / -{deleted})")
 
     conn = connect()
+    http = make_http(cfg)
+    stop = stop or threading.Event()
+    if threading.current_thread() is threading.main_thread():
+        signal.signal(signal.SIGTERM, lambda *_: stop.set())
+        signal.signal(signal.SIGINT, lambda *_: stop.set())
+    ing = StreamIngestor(sc, cfg.stream_queue_max).start()
+    limiter = getattr(clients[0], "limiter", None)
+    if not cfg.dry_run:
+        resume_posts(cfg, conn, clients[1], clients[2])
+    totals = [0, 0, 0]
+    try:
+        while not stop.is_set() and ing.error is None:
+            batch = ing.drain(cfg.stream_batch_max, cfg.stream_batch_wait_s)
+            if not batch:
+                continue
+            batch.sort(key=lambda c: int(c["tweet_id"]), reverse=True)
+            rec = instrument.reset("stream")
+            calls_before = dict(limiter.calls) if limiter is not None else {}
+            deferred: list[dict] = []
+            res = process_candidates(cfg, clients, conn, http, batch, deferred=deferred)
+            if deferred:
+                # the stream does not deliver a tweet twice
+                print(f"[stream] dropping {len(deferred)} candidates: user lookups rate limited")
+            totals = [a + b for a, b in zip(totals, res)]
+            print(f"[stream] batch of {len(batch)}: posted {res[0]} | queued {res[1]} | rejected {res[2]} "
+                  f"(backlog {ing.q.qsize()})")
+            write_report(cfg, rec, api_calls_since(limiter, calls_before), candidates=len(batch),
+                         posted=res[0], queued=res[1], rejected=res[2], backlog=ing.q.qsize())
+            maybe_prune(cfg, conn)
+    finally:
+        ing.stop()
+        sc.close()
+        http.close()
+        conn.close()
+    print(f"Stream done. received {ing.received} | posted {totals[0]} | queued {totals[1]} | rejected {totals[2]}")
+    if ing.error is not None:
+        print(f"[stream] stopped: {ing.error}")
+        return 2
+    return 0
 
-    approve_top(conn, cfg.approve_post_limit)
-    rows = pop_approved(conn, cfg.approve_post_limit)
+
+def reverify_queued(cfg, conn, read_client, http, rows: list[dict]) -> int:
+    """Re-verify and re-score, in one batch and in place, the rows verified longer ago than QUEUE_REVERIFY_H."""
+    cutoff = _time.time() - cfg.queue_reverify_h * 3600
+    stale = [r for r in rows if _dt.datetime.fromisoformat(r["verified_at"] or r["created_at"]).timestamp() < cutoff]
+    if not stale:
+        return 0
+    urls = [r["official_url"] for r in stale]
+    with instrument.stage("reverify"):
+        results = verify_urls(cfg, conn, read_client, urls, http=http, max_age_h=cfg.queue_reverify_h)
+    # a row whose lookup was rate limited keeps its old verdict
+    checked = [(r, v) for r, v in zip(stale, results) if v is not None]
+    stale, results = [r for r, _ in checked], [v for _, v in checked]
+    if not stale:
+        return 0
+    scores, _ = score_batch([r["source_text"] or "" for r in stale], [r["official_url"] for r in stale],
+                            [v for v, _, _ in results])
+    ts = now()
+    for r, (verified, _, handle), sc in zip(stale, results, scores):
+        r.update(verified=int(verified), handle=handle, verified_at=ts, score=sc if r["source_text"] else r["score"])
+    update_queue_verification(conn, stale, cfg.queue_half_life_h)
+    emit(cfg, conn, "queue_reverified", value=len(stale))
+    return len(stale)
+
+
+def approve_and_post(cfg, clients=None, conn=None, http=None) -> int:
+    """Post the highest-priority approved queue items (APPROVE_POST_LIMIT), per account with ACCOUNTS."""
+    if cfg.accounts and clients is None:
+        return max(approve_and_post(a, None, connect(Path(a.account_db_path)), http) for a in load_accounts(cfg))
+    try:
+        read_client, write_client, api_v1 = clients or make_clients(cfg)
+    except Exception as e:
+        print(str(e))
+        return 2
+
+    conn = conn or connect()
+    rec = instrument.reset("approve")
+    limiter = getattr(write_client, "limiter", None)
+    calls_before = dict(limiter.calls) if limiter is not None else {}
+    if not cfg.dry_run:
+        resume_posts(cfg, conn, write_client, api_v1)
+
+    expired = expire_queue(conn, cfg.queue_ttl_days)
+    if expired:
+        print(f"Expired {expired} queue items older than {cfg.queue_ttl_days}d")
+        emit(cfg, conn, "queue_expired", value=expired)
+    reprioritize_queue(conn, cfg.queue_half_life_h)
+    limit = cfg.approve_post_limit
+    day_left = posts_left_today(cfg, conn)
+    if day_left is not None and day_left < limit:
+        print(f"MAX_POSTS_PER_DAY: {day_left} post(s) left in the last 24h")
+        limit = day_left
+    if cfg.approve_auto and limit:
+        approve_top(conn, limit)
+    rows = [dict(r) for r in pop_approved(conn, limit)] if limit else []
 
     if not rows:
         print("No approved items to post.")
         return 0
 
+    own_http = http is None
+    http = http or make_http(cfg)
+    batch = Batch(conn)
     posted = 0
-    for r in rows:
-        name = r["name"]
-        url = r["official_url"]
-        verified = bool(r["verified"])
-        sc = int(r["score"])
-
-        if cfg.only_verified and not verified:
-            remove_from_queue(conn, int(r["id"]))
-            if cfg.metrics_enabled:
-                log_metric(conn, "approve_skip_not_verified", name)
-            continue
-
-        cta = cta_line(cfg) if should_add_cta(cfg, conn) else None
-        thread = build_thread(name, url, sc, verified, None, cfg.account_tag, cta, cfg.template_rotation)
-
-        print("\n--- APPROVED THREAD PREVIEW ---")
-        for t in thread:
-            print(t, "\n")
+    done = []  # queue ids handled; removed together at the end
+    try:
+        reverify_queued(cfg, conn, read_client, http, rows)
+        for r in rows:
+            name = r["name"]
+            url = r["official_url"]
+            verified = bool(r["verified"])
+            sc = int(r["score"])
+
+            if cfg.only_verified and not verified:
+                done.append(r["id"])
+                emit(cfg, batch, "approve_skip_not_verified", name=name)
+                continue
+
+            if sc < cfg.queue_min_score:
+                # re-scored below what the queue keeps at all
+                done.append(r["id"])
+                emit(cfg, batch, "approve_skip_low_score", name=name, score=sc)
+                continue
+
+            card_project = f"{name} | {'VERIFIED' if verified else 'WATCH'}"
+            media = None if cfg.dry_run else prepare_media(api_v1, conn, cfg.card_title, card_project, cfg.card_footer)
+            cta = cta_line(cfg) if should_add_cta(cfg, conn) else None
+            thread = build_thread(name, url, sc, verified, r["handle"], cfg.account_tag, cta, cfg.template_rotation)
+
+            print("\n--- APPROVED THREAD PREVIEW ---")
+            for t in thread:
+                print(t, "\n")
+
+            if cfg.dry_run:
+                inc_post_counter(conn)
+                done.append(r["id"])
+                posted += 1
+                emit(cfg, batch, "approve_dry_run_post", name=name, score=sc)
+                continue
+
+            batch.flush()
+            drop = find_drop(conn, r["dupe_key"])
+            if drop is not None and drop["posted_at"]:
+                done.append(r["id"])
+                continue
+            drop_id = drop["id"] if drop is not None else insert_drop(
+                conn, r["dupe_key"], name, url, r["official_domain"], verified, sc, r["fingerprint"], r["source_text"]
+            )
+            try:
+                root_id = post_thread(
+                    write_client, api_v1, thread, cfg.card_title, card_project, cfg.card_footer,
+                    cfg.self_reply_enabled, cfg.self_reply_text, conn=conn, media=media, job_key=f"drop:{drop_id}"
+                )
+            except PostAbandoned as e:
+                # the item would fail again on every run; retire it and go on with the next one
+                drop_failed(cfg, conn, f"drop:{drop_id}")
+                done.append(r["id"])
+                print(f"Approved post failed: {e}")
+                continue
+            except Exception as e:
+                # the job stays open and is resumed by the next run, the queue item stays too
+                emit(cfg, batch, "approve_post_failed", name=name, ref=f"drop:{drop_id}")
+                print(f"Approved post failed, stopping: {e!r}")
+                break
+            mark_posted(conn, drop_id, root_id)
 
-        if cfg.dry_run:
             inc_post_counter(conn)
-            remove_from_queue(conn, int(r["id"]))
+            done.append(r["id"])
             posted += 1
-            if cfg.metrics_enabled:
-                log_metric(conn, "approve_dry_run_post", f"{name}|{sc}")
-            continue
-
-        root_id = post_thread(
-            write_client, api_v1, thread,
-            cfg.card_title, f"{name} | {'VERIFIED' if verified else 'WATCH'}", cfg.card_footer,
-            cfg.self_reply_enabled, cfg.self_reply_text
-        )
-
-        drop_id = insert_drop(conn, r["dupe_key"], name, url, r["official_domain"], verified, sc)
-        mark_posted(conn, drop_id, root_id)
-
-        inc_post_counter(conn)
-        remove_from_queue(conn, int(r["id"]))
-        posted += 1
-        if cfg.metrics_enabled:
-            log_metric(conn, "approve_posted", f"{name}|{root_id}|{sc}")
+            emit(cfg, batch, "approve_posted", name=name, score=sc, ref=root_id)
 
-        print(f"Posted approved root: {root_id}")
+            print(f"Posted approved root: {root_id}")
+    finally:
+        # a posted item left behind by a crash is dropped next time via its posted drop
+        batch.flush()
+        remove_from_queue_many(conn, done)
+        if own_http:
+            http.close()
 
     print(f"Approve flow done. Posted {posted}")
+    write_report(cfg, rec, api_calls_since(limiter, calls_before), posted=posted)
     return 0
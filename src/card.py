@@ -1,26 +1,100 @@
-from PIL import Image, ImageDraw, ImageFont
+from __future__ import annotations
+import hashlib
+import io
+import os
+import time
+from functools import lru_cache
 from pathlib import Path
-from datetime import datetime
 
-def make_card(title: str, project: str, footer: str) -> Path:
-    out = Path("data")
-    out.mkdir(parents=True, exist_ok=True)
-    path = out / f"card_{datetime.utcnow().strftime('%Y%m%d_%H%M%S')}.png"
+from PIL import Image, ImageDraw, ImageFont
+
+from src import instrument
+
+W, H = 1200, 675
+BG = (12, 12, 16)
+FONT_FILE = "DejaVuSans.ttf"
+CARD_DIR = Path("data") / "cards"
+# bump when the layout below changes so cached cards are re-rendered
+CARD_TEMPLATE = "v1"
 
-    W, H = 1200, 675
-    img = Image.new("RGB", (W, H), (12, 12, 16))
-    d = ImageDraw.Draw(img)
 
+@lru_cache(maxsize=1)
+def _fonts() -> tuple:
+    """(big, mid, small), loaded once per process."""
     try:
-        big = ImageFont.truetype("DejaVuSans.ttf", 64)
-        mid = ImageFont.truetype("DejaVuSans.ttf", 52)
-        sm = ImageFont.truetype("DejaVuSans.ttf", 28)
+        return (ImageFont.truetype(FONT_FILE, 64), ImageFont.truetype(FONT_FILE, 52),
+                ImageFont.truetype(FONT_FILE, 28))
     except Exception:
-        big = mid = sm = ImageFont.load_default()
+        f = ImageFont.load_default()
+        return f, f, f
+
+
+@lru_cache(maxsize=1)
+def _background() -> Image.Image:
+    return Image.new("RGB", (W, H), BG)
+
+
+def card_key(title: str, project: str, footer: str, template: str = CARD_TEMPLATE) -> str:
+    return hashlib.sha1("\x1f".join((template, title, project, footer)).encode("utf-8")).hexdigest()[:20]
+
+
+def render_card(title: str, project: str, footer: str) -> bytes:
+    with instrument.stage("card_render"):
+        return _render(title, project, footer)
+
+
+def _render(title: str, project: str, footer: str) -> bytes:
+    img = _background().copy()
+    d = ImageDraw.Draw(img)
+    big, mid, sm = _fonts()
+    d.text((70, 70), title, font=big, fill=(245, 245, 250))
+    d.text((70, 260), project, font=mid, fill=(120, 255, 200))
+    d.text((70, 600), footer, font=sm, fill=(200, 200, 210))
+    buf = io.BytesIO()
+    img.save(buf, "PNG")
+    return buf.getvalue()
+
+
+def make_card(title: str, project: str, footer: str) -> tuple[str, io.BytesIO]:
+    """
+    (cache key, PNG buffer). Cards are cached in data/cards by content hash,
+    so the same card is rendered once; the buffer can be uploaded directly.
+    """
+    key = card_key(title, project, footer)
+    path = CARD_DIR / f"{key}.png"
+    try:
+        data = path.read_bytes()
+        os.utime(path)  # keep recently used cards out of gc_cards
+    except OSError:
+        data = render_card(title, project, footer)
+        try:
+            CARD_DIR.mkdir(parents=True, exist_ok=True)
+            tmp = path.with_suffix(f".{os.getpid()}.tmp")
+            tmp.write_bytes(data)
+            os.replace(tmp, path)
+        except OSError as e:
+            print(f"Card cache write failed: {e}")
+    return key, io.BytesIO(data)
 
-    d.text((70, 70), title, font=big, fill=(245,245,250))
-    d.text((70, 260), project, font=mid, fill=(120,255,200))
-    d.text((70, 600), footer, font=sm, fill=(200,200,210))
 
-    img.save(path, "PNG")
-    return path
+def gc_cards(max_age_days: int, max_files: int = 500) -> int:
+    """Delete cached cards unused for max_age_days, then the oldest beyond max_files. Returns count."""
+    if not CARD_DIR.exists():
+        return 0
+    files = []
+    for p in CARD_DIR.iterdir():
+        try:
+            files.append((p.stat().st_mtime, p))
+        except OSError:
+            continue
+    files.sort(reverse=True)
+    cutoff = time.time() - max_age_days * 86400
+    removed = 0
+    for n, (mtime, p) in enumerate(files):
+        if mtime < cutoff or n >= max_files:
+            try:
+                p.unlink()
+                removed += 1
+            except OSError:
+                pass
+    return removed
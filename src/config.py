@@ -1,11 +1,30 @@
 import os
+import re
 from dataclasses import dataclass
 from dotenv import load_dotenv
 
 load_dotenv()
 
+_prefix = ""  # set while load_cfg() reads an account profile
+
+def account_prefix(account: str) -> str:
+    """Env prefix of an account profile: "brand-a" -> "BRAND_A_"."""
+    return re.sub(r"[^A-Za-z0-9]+", "_", account).strip("_").upper() + "_"
+
+# posting credentials never fall back to the shared ones: a profile missing one
+# of them would otherwise post with a broken mix, or as the shared account
+ACCOUNT_ONLY = ("X_API_KEY", "X_API_SECRET", "X_ACCESS_TOKEN", "X_ACCESS_SECRET")
+
+def _get(name: str, default: str | None = None) -> str | None:
+    """The account's own value (BRAND_A_CARD_TITLE) while loading a profile, else the shared one."""
+    if _prefix:
+        v = os.getenv(_prefix + name)
+        if v is not None or name in ACCOUNT_ONLY:
+            return default if v is None else v
+    return os.getenv(name, default)
+
 def b(name: str, default: bool) -> bool:
-    v = os.getenv(name)
+    v = _get(name)
     if v is None:
         return default
     if not v.strip():  # missing secret -> "" should not flip to False
@@ -14,7 +33,13 @@ def b(name: str, default: bool) -> bool:
 
 def i(name: str, default: int) -> int:
     try:
-        return int(os.getenv(name, str(default)))
+        return int(_get(name, str(default)))
+    except ValueError:
+        return default
+
+def f(name: str, default: float) -> float:
+    try:
+        return float(_get(name, str(default)))
     except ValueError:
         return default
 
@@ -22,6 +47,7 @@ def i(name: str, default: int) -> int:
 class Cfg:
     dry_run: bool
     max_posts_per_run: int
+    max_posts_per_day: int
 
     bearer: str
     api_key: str
@@ -32,10 +58,13 @@ class Cfg:
     keywords: list[str]
     lang: str
     results_per_run: int
+    search_query_max_len: int
+    search_concurrency: int
 
     min_score_verified: int
     min_score_unverified: int
     queue_min_score: int
+    queue_max_per_run: int
 
     require_https: bool
     reject_social_only: bool
@@ -63,6 +92,12 @@ class Cfg:
     auto_post: bool
     only_verified: bool
     approve_post_limit: int
+    approve_auto: bool
+
+    queue_half_life_h: float
+    queue_ttl_days: int
+    queue_reverify_h: float
+    queue_file: str
 
     self_reply_enabled: bool
     self_reply_text: str
@@ -70,58 +105,197 @@ class Cfg:
     template_rotation: bool
     metrics_enabled: bool
 
-def load_cfg() -> Cfg:
-    kw = [k.strip() for k in os.getenv("KEYWORDS", "").split(",") if k.strip()]
-    al = [d.strip().lower() for d in os.getenv("ALLOWLIST_DOMAINS", "").split(",") if d.strip()]
+    seen_retention_days: int
+    metrics_retention_days: int
+    prune_every_days: int
+    card_cache_days: int
+
+    verify_concurrency: int
+    fetch_max_bytes: int
+    http_connect_timeout: float
+    http_read_timeout: float
+    http_total_timeout: float
+    http_retries: int
+    http_per_host: int
+    verify_ttl_ok_h: int
+    verify_ttl_neg_h: int
+    verify_ttl_err_h: int
+
+    daemon_approve: bool
+    daemon_approve_auto: bool
+    daemon_search_every_min: float
+    daemon_approve_every_min: float
+    daemon_digest_every_min: float
+    daemon_prune_every_min: float
+    daemon_sponsored_every_min: float
+    daemon_jitter: float
+
+    stream_base_url: str
+    stream_queue_max: int
+    stream_batch_max: int
+    stream_batch_wait_s: float
+
+    run_report_path: str
+    prom_textfile_path: str
+
+    account: str
+    accounts: list[str]
+    account_db_path: str
+
+    replay_path: str
+    replay_db_path: str
+    replay_api_latency_ms: float
+    replay_page_latency_ms: float
+    record_path: str
+    record_db_path: str
+
+    worker_id: str
+    work_batch: int
+    work_lease_s: float
+    work_leader_ttl_s: float
+    work_post_wait_s: float
+    work_max_attempts: int
+    work_poll_s: float
+    work_idle_exit_s: float
+
+def load_cfg(account: str = "") -> Cfg:
+    """Settings from the environment; for an account profile, prefixed keys win over shared ones."""
+    global _prefix
+    _prefix = account_prefix(account) if account else ""
+    try:
+        return _load_cfg(account)
+    finally:
+        _prefix = ""
+
+def load_accounts(cfg: Cfg) -> list[Cfg]:
+    return [load_cfg(a) for a in cfg.accounts]
+
+def _queue_file(account: str) -> str:
+    """QUEUE_FILE; an account without its own gets the shared name with the account in it."""
+    if account and os.getenv(_prefix + "QUEUE_FILE", "").strip():
+        return os.getenv(_prefix + "QUEUE_FILE").strip()
+    path = os.getenv("QUEUE_FILE", "").strip() or "data/review_queue.csv"
+    if not account:
+        return path
+    stem, dot, ext = path.rpartition(".")
+    return f"{stem}.{account}.{ext}" if dot and "/" not in ext else f"{path}.{account}"
+
+def _load_cfg(account: str) -> Cfg:
+    kw = [k.strip() for k in _get("KEYWORDS", "").split(",") if k.strip()]
+    al = [d.strip().lower() for d in _get("ALLOWLIST_DOMAINS", "").split(",") if d.strip()]
 
     return Cfg(
         dry_run=b("DRY_RUN", True),
         max_posts_per_run=i("MAX_POSTS_PER_RUN", 1),
+        max_posts_per_day=max(0, i("MAX_POSTS_PER_DAY", 6)),
 
-        bearer=os.getenv("X_BEARER_TOKEN", "").strip(),
-        api_key=os.getenv("X_API_KEY", "").strip(),
-        api_secret=os.getenv("X_API_SECRET", "").strip(),
-        access_token=os.getenv("X_ACCESS_TOKEN", "").strip(),
-        access_secret=os.getenv("X_ACCESS_SECRET", "").strip(),
+        bearer=_get("X_BEARER_TOKEN", "").strip(),
+        api_key=_get("X_API_KEY", "").strip(),
+        api_secret=_get("X_API_SECRET", "").strip(),
+        access_token=_get("X_ACCESS_TOKEN", "").strip(),
+        access_secret=_get("X_ACCESS_SECRET", "").strip(),
 
         keywords=kw or ["airdrop", "testnet", "points campaign", "snapshot"],
-        lang=os.getenv("LANG", "en").strip(),
+        lang=_get("LANG", "en").strip(),
         results_per_run=i("RESULTS_PER_RUN", 50),
+        search_query_max_len=i("SEARCH_QUERY_MAX_LEN", 512),
+        search_concurrency=max(1, i("SEARCH_CONCURRENCY", 2)),
 
         min_score_verified=i("MIN_SCORE_VERIFIED", 80),
         min_score_unverified=i("MIN_SCORE_UNVERIFIED", 95),
         queue_min_score=i("QUEUE_MIN_SCORE", 70),
+        queue_max_per_run=max(0, i("QUEUE_MAX_PER_RUN", 0)),
 
         require_https=b("REQUIRE_HTTPS", True),
         reject_social_only=b("REJECT_SOCIAL_ONLY", True),
         block_shorteners=b("BLOCK_SHORTENERS", True),
         allowlist_domains=al,
 
-        account_tag=os.getenv("ACCOUNT_TAG", "@AirdropIntelHQ").strip(),
-        card_title=os.getenv("CARD_TITLE", "VERIFIED AIRDROP INTEL").strip(),
-        card_footer=os.getenv("CARD_FOOTER", "@AirdropIntelHQ").strip(),
+        account_tag=_get("ACCOUNT_TAG", "@AirdropIntelHQ").strip(),
+        card_title=_get("CARD_TITLE", "VERIFIED AIRDROP INTEL").strip(),
+        card_footer=_get("CARD_FOOTER", "@AirdropIntelHQ").strip(),
 
-        link_hub_url=os.getenv("LINK_HUB_URL", "").strip(),
+        link_hub_url=_get("LINK_HUB_URL", "").strip(),
         cta_every_n_posts=max(1, i("CTA_EVERY_N_POSTS", 3)),
-        cta_text=os.getenv("CTA_TEXT", "All links & beginner setup → ").strip(),
+        cta_text=_get("CTA_TEXT", "All links & beginner setup → ").strip(),
 
         weekly_digest=b("WEEKLY_DIGEST", True),
-        weekly_digest_day=os.getenv("WEEKLY_DIGEST_DAY", "MON").strip().upper(),
+        weekly_digest_day=_get("WEEKLY_DIGEST_DAY", "MON").strip().upper(),
 
         sponsored_mode=b("SPONSORED_MODE", False),
-        sponsored_title=os.getenv("SPONSORED_TITLE", "SPONSORED").strip(),
-        sponsored_project=os.getenv("SPONSORED_PROJECT", "").strip(),
-        sponsored_official_url=os.getenv("SPONSORED_OFFICIAL_URL", "").strip(),
-        sponsored_note=os.getenv("SPONSORED_NOTE", "Featured campaign. Do your own research.").strip(),
-        sponsored_tag=os.getenv("SPONSORED_TAG", "#ad").strip(),
+        sponsored_title=_get("SPONSORED_TITLE", "SPONSORED").strip(),
+        sponsored_project=_get("SPONSORED_PROJECT", "").strip(),
+        sponsored_official_url=_get("SPONSORED_OFFICIAL_URL", "").strip(),
+        sponsored_note=_get("SPONSORED_NOTE", "Featured campaign. Do your own research.").strip(),
+        sponsored_tag=_get("SPONSORED_TAG", "#ad").strip(),
 
         auto_post=b("AUTO_POST", True),
         only_verified=b("ONLY_VERIFIED", True),
         approve_post_limit=i("APPROVE_POST_LIMIT", 2),
+        approve_auto=b("APPROVE_AUTO", True),
+
+        queue_half_life_h=max(1.0, f("QUEUE_HALF_LIFE_H", 48)),
+        queue_ttl_days=max(1, i("QUEUE_TTL_DAYS", 14)),
+        queue_reverify_h=max(0.0, f("QUEUE_REVERIFY_H", 24)),
+        queue_file=_queue_file(account),
 
         self_reply_enabled=b("SELF_REPLY_ENABLED", True),
-        self_reply_text=os.getenv("SELF_REPLY_TEXT", "Bookmark this. Verified links only. Beginner setup in bio.").strip(),
+        self_reply_text=_get("SELF_REPLY_TEXT", "Bookmark this. Verified links only. Beginner setup in bio.").strip(),
 
         template_rotation=b("TEMPLATE_ROTATION", True),
         metrics_enabled=b("METRICS_ENABLED", True),
+
+        seen_retention_days=max(8, i("SEEN_RETENTION_DAYS", 30)),
+        metrics_retention_days=max(1, i("METRICS_RETENTION_DAYS", 30)),
+        prune_every_days=max(1, i("PRUNE_EVERY_DAYS", 7)),
+        card_cache_days=max(1, i("CARD_CACHE_DAYS", 14)),
+
+        verify_concurrency=max(1, i("VERIFY_CONCURRENCY", 8)),
+        fetch_max_bytes=max(4096, i("FETCH_MAX_BYTES", 400_000)),
+        http_connect_timeout=f("HTTP_CONNECT_TIMEOUT", 4.0),
+        http_read_timeout=f("HTTP_READ_TIMEOUT", 8.0),
+        http_total_timeout=f("HTTP_TOTAL_TIMEOUT", 15.0),
+        http_retries=max(0, i("HTTP_RETRIES", 2)),
+        http_per_host=max(1, i("HTTP_PER_HOST", 2)),
+        verify_ttl_ok_h=i("VERIFY_CACHE_TTL_OK_H", 72),
+        verify_ttl_neg_h=i("VERIFY_CACHE_TTL_NEG_H", 24),
+        verify_ttl_err_h=i("VERIFY_CACHE_TTL_ERR_H", 1),
+
+        daemon_approve=b("DAEMON_APPROVE", False),
+        daemon_approve_auto=b("DAEMON_APPROVE_AUTO", False),
+        daemon_search_every_min=max(1.0, f("DAEMON_SEARCH_EVERY_MIN", 15)),
+        daemon_approve_every_min=max(1.0, f("DAEMON_APPROVE_EVERY_MIN", 60)),
+        daemon_digest_every_min=max(1.0, f("DAEMON_DIGEST_EVERY_MIN", 60)),
+        daemon_prune_every_min=max(1.0, f("DAEMON_PRUNE_EVERY_MIN", 360)),
+        daemon_sponsored_every_min=max(1.0, f("DAEMON_SPONSORED_EVERY_MIN", 360)),
+        daemon_jitter=min(0.5, max(0.0, f("DAEMON_JITTER", 0.1))),
+
+        stream_base_url=_get("STREAM_BASE_URL", "").strip() or "https://api.twitter.com",
+        stream_queue_max=max(1, i("STREAM_QUEUE_MAX", 1000)),
+        stream_batch_max=max(1, i("STREAM_BATCH_MAX", 50)),
+        stream_batch_wait_s=max(0.1, f("STREAM_BATCH_WAIT_S", 5.0)),
+
+        run_report_path=_get("RUN_REPORT_PATH", "data/run_report.json").strip(),
+        prom_textfile_path=_get("PROM_TEXTFILE_PATH", "").strip(),
+
+        account=account,
+        accounts=[] if account else [a.strip() for a in os.getenv("ACCOUNTS", "").split(",") if a.strip()],
+        # each account keeps its own dedup/queue/posting state; search and verify caches stay shared
+        account_db_path=(os.getenv(_prefix + "DB_PATH", "").strip() or f"data/accounts/{account}.sqlite3") if account else "",
+
+        replay_path=_get("REPLAY_PATH", "data/corpus").strip(),
+        replay_db_path=_get("REPLAY_DB_PATH", "data/replay.sqlite3").strip(),
+        replay_api_latency_ms=max(0.0, f("REPLAY_API_LATENCY_MS", 0)),
+        replay_page_latency_ms=max(0.0, f("REPLAY_PAGE_LATENCY_MS", 0)),
+        record_path=_get("RECORD_PATH", "data/corpus").strip(),
+        record_db_path=_get("RECORD_DB_PATH", "data/record.sqlite3").strip(),
+
+        worker_id=_get("WORKER_ID", "").strip(),
+        work_batch=max(1, i("WORK_BATCH", 50)),
+        work_lease_s=max(10.0, f("WORK_LEASE_S", 600)),
+        work_leader_ttl_s=max(10.0, f("WORK_LEADER_TTL_S", 600)),
+        work_post_wait_s=max(0.0, f("WORK_POST_WAIT_S", 60)),
+        work_max_attempts=max(1, i("WORK_MAX_ATTEMPTS", 3)),
+        work_poll_s=max(0.1, f("WORK_POLL_S", 2.0)),
+        work_idle_exit_s=max(0.0, f("WORK_IDLE_EXIT_S", 60)),
     )
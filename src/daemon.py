@@ -0,0 +1,107 @@
+from __future__ import annotations
+import random
+import signal
+import threading
+import time
+from dataclasses import dataclass, replace
+from typing import Callable
+
+from src.db import connect
+from src.bot import (
+    make_clients, make_http, run, approve_and_post, maybe_post_weekly_digest, maybe_prune,
+    sponsored_enabled, post_sponsored,
+)
+
+
+@dataclass
+class Job:
+    name: str
+    fn: Callable[[], object]
+    every_s: float
+    jitter: float = 0.1  # fraction of every_s, spreads runs so they do not line up with API windows
+    next_at: float = 0.0
+    runs: int = 0
+    failures: int = 0
+
+    def schedule(self, now: float) -> None:
+        self.next_at = now + self.every_s * (1 + random.uniform(-self.jitter, self.jitter))
+
+
+class Scheduler:
+    """Runs jobs one at a time, each on its own jittered interval, until stop()."""
+
+    def __init__(self, jobs: list[Job]):
+        self.jobs = jobs
+        self._stop = threading.Event()
+
+    def stop(self, *_) -> None:
+        self._stop.set()
+
+    def install_signal_handlers(self) -> None:
+        signal.signal(signal.SIGTERM, self.stop)
+        signal.signal(signal.SIGINT, self.stop)
+
+    def run_forever(self) -> None:
+        for job in self.jobs:
+            job.next_at = time.monotonic()  # everything runs once at startup
+        while not self._stop.is_set():
+            job = min(self.jobs, key=lambda j: j.next_at)
+            wait = job.next_at - time.monotonic()
+            if wait > 0 and self._stop.wait(wait):
+                break
+            t0 = time.monotonic()
+            try:
+                job.fn()
+            except Exception as e:
+                job.failures += 1
+                print(f"[daemon] {job.name} failed: {e!r}")
+            job.runs += 1
+            job.schedule(time.monotonic())
+            print(f"[daemon] {job.name} done in {time.monotonic() - t0:.1f}s, next in {job.next_at - time.monotonic():.0f}s")
+
+
+def build_jobs(cfg, clients, conn, http) -> list[Job]:
+    _, write_client, api_v1 = clients
+    m = 60.0
+    jobs = [
+        Job("digest", lambda: maybe_post_weekly_digest(cfg, conn, write_client, api_v1),
+            cfg.daemon_digest_every_min * m, cfg.daemon_jitter),
+        Job("prune", lambda: maybe_prune(cfg, conn), cfg.daemon_prune_every_min * m, cfg.daemon_jitter),
+    ]
+    if cfg.daemon_approve:
+        # posting from the queue is opt-in here; auto-approval separately so
+        approve_cfg = replace(cfg, approve_auto=cfg.daemon_approve_auto)
+        jobs.insert(0, Job("approve", lambda: approve_and_post(approve_cfg, clients, conn, http),
+                           cfg.daemon_approve_every_min * m, cfg.daemon_jitter))
+    if sponsored_enabled(cfg):
+        jobs.append(Job("sponsored", lambda: post_sponsored(cfg, conn, write_client, api_v1),
+                        cfg.daemon_sponsored_every_min * m, cfg.daemon_jitter))
+    else:
+        jobs.insert(0, Job("search", lambda: run(cfg, clients, conn, http, scheduled=False),
+                           cfg.daemon_search_every_min * m, cfg.daemon_jitter))
+    return jobs
+
+
+def daemon(cfg) -> int:
+    """MODE=daemon: one process keeps clients, pools and the DB open and runs every job on its own schedule."""
+    if cfg.accounts:
+        # the jobs share one set of clients and one DB, i.e. a single account
+        print("MODE=daemon does not support ACCOUNTS; unset ACCOUNTS or use MODE=run / MODE=produce + MODE=work")
+        return 2
+    try:
+        clients = make_clients(cfg)
+    except Exception as e:
+        print(str(e))
+        return 2
+    conn = connect()
+    http = make_http(cfg)
+    sched = Scheduler(build_jobs(cfg, clients, conn, http))
+    sched.install_signal_handlers()
+    print("[daemon] started: " + ", ".join(f"{j.name}/{j.every_s / 60:.0f}m" for j in sched.jobs))
+    try:
+        sched.run_forever()
+    finally:
+        http.close()
+        conn.close()
+    print("[daemon] stopped")
+    return 0
@@ -1,11 +1,16 @@
+import json
+import math
 import sqlite3
 from pathlib import Path
-from datetime import datetime, timezone, date
+from datetime import datetime, timezone, date, timedelta
+
+from src import instrument
 
 DB_PATH = Path("data/bot.sqlite3")
 
 SCHEMA = """
 PRAGMA journal_mode=WAL;
+PRAGMA synchronous=NORMAL;
 
 CREATE TABLE IF NOT EXISTS seen (
   id INTEGER PRIMARY KEY AUTOINCREMENT,
@@ -46,6 +51,29 @@ CREATE TABLE IF NOT EXISTS meta (
   v TEXT NOT NULL
 );
 
+CREATE TABLE IF NOT EXISTS verify_cache (
+  domain TEXT PRIMARY KEY,
+  url TEXT,
+  handle TEXT,
+  verified INTEGER NOT NULL,
+  outcome TEXT NOT NULL,
+  http_status INTEGER,
+  etag TEXT,
+  last_modified TEXT,
+  checked_at TEXT NOT NULL
+);
+
+CREATE TABLE IF NOT EXISTS search_shards (
+  shard TEXT PRIMARY KEY,
+  query TEXT NOT NULL,
+  since_id TEXT,
+  runs INTEGER NOT NULL DEFAULT 0,
+  fetched INTEGER NOT NULL DEFAULT 0,
+  uniq INTEGER NOT NULL DEFAULT 0,
+  yield_ewma REAL,
+  updated_at TEXT
+);
+
 CREATE TABLE IF NOT EXISTS metrics (
   id INTEGER PRIMARY KEY AUTOINCREMENT,
   ts TEXT NOT NULL,
@@ -54,21 +82,195 @@ CREATE TABLE IF NOT EXISTS metrics (
 );
 """
 
+# (user_version, script) applied in order by migrate(); never edit a released entry, append a new one.
+MIGRATIONS = [
+    (1, """
+CREATE INDEX IF NOT EXISTS idx_drops_posted
+  ON drops(posted_at, name, official_url, verified, score) WHERE posted_at IS NOT NULL;
+CREATE INDEX IF NOT EXISTS idx_queue_approved_rank ON review_queue(approved, score DESC, created_at);
+CREATE INDEX IF NOT EXISTS idx_metrics_ts ON metrics(ts);
+CREATE INDEX IF NOT EXISTS idx_seen_created ON seen(created_at);
+CREATE INDEX IF NOT EXISTS idx_verify_cache_checked ON verify_cache(checked_at);
+
+CREATE TABLE IF NOT EXISTS metrics_daily (
+  day TEXT NOT NULL,
+  event TEXT NOT NULL,
+  n INTEGER NOT NULL,
+  PRIMARY KEY (day, event)
+);
+"""),
+    (2, """
+ALTER TABLE drops ADD COLUMN fingerprint TEXT;
+ALTER TABLE review_queue ADD COLUMN fingerprint TEXT;
+"""),
+    (3, """
+ALTER TABLE drops ADD COLUMN source_text TEXT;
+"""),
+    (4, """
+CREATE TABLE IF NOT EXISTS media_cache (
+  card_key TEXT PRIMARY KEY,
+  media_id TEXT NOT NULL,
+  expires_at TEXT NOT NULL
+);
+"""),
+    (5, """
+CREATE TABLE IF NOT EXISTS post_jobs (
+  job_key TEXT PRIMARY KEY,
+  card_title TEXT NOT NULL,
+  card_project TEXT NOT NULL,
+  card_footer TEXT NOT NULL,
+  status TEXT NOT NULL DEFAULT 'open',
+  root_tweet_id TEXT,
+  created_at TEXT NOT NULL,
+  done_at TEXT
+);
+CREATE TABLE IF NOT EXISTS post_journal (
+  job_key TEXT NOT NULL,
+  step INTEGER NOT NULL,
+  kind TEXT NOT NULL,
+  text TEXT NOT NULL,
+  status TEXT NOT NULL DEFAULT 'planned',
+  attempts INTEGER NOT NULL DEFAULT 0,
+  tweet_id TEXT,
+  latency_ms INTEGER,
+  updated_at TEXT NOT NULL,
+  PRIMARY KEY (job_key, step)
+);
+CREATE INDEX IF NOT EXISTS idx_post_jobs_open ON post_jobs(status) WHERE status = 'open';
+"""),
+    (6, """
+ALTER TABLE metrics ADD COLUMN name TEXT;
+ALTER TABLE metrics ADD COLUMN score INTEGER;
+ALTER TABLE metrics ADD COLUMN ref TEXT;
+ALTER TABLE metrics ADD COLUMN value REAL;
+-- backfill the old pipe-joined details: "name|score" and "name|root_id|score"
+UPDATE metrics SET
+  name = substr(detail, 1, instr(detail, '|') - 1),
+  score = CAST(substr(detail, instr(detail, '|') + 1) AS INTEGER)
+WHERE instr(detail, '|') > 0 AND instr(substr(detail, instr(detail, '|') + 1), '|') = 0
+  AND substr(detail, instr(detail, '|') + 1) GLOB '[0-9]*';
+UPDATE metrics SET
+  name = substr(detail, 1, instr(detail, '|') - 1),
+  ref = substr(substr(detail, instr(detail, '|') + 1), 1, instr(substr(detail, instr(detail, '|') + 1), '|') - 1),
+  score = CAST(substr(substr(detail, instr(detail, '|') + 1), instr(substr(detail, instr(detail, '|') + 1), '|') + 1) AS INTEGER)
+WHERE event IN ('posted', 'approve_posted') AND instr(substr(detail, instr(detail, '|') + 1), '|') > 0;
+CREATE INDEX IF NOT EXISTS idx_metrics_event_ts ON metrics(event, ts);
+"""),
+    (7, """
+ALTER TABLE review_queue ADD COLUMN handle TEXT;
+ALTER TABLE review_queue ADD COLUMN verified_at TEXT;
+ALTER TABLE review_queue ADD COLUMN priority REAL;
+UPDATE review_queue SET verified_at = created_at;
+DROP INDEX IF EXISTS idx_queue_approved_rank;
+CREATE INDEX IF NOT EXISTS idx_queue_priority ON review_queue(approved, priority DESC);
+CREATE INDEX IF NOT EXISTS idx_queue_created ON review_queue(created_at);
+"""),
+    (8, """
+CREATE TABLE IF NOT EXISTS work_runs (
+  id INTEGER PRIMARY KEY AUTOINCREMENT,
+  items INTEGER NOT NULL DEFAULT 0,
+  created_at TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS work_items (
+  account TEXT NOT NULL,
+  tweet_id TEXT NOT NULL,
+  run_id INTEGER NOT NULL,
+  seq INTEGER NOT NULL,
+  payload TEXT NOT NULL,
+  status TEXT NOT NULL DEFAULT 'ready',
+  owner TEXT,
+  lease_until TEXT,
+  attempts INTEGER NOT NULL DEFAULT 0,
+  created_at TEXT NOT NULL,
+  updated_at TEXT NOT NULL,
+  PRIMARY KEY (account, tweet_id)
+);
+CREATE INDEX IF NOT EXISTS idx_work_items_next ON work_items(status, run_id, seq);
+CREATE TABLE IF NOT EXISTS work_posts (
+  run_id INTEGER NOT NULL,
+  account TEXT NOT NULL,
+  posted INTEGER NOT NULL DEFAULT 0,
+  PRIMARY KEY (run_id, account)
+);
+CREATE TABLE IF NOT EXISTS leases (
+  name TEXT PRIMARY KEY,
+  owner TEXT NOT NULL,
+  expires_at TEXT NOT NULL
+);
+"""),
+    (9, """
+-- yield_ewma held absolute unique counts; restart it as unique per fetched from the totals
+UPDATE search_shards SET yield_ewma = CASE WHEN fetched > 0 THEN 1.0 * uniq / fetched END;
+"""),
+    (10, """
+ALTER TABLE drops ADD COLUMN failed_at TEXT;
+"""),
+]
+
+def _parse_ts(ts: str) -> datetime:
+    return datetime.fromisoformat(ts)
+
 def now() -> str:
     return datetime.now(timezone.utc).isoformat()
 
 def today_utc() -> str:
     return date.today().isoformat()
 
-def connect() -> sqlite3.Connection:
-    DB_PATH.parent.mkdir(parents=True, exist_ok=True)
-    conn = sqlite3.connect(DB_PATH)
+# producer/worker processes share one database; writers wait for each other instead of failing
+BUSY_TIMEOUT_S = 30
+
+def connect(path: Path = DB_PATH) -> sqlite3.Connection:
+    path.parent.mkdir(parents=True, exist_ok=True)
+    conn = sqlite3.connect(path, timeout=BUSY_TIMEOUT_S)
     conn.row_factory = sqlite3.Row
     conn.executescript(SCHEMA)
+    migrate(conn)
     return conn
 
-def log_metric(conn: sqlite3.Connection, event: str, detail: str | None = None) -> None:
-    conn.execute("INSERT INTO metrics(ts,event,detail) VALUES(?,?,?)", (now(), event, detail))
+def _statements(script: str) -> list[str]:
+    out, buf = [], ""
+    for line in script.splitlines(keepends=True):
+        buf += line
+        if sqlite3.complete_statement(buf):
+            out.append(buf.strip())
+            buf = ""
+    return out
+
+def migrate(conn: sqlite3.Connection) -> int:
+    """Apply pending MIGRATIONS in one write transaction, so concurrent openers migrate once."""
+    ver = conn.execute("PRAGMA user_version").fetchone()[0]
+    if ver >= MIGRATIONS[-1][0]:
+        return ver
+    if conn.in_transaction:
+        conn.commit()
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        ver = conn.execute("PRAGMA user_version").fetchone()[0]
+        for v, script in MIGRATIONS:
+            if v <= ver:
+                continue
+            for stmt in _statements(script):
+                conn.execute(stmt)
+            conn.execute(f"PRAGMA user_version={v}")
+            ver = v
+        conn.commit()
+    except BaseException:
+        conn.rollback()
+        raise
+    return ver
+
+METRIC_COLUMNS = "ts,event,detail,name,score,ref,value"
+
+def _metric_row(event: str, detail: str | None, name: str | None, score: int | None, ref: str | None,
+                value: float | None) -> tuple:
+    return (now(), event, detail, name, None if score is None else int(score),
+            None if ref is None else str(ref), None if value is None else float(value))
+
+def log_metric(conn: sqlite3.Connection, event: str, detail: str | None = None, name: str | None = None,
+               score: int | None = None, ref: str | None = None, value: float | None = None) -> None:
+    """One metrics row: project name, score, a reference id (tweet/root/dupe key) and a numeric value are typed columns."""
+    conn.execute(f"INSERT INTO metrics({METRIC_COLUMNS}) VALUES(?,?,?,?,?,?,?)",
+                 _metric_row(event, detail, name, score, ref, value))
     conn.commit()
 
 def mark_seen(conn: sqlite3.Connection, tweet_id: str) -> bool:
@@ -79,20 +281,37 @@ def mark_seen(conn: sqlite3.Connection, tweet_id: str) -> bool:
     except sqlite3.IntegrityError:
         return False
 
+SQL_IN_CHUNK = 500  # stay well below SQLITE_MAX_VARIABLE_NUMBER on old builds
+
+def filter_unseen(conn: sqlite3.Connection, tweet_ids: list[str]) -> list[str]:
+    """The ids from tweet_ids (order kept) that are not in `seen` yet."""
+    seen = set()
+    ids = list(dict.fromkeys(tweet_ids))
+    for start in range(0, len(ids), SQL_IN_CHUNK):
+        chunk = ids[start:start + SQL_IN_CHUNK]
+        marks = ",".join("?" * len(chunk))
+        seen.update(r[0] for r in conn.execute(f"SELECT tweet_id FROM seen WHERE tweet_id IN ({marks})", chunk))
+    return [t for t in ids if t not in seen]
+
 def has_dupe(conn: sqlite3.Connection, dupe_key: str) -> bool:
-    r = conn.execute("SELECT 1 FROM drops WHERE dupe_key=?", (dupe_key,)).fetchone()
+    r = conn.execute("SELECT 1 FROM drops WHERE dupe_key=? AND failed_at IS NULL", (dupe_key,)).fetchone()
     if r:
         return True
     r2 = conn.execute("SELECT 1 FROM review_queue WHERE dupe_key=?", (dupe_key,)).fetchone()
     return r2 is not None
 
 def insert_drop(conn: sqlite3.Connection, dupe_key: str, name: str, official_url: str, official_domain: str | None,
-                verified: bool, score: int) -> int:
+                verified: bool, score: int, fingerprint: str | None = None, source_text: str | None = None) -> int:
     cur = conn.cursor()
+    # a drop whose thread was abandoned does not block the project coming back
+    cur.execute("DELETE FROM drops WHERE dupe_key=? AND failed_at IS NOT NULL", (dupe_key,))
     cur.execute(
-        """INSERT INTO drops(dupe_key,name,official_url,official_domain,verified,score,created_at)
-           VALUES(?,?,?,?,?,?,?)""",
-        (dupe_key, name, official_url, official_domain, 1 if verified else 0, int(score), now()),
+        """INSERT INTO drops(dupe_key,name,official_url,official_domain,verified,score,created_at,fingerprint,source_text)
+           VALUES(?,?,?,?,?,?,?,?,?)""",
+        (
+            dupe_key, name, official_url, official_domain, 1 if verified else 0, int(score), now(), fingerprint,
+            (source_text or "")[:2000] or None
+        ),
     )
     conn.commit()
     return int(cur.lastrowid)
@@ -101,6 +320,14 @@ def mark_posted(conn: sqlite3.Connection, drop_id: int, root_tweet_id: str) -> N
     conn.execute("UPDATE drops SET root_tweet_id=?, posted_at=? WHERE id=?", (root_tweet_id, now(), drop_id))
     conn.commit()
 
+def count_posted_since(conn: sqlite3.Connection, hours: float) -> int:
+    cut = (datetime.now(timezone.utc) - timedelta(hours=hours)).isoformat()
+    return conn.execute("SELECT COUNT(*) FROM drops WHERE posted_at >= ?", (cut,)).fetchone()[0]
+
+def mark_drop_failed(conn: sqlite3.Connection, drop_id: int) -> None:
+    conn.execute("UPDATE drops SET failed_at=? WHERE id=? AND posted_at IS NULL", (now(), drop_id))
+    conn.commit()
+
 def inc_post_counter(conn: sqlite3.Connection) -> int:
     row = conn.execute("SELECT v FROM meta WHERE k='post_counter'").fetchone()
     cur = int(row["v"]) if row else 0
@@ -116,6 +343,14 @@ def get_post_counter(conn: sqlite3.Connection) -> int:
     row = conn.execute("SELECT v FROM meta WHERE k='post_counter'").fetchone()
     return int(row["v"]) if row else 0
 
+def get_meta(conn: sqlite3.Connection, k: str) -> str | None:
+    row = conn.execute("SELECT v FROM meta WHERE k=?", (k,)).fetchone()
+    return row["v"] if row else None
+
+def set_meta(conn: sqlite3.Connection, k: str, v: str) -> None:
+    conn.execute("INSERT INTO meta(k,v) VALUES(?,?) ON CONFLICT(k) DO UPDATE SET v=excluded.v", (k, v))
+    conn.commit()
+
 def get_last_digest_day(conn: sqlite3.Connection) -> str | None:
     row = conn.execute("SELECT v FROM meta WHERE k='last_digest_day'").fetchone()
     return row["v"] if row else None
@@ -137,15 +372,27 @@ def top_recent_drops(conn: sqlite3.Connection, limit: int = 8):
         (limit,),
     ).fetchall()
 
+QUEUE_COLUMNS = ("dupe_key,name,official_url,official_domain,verified,score,reason,source_tweet_id,source_text,"
+                 "created_at,approved,fingerprint,handle,verified_at,priority")
+
+def queue_priority(score: int, created: float, half_life_h: float) -> float:
+    """Sort key for the decayed priority score * 0.5 ** (age / half_life): log2(score) + created / half_life."""
+    return math.log2(max(1, int(score))) + created / (half_life_h * 3600)
+
+def decayed_priority(priority: float | None, half_life_h: float, at: float) -> float:
+    """Current priority (score units) of a queue_priority() key."""
+    return 0.0 if priority is None else 2 ** (priority - at / (half_life_h * 3600))
+
 def enqueue_review(conn: sqlite3.Connection, dupe_key: str, name: str, official_url: str, official_domain: str | None,
-                   verified: bool, score: int, reason: str, source_tweet_id: str | None, source_text: str | None) -> None:
+                   verified: bool, score: int, reason: str, source_tweet_id: str | None, source_text: str | None,
+                   fingerprint: str | None = None, handle: str | None = None, priority: float | None = None) -> None:
     try:
+        ts = now()
         conn.execute(
-            """INSERT INTO review_queue(dupe_key,name,official_url,official_domain,verified,score,reason,source_tweet_id,source_text,created_at,approved)
-               VALUES(?,?,?,?,?,?,?,?,?,?,0)""",
+            f"INSERT INTO review_queue({QUEUE_COLUMNS}) VALUES(?,?,?,?,?,?,?,?,?,?,0,?,?,?,?)",
             (
                 dupe_key, name, official_url, official_domain, 1 if verified else 0, int(score),
-                reason, source_tweet_id, (source_text or "")[:2000], now()
+                reason, source_tweet_id, (source_text or "")[:2000], ts, fingerprint, handle, ts, priority
             ),
         )
         conn.commit()
@@ -158,18 +405,24 @@ def approve_top(conn: sqlite3.Connection, limit: int) -> None:
            SET approved=1
            WHERE id IN (
              SELECT id FROM review_queue WHERE approved=0
-             ORDER BY score DESC, created_at ASC
+             ORDER BY priority DESC
              LIMIT ?
            )""",
         (limit,),
     )
     conn.commit()
 
+def get_drop(conn: sqlite3.Connection, drop_id: int):
+    return conn.execute("SELECT * FROM drops WHERE id=?", (drop_id,)).fetchone()
+
+def find_drop(conn: sqlite3.Connection, dupe_key: str):
+    return conn.execute("SELECT id, posted_at FROM drops WHERE dupe_key=? AND failed_at IS NULL", (dupe_key,)).fetchone()
+
 def pop_approved(conn: sqlite3.Connection, limit: int):
     return conn.execute(
         """SELECT * FROM review_queue
            WHERE approved=1
-           ORDER BY score DESC, created_at ASC
+           ORDER BY priority DESC
            LIMIT ?""",
         (limit,),
     ).fetchall()
@@ -177,3 +430,414 @@ def pop_approved(conn: sqlite3.Connection, limit: int):
 def remove_from_queue(conn: sqlite3.Connection, queue_id: int) -> None:
     conn.execute("DELETE FROM review_queue WHERE id=?", (queue_id,))
     conn.commit()
+
+def remove_from_queue_by_key(conn: sqlite3.Connection, dupe_key: str) -> None:
+    conn.execute("DELETE FROM review_queue WHERE dupe_key=?", (dupe_key,))
+    conn.commit()
+
+def remove_from_queue_many(conn: sqlite3.Connection, queue_ids: list[int]) -> None:
+    with conn:
+        conn.executemany("DELETE FROM review_queue WHERE id=?", [(int(q),) for q in queue_ids])
+
+def expire_queue(conn: sqlite3.Connection, ttl_days: int) -> int:
+    """Drop unapproved queue items older than ttl_days. Returns count."""
+    cut = (datetime.now(timezone.utc) - timedelta(days=ttl_days)).isoformat()
+    with conn:
+        return conn.execute("DELETE FROM review_queue WHERE approved=0 AND created_at < ?", (cut,)).rowcount
+
+def reprioritize_queue(conn: sqlite3.Connection, half_life_h: float, force: bool = False) -> int:
+    """Fill in missing queue priority keys (all of them if the half-life changed, or force). Returns rows updated."""
+    force = force or get_meta(conn, "queue_half_life_h") != str(half_life_h)
+    where = "" if force else " WHERE priority IS NULL"
+    rows = conn.execute(f"SELECT id, score, created_at FROM review_queue{where}").fetchall()
+    with conn:
+        conn.executemany("UPDATE review_queue SET priority=? WHERE id=?", [
+            (queue_priority(r["score"], _parse_ts(r["created_at"]).timestamp(), half_life_h), r["id"]) for r in rows
+        ])
+    set_meta(conn, "queue_half_life_h", str(half_life_h))
+    return len(rows)
+
+def update_queue_verification(conn: sqlite3.Connection, rows: list[dict], half_life_h: float) -> None:
+    """Store re-verification results (verified, handle, score, verified_at) for queue rows, in one transaction."""
+    with conn:
+        conn.executemany(
+            "UPDATE review_queue SET verified=?, handle=?, score=?, verified_at=?, priority=? WHERE id=?",
+            [(int(r["verified"]), r["handle"], int(r["score"]), r["verified_at"],
+              queue_priority(r["score"], _parse_ts(r["created_at"]).timestamp(), half_life_h), r["id"])
+             for r in rows],
+        )
+
+def queue_rows(conn: sqlite3.Connection):
+    """The whole review queue, highest priority first."""
+    return conn.execute("SELECT * FROM review_queue ORDER BY approved DESC, priority DESC").fetchall()
+
+def apply_review_decisions(conn: sqlite3.Connection, decisions: dict[str, str]) -> dict[str, int]:
+    """
+    Apply {dupe_key: approve | hold | reject} in one transaction. Returns
+    counts per decision plus "missing" for keys no longer in the queue.
+    """
+    out = {"approve": 0, "hold": 0, "reject": 0, "missing": 0}
+    sql = {
+        "approve": "UPDATE review_queue SET approved=1 WHERE dupe_key=?",
+        "hold": "UPDATE review_queue SET approved=0 WHERE dupe_key=?",
+        "reject": "DELETE FROM review_queue WHERE dupe_key=?",
+    }
+    with conn:
+        for key, d in decisions.items():
+            n = conn.execute(sql[d], (key,)).rowcount
+            out[d if n else "missing"] += 1
+    return out
+
+def get_verify_cache(conn: sqlite3.Connection, domain: str | None):
+    if not domain:
+        return None
+    return conn.execute("SELECT * FROM verify_cache WHERE domain=?", (domain,)).fetchone()
+
+def put_verify_cache(conn: sqlite3.Connection, r: dict) -> None:
+    put_verify_cache_many(conn, [r])
+
+def put_verify_cache_many(conn: sqlite3.Connection, rows: list[dict]) -> None:
+    ts = now()
+    conn.executemany(
+        """INSERT INTO verify_cache(domain,url,handle,verified,outcome,http_status,etag,last_modified,checked_at)
+           VALUES(?,?,?,?,?,?,?,?,?)
+           ON CONFLICT(domain) DO UPDATE SET
+             url=excluded.url, handle=excluded.handle, verified=excluded.verified, outcome=excluded.outcome,
+             http_status=excluded.http_status, etag=excluded.etag, last_modified=excluded.last_modified,
+             checked_at=excluded.checked_at""",
+        [
+            (
+                r["domain"], r.get("url"), r.get("handle"), 1 if r.get("verified") else 0, r["outcome"],
+                r.get("http_status"), r.get("etag"), r.get("last_modified"), ts
+            )
+            for r in rows if r.get("domain")
+        ],
+    )
+    conn.commit()
+
+def verify_cache_fresh(row, ttl_ok_h: int, ttl_neg_h: int, ttl_err_h: int, max_age_h: float | None = None) -> bool:
+    """Positive, negative (no handle / no match) and error verdicts age out separately (and all after max_age_h)."""
+    if row is None:
+        return False
+    if row["outcome"] == "verified":
+        ttl = ttl_ok_h
+    elif row["outcome"] == "error":
+        ttl = ttl_err_h
+    else:
+        ttl = ttl_neg_h
+    if max_age_h is not None:
+        ttl = min(ttl, max_age_h)
+    age = datetime.now(timezone.utc) - _parse_ts(row["checked_at"])
+    return age.total_seconds() < ttl * 3600
+
+def get_media_cache(conn: sqlite3.Connection, card_key: str) -> str | None:
+    """Uploaded media id for this card, if X still holds it."""
+    r = conn.execute("SELECT media_id FROM media_cache WHERE card_key=? AND expires_at > ?", (card_key, now())).fetchone()
+    return r["media_id"] if r else None
+
+def put_media_cache(conn: sqlite3.Connection, card_key: str, media_id: str, ttl_s: int) -> None:
+    expires = (datetime.now(timezone.utc) + timedelta(seconds=ttl_s)).isoformat()
+    conn.execute(
+        "INSERT INTO media_cache(card_key,media_id,expires_at) VALUES(?,?,?) "
+        "ON CONFLICT(card_key) DO UPDATE SET media_id=excluded.media_id, expires_at=excluded.expires_at",
+        (card_key, media_id, expires),
+    )
+    conn.commit()
+
+def drop_media_cache(conn: sqlite3.Connection, card_key: str) -> None:
+    conn.execute("DELETE FROM media_cache WHERE card_key=?", (card_key,))
+    conn.commit()
+
+def plan_post_job(conn: sqlite3.Connection, job_key: str, card_title: str, card_project: str, card_footer: str,
+                  steps: list[tuple[str, str]]) -> None:
+    """Journal a thread as (kind, text) steps. A job that is already planned keeps its original texts."""
+    ts = now()
+    with conn:
+        cur = conn.execute(
+            "INSERT OR IGNORE INTO post_jobs(job_key,card_title,card_project,card_footer,created_at) VALUES(?,?,?,?,?)",
+            (job_key, card_title, card_project, card_footer, ts),
+        )
+        if cur.rowcount:
+            conn.executemany(
+                "INSERT INTO post_journal(job_key,step,kind,text,updated_at) VALUES(?,?,?,?,?)",
+                [(job_key, n, kind, text, ts) for n, (kind, text) in enumerate(steps)],
+            )
+
+def get_post_job(conn: sqlite3.Connection, job_key: str):
+    return conn.execute("SELECT * FROM post_jobs WHERE job_key=?", (job_key,)).fetchone()
+
+def get_post_steps(conn: sqlite3.Connection, job_key: str):
+    return conn.execute("SELECT * FROM post_journal WHERE job_key=? ORDER BY step", (job_key,)).fetchall()
+
+def open_post_jobs(conn: sqlite3.Connection):
+    return conn.execute("SELECT * FROM post_jobs WHERE status='open' ORDER BY created_at").fetchall()
+
+def set_post_step(conn: sqlite3.Connection, job_key: str, step: int, status: str,
+                  tweet_id: str | None = None, latency_ms: int | None = None) -> None:
+    """Record a step transition; moving to 'sending' counts an attempt and is committed before the request."""
+    conn.execute(
+        """UPDATE post_journal SET status=?, tweet_id=COALESCE(?, tweet_id), latency_ms=COALESCE(?, latency_ms),
+             attempts=attempts + (? = 'sending'), updated_at=?
+           WHERE job_key=? AND step=?""",
+        (status, tweet_id, latency_ms, status, now(), job_key, step),
+    )
+    conn.commit()
+
+def close_post_job(conn: sqlite3.Connection, job_key: str, status: str, root_tweet_id: str | None = None) -> None:
+    conn.execute(
+        "UPDATE post_jobs SET status=?, root_tweet_id=COALESCE(?, root_tweet_id), done_at=? WHERE job_key=?",
+        (status, root_tweet_id, now(), job_key),
+    )
+    conn.commit()
+
+def prune(conn: sqlite3.Connection, seen_days: int, metrics_days: int, vacuum: bool = True) -> dict:
+    """Retention job: drop old seen ids, cache entries, journals and work items, roll up old metrics, then VACUUM."""
+    seen_cut = (datetime.now(timezone.utc) - timedelta(days=seen_days)).isoformat()
+    metrics_cut = (datetime.now(timezone.utc) - timedelta(days=metrics_days)).isoformat()
+    with conn:
+        conn.execute(
+            """INSERT INTO metrics_daily(day, event, n)
+               SELECT substr(ts, 1, 10), event, COUNT(*) FROM metrics WHERE ts < ? GROUP BY 1, 2
+               ON CONFLICT(day, event) DO UPDATE SET n = n + excluded.n""",
+            (metrics_cut,),
+        )
+        out = {
+            "metrics": conn.execute("DELETE FROM metrics WHERE ts < ?", (metrics_cut,)).rowcount,
+            "seen": conn.execute("DELETE FROM seen WHERE created_at < ?", (seen_cut,)).rowcount,
+            "verify_cache": conn.execute("DELETE FROM verify_cache WHERE checked_at < ?", (seen_cut,)).rowcount,
+            "media_cache": conn.execute("DELETE FROM media_cache WHERE expires_at < ?", (now(),)).rowcount,
+        }
+        conn.execute(
+            "DELETE FROM post_journal WHERE job_key IN "
+            "(SELECT job_key FROM post_jobs WHERE status != 'open' AND done_at < ?)",
+            (seen_cut,),
+        )
+        out["post_jobs"] = conn.execute("DELETE FROM post_jobs WHERE status != 'open' AND done_at < ?", (seen_cut,)).rowcount
+        out["work_items"] = conn.execute(
+            "DELETE FROM work_items WHERE status IN ('done', 'failed') AND updated_at < ?", (seen_cut,)
+        ).rowcount
+        conn.execute("DELETE FROM work_posts WHERE run_id IN (SELECT id FROM work_runs WHERE created_at < ?)", (seen_cut,))
+        conn.execute("DELETE FROM work_runs WHERE created_at < ?", (seen_cut,))
+    if vacuum:
+        conn.execute("VACUUM")
+    return out
+
+def _ts_in(seconds: float) -> str:
+    return (datetime.now(timezone.utc) + timedelta(seconds=seconds)).isoformat()
+
+def enqueue_work(conn: sqlite3.Connection, items: dict[str, list[dict]]) -> tuple[int, int]:
+    """
+    Add one producer run ({account: candidates}) to the work queue, skipping tweets already queued.
+    Returns (run id, items added).
+    """
+    ts = now()
+    with conn:
+        run_id = conn.execute("INSERT INTO work_runs(created_at) VALUES(?)", (ts,)).lastrowid
+        added = 0
+        for account, cands in items.items():
+            added += conn.executemany(
+                "INSERT OR IGNORE INTO work_items(account,tweet_id,run_id,seq,payload,created_at,updated_at) "
+                "VALUES(?,?,?,?,?,?,?)",
+                [(account, c["tweet_id"], run_id, n, json.dumps(c, default=str), ts, ts) for n, c in enumerate(cands)],
+            ).rowcount
+        conn.execute("UPDATE work_runs SET items=? WHERE id=?", (added, run_id))
+    return int(run_id), added
+
+def lease_work(conn: sqlite3.Connection, owner: str, limit: int, lease_s: float, statuses: tuple[str, ...],
+               account: str | None = None, max_attempts: int = 3) -> tuple[int | None, list[dict]]:
+    """
+    Lease up to `limit` items of the oldest producer run to owner; items leased max_attempts times fail instead.
+    Returns (run id, candidates), (None, []) when idle.
+    """
+    ts = now()
+    marks = ",".join("?" * len(statuses))
+    where = f"(status IN ({marks}) OR (status = 'leased' AND lease_until < ?))"
+    args: list = [*statuses, ts]
+    if account is not None:
+        where += " AND account = ?"
+        args.append(account)
+    if conn.in_transaction:
+        conn.commit()
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        conn.execute(f"UPDATE work_items SET status='failed', owner=NULL, updated_at=? "
+                     f"WHERE {where} AND attempts >= ?", [ts, *args, max_attempts])
+        row = conn.execute(f"SELECT run_id FROM work_items WHERE {where} ORDER BY run_id LIMIT 1", args).fetchone()
+        if row is None:
+            conn.commit()
+            return None, []
+        rows = conn.execute(f"SELECT account, tweet_id, payload FROM work_items WHERE {where} AND run_id = ? "
+                            f"ORDER BY seq LIMIT ?", [*args, row["run_id"], limit]).fetchall()
+        conn.executemany(
+            "UPDATE work_items SET status='leased', owner=?, lease_until=?, attempts=attempts+1, updated_at=? "
+            "WHERE account=? AND tweet_id=?",
+            [(owner, _ts_in(lease_s), ts, r["account"], r["tweet_id"]) for r in rows],
+        )
+        conn.commit()
+    except BaseException:
+        conn.rollback()
+        raise
+    return int(row["run_id"]), [dict(json.loads(r["payload"]), account=r["account"]) for r in rows]
+
+def finish_work(conn: sqlite3.Connection, owner: str, items: list[dict], status: str = "done") -> int:
+    """Move owner's leased items to status ('done' or 'verified'). Returns items updated."""
+    ts = now()
+    with conn:
+        return conn.executemany(
+            "UPDATE work_items SET status=?, owner=NULL, lease_until=NULL, updated_at=?, "
+            "attempts=CASE WHEN ?='verified' THEN MAX(0, attempts-1) ELSE attempts END "
+            "WHERE account=? AND tweet_id=? AND owner=? AND status='leased'",
+            [(status, ts, status, c["account"], c["tweet_id"], owner) for c in items],
+        ).rowcount
+
+def renew_work(conn: sqlite3.Connection, owner: str, items: list[dict], lease_s: float) -> None:
+    """Extend owner's lease on items by lease_s from now."""
+    with conn:
+        conn.executemany(
+            "UPDATE work_items SET lease_until=? WHERE account=? AND tweet_id=? AND owner=? AND status='leased'",
+            [(_ts_in(lease_s), c["account"], c["tweet_id"], owner) for c in items],
+        )
+
+def release_work(conn: sqlite3.Connection, owner: str, items: list[dict], count_attempt: bool = False) -> None:
+    """Hand owner's leased items back to the queue at once; the attempt is given back unless count_attempt."""
+    with conn:
+        conn.executemany(
+            "UPDATE work_items SET status='ready', owner=NULL, lease_until=NULL, "
+            "attempts=CASE WHEN ? THEN attempts ELSE MAX(0, attempts-1) END, "
+            "updated_at=? WHERE account=? AND tweet_id=? AND owner=? AND status='leased'",
+            [(int(count_attempt), now(), c["account"], c["tweet_id"], owner) for c in items],
+        )
+
+def work_counts(conn: sqlite3.Connection) -> dict[str, int]:
+    return {r["status"]: r["n"] for r in conn.execute("SELECT status, COUNT(*) AS n FROM work_items GROUP BY status")}
+
+def work_posted(conn: sqlite3.Connection, run_id: int, account: str) -> int:
+    r = conn.execute("SELECT posted FROM work_posts WHERE run_id=? AND account=?", (run_id, account)).fetchone()
+    return int(r["posted"]) if r else 0
+
+def add_work_posted(conn: sqlite3.Connection, run_id: int, account: str, n: int) -> None:
+    conn.execute(
+        "INSERT INTO work_posts(run_id,account,posted) VALUES(?,?,?) "
+        "ON CONFLICT(run_id, account) DO UPDATE SET posted=posted+excluded.posted",
+        (run_id, account, n),
+    )
+    conn.commit()
+
+def acquire_lease(conn: sqlite3.Connection, name: str, owner: str, ttl_s: float) -> bool:
+    """Take or renew the named lease for ttl_s seconds; only possible while it is free, expired or already ours."""
+    ts = now()
+    with conn:
+        conn.execute(
+            """INSERT INTO leases(name, owner, expires_at) VALUES(?,?,?)
+               ON CONFLICT(name) DO UPDATE SET owner=excluded.owner, expires_at=excluded.expires_at
+               WHERE leases.owner = excluded.owner OR leases.expires_at < ?""",
+            (name, owner, _ts_in(ttl_s), ts),
+        )
+        r = conn.execute("SELECT owner FROM leases WHERE name=?", (name,)).fetchone()
+    return r is not None and r["owner"] == owner
+
+def release_lease(conn: sqlite3.Connection, name: str, owner: str) -> None:
+    with conn:
+        conn.execute("DELETE FROM leases WHERE name=? AND owner=?", (name, owner))
+
+RESCORE_CHUNK = 5000
+
+def rescore_table(conn: sqlite3.Connection, table: str, score_batch) -> tuple[int, int]:
+    """
+    Recompute `score` for drops/review_queue rows with source text, in one transaction.
+    Returns (rows scored, rows changed).
+    """
+    assert table in ("drops", "review_queue")
+    scored = 0
+    cur = conn.execute(
+        f"SELECT id, source_text, official_url, verified, score FROM {table} WHERE source_text IS NOT NULL"
+    )
+    updates = []
+    while True:
+        rows = cur.fetchmany(RESCORE_CHUNK)
+        if not rows:
+            break
+        scores, _ = score_batch([r["source_text"] for r in rows], [r["official_url"] for r in rows],
+                                [bool(r["verified"]) for r in rows])
+        scored += len(rows)
+        updates.extend((sc, r["id"]) for r, sc in zip(rows, scores) if sc != r["score"])
+    with conn:
+        conn.executemany(f"UPDATE {table} SET score=? WHERE id=?", updates)
+    return scored, len(updates)
+
+SHARD_EWMA_ALPHA = 0.3
+
+def get_shard_stats(conn: sqlite3.Connection) -> dict:
+    return {r["shard"]: r for r in conn.execute("SELECT * FROM search_shards").fetchall()}
+
+def update_shard_stats(conn: sqlite3.Connection, runs: list[dict]) -> None:
+    """Record one run per shard: totals, the new since_id and a smoothed yield (unique per fetched)."""
+    for r in runs:
+        row = conn.execute("SELECT yield_ewma, since_id FROM search_shards WHERE shard=?", (r["shard"],)).fetchone()
+        prev = row["yield_ewma"] if row is not None else None
+        y = r["unique"] / r["fetched"] if r["fetched"] else None
+        if y is None:
+            ewma = prev
+        else:
+            ewma = y if prev is None else (1 - SHARD_EWMA_ALPHA) * prev + SHARD_EWMA_ALPHA * y
+        since_id = r["newest_id"] or (row["since_id"] if row is not None else None)
+        conn.execute(
+            """INSERT INTO search_shards(shard,query,since_id,runs,fetched,uniq,yield_ewma,updated_at)
+               VALUES(?,?,?,1,?,?,?,?)
+               ON CONFLICT(shard) DO UPDATE SET
+                 query=excluded.query, since_id=excluded.since_id, runs=runs+1,
+                 fetched=fetched+excluded.fetched, uniq=uniq+excluded.uniq,
+                 yield_ewma=excluded.yield_ewma, updated_at=excluded.updated_at""",
+            (r["shard"], r["query"], since_id, r["fetched"], int(round(r["unique"])), ewma, now()),
+        )
+    conn.commit()
+
+class Batch:
+    """Buffers seen ids, metrics and review-queue inserts for one run; flush() writes them in one transaction."""
+
+    def __init__(self, conn: sqlite3.Connection):
+        self.conn = conn
+        self._seen: list[tuple[str, str]] = []
+        self._metrics: list[tuple] = []
+        self._queue: list[tuple] = []
+        self._queue_keys: set[str] = set()
+
+    def mark_seen(self, tweet_id: str) -> None:
+        self._seen.append((tweet_id, now()))
+
+    def log_metric(self, event: str, detail: str | None = None, name: str | None = None,
+                   score: int | None = None, ref: str | None = None, value: float | None = None) -> None:
+        self._metrics.append(_metric_row(event, detail, name, score, ref, value))
+
+    def enqueue_review(self, dupe_key: str, name: str, official_url: str, official_domain: str | None,
+                       verified: bool, score: int, reason: str, source_tweet_id: str | None,
+                       source_text: str | None, fingerprint: str | None = None, handle: str | None = None,
+                       priority: float | None = None) -> None:
+        if dupe_key in self._queue_keys:
+            return
+        self._queue_keys.add(dupe_key)
+        ts = now()
+        self._queue.append((
+            dupe_key, name, official_url, official_domain, 1 if verified else 0, int(score),
+            reason, source_tweet_id, (source_text or "")[:2000], ts, fingerprint, handle, ts, priority
+        ))
+
+    def pending(self) -> int:
+        return len(self._seen) + len(self._metrics) + len(self._queue)
+
+    def flush(self) -> None:
+        if not self.pending():
+            return
+        with instrument.stage("db_flush"), self.conn:
+            if self._seen:
+                self.conn.executemany("INSERT OR IGNORE INTO seen(tweet_id, created_at) VALUES(?,?)", self._seen)
+            if self._metrics:
+                self.conn.executemany(f"INSERT INTO metrics({METRIC_COLUMNS}) VALUES(?,?,?,?,?,?,?)", self._metrics)
+            if self._queue:
+                self.conn.executemany(
+                    f"INSERT OR IGNORE INTO review_queue({QUEUE_COLUMNS}) VALUES(?,?,?,?,?,?,?,?,?,?,0,?,?,?,?)",
+                    self._queue,
+                )
+        self._seen.clear()
+        self._metrics.clear()
+        self._queue.clear()
@@ -0,0 +1,159 @@
+from __future__ import annotations
+import hashlib
+import re
+from datetime import datetime, timedelta, timezone
+from urllib.parse import urlparse
+
+from src.verify import host
+
+# Public suffixes with more than one label, plus hosting platforms where every
+# subdomain is a different site. Not the full PSL, just what shows up in practice.
+MULTI_PART_SUFFIXES = {
+    "co.uk", "org.uk", "ac.uk", "com.au", "net.au", "co.jp", "co.kr", "co.in", "co.id", "co.nz",
+    "com.br", "com.cn", "com.hk", "com.sg", "com.tr", "com.mx", "com.ar", "com.vn", "com.ua",
+    "github.io", "gitbook.io", "notion.site", "vercel.app", "netlify.app", "pages.dev", "web.app",
+    "firebaseapp.com", "herokuapp.com", "substack.com", "medium.com", "blogspot.com", "wordpress.com",
+    "webflow.io", "carrd.co", "framer.website", "framer.ai", "super.site", "eth.limo", "eth.link",
+}
+
+# Path-based platforms hosting many unrelated projects: the first meaningful
+# path segment is part of the project identity.
+SHARED_HOSTS = {
+    "medium.com", "mirror.xyz", "paragraph.xyz", "github.com", "gitlab.com", "notion.so",
+    "docs.google.com", "forms.gle", "youtube.com", "galxe.com", "app.galxe.com", "zealy.io",
+    "layer3.xyz", "app.layer3.xyz", "taskon.xyz", "gleam.io", "questn.com", "intract.io",
+    "x.com", "twitter.com", "t.me", "discord.gg", "discord.com",
+    "pump.fun", "linktr.ee", "guild.xyz", "lu.ma", "beacons.ai", "bio.link", "taplink.cc",
+    "app.questn.com", "crew3.xyz", "dework.xyz", "opensea.io", "magiceden.io", "dexscreener.com",
+    "coingecko.com", "coinmarketcap.com", "cryptorank.io", "airdrops.io", "gitbook.com",
+}
+GENERIC_SEGMENTS = {
+    "c", "cw", "quest", "quests", "campaign", "campaigns", "app", "en", "explore", "forms", "d",
+    "coin", "coins", "token", "tokens", "currencies", "collection", "marketplace", "invite", "s",
+    "solana", "ethereum", "eth", "base", "bsc", "arbitrum", "polygon",
+}
+
+SIMHASH_BITS = 64
+SIMHASH_BANDS = 8  # 8 x 8 bits: any two hashes within distance 7 share a band
+SIMHASH_MAX_DISTANCE = 7
+MIN_TOKENS = 4
+
+_URL_RE = re.compile(r"https?://\S+")
+_MENTION_RE = re.compile(r"@\w+")
+_TOKEN_RE = re.compile(r"[a-z0-9]{2,}")
+
+
+def registrable_domain(h: str | None) -> str | None:
+    """`app.foo.xyz` -> `foo.xyz`, `foo.github.io` stays as is, `x.co.uk` -> `x.co.uk`."""
+    if not h:
+        return None
+    h = h.lower().strip(".").split(":")[0]
+    labels = h.split(".")
+    if len(labels) <= 2:
+        return h
+    if ".".join(labels[-2:]) in MULTI_PART_SUFFIXES:
+        return ".".join(labels[-3:])
+    return ".".join(labels[-2:])
+
+
+def project_key(url: str | None) -> str | None:
+    """Stable identity of the project behind an official URL."""
+    h = host(url)
+    if not h:
+        return None
+    if h in SHARED_HOSTS or registrable_domain(h) in SHARED_HOSTS:
+        for seg in (urlparse(url).path or "").lower().split("/"):
+            seg = seg.lstrip("@")
+            if seg and seg not in GENERIC_SEGMENTS:
+                return f"{h}/{seg}"
+        return None  # a bare platform link says nothing about the project
+    return registrable_domain(h)
+
+
+def _h64(s: str) -> int:
+    return int.from_bytes(hashlib.blake2b(s.encode("utf-8"), digest_size=8).digest(), "big")
+
+
+def fingerprint(text: str | None) -> str | None:
+    """64-bit SimHash over word unigrams+bigrams (urls/mentions removed), hex; None for very short texts."""
+    t = _MENTION_RE.sub(" ", _URL_RE.sub(" ", (text or "").lower()))
+    toks = _TOKEN_RE.findall(t)
+    if len(toks) < MIN_TOKENS:
+        return None
+    feats = toks + [a + " " + b for a, b in zip(toks, toks[1:])]
+    v = [0] * SIMHASH_BITS
+    for f in feats:
+        x = _h64(f)
+        for bit in range(SIMHASH_BITS):
+            v[bit] += 1 if (x >> bit) & 1 else -1
+    out = 0
+    for bit in range(SIMHASH_BITS):
+        if v[bit] > 0:
+            out |= 1 << bit
+    return f"{out:016x}"
+
+
+def _bands(fp: int) -> list[tuple[int, int]]:
+    width = SIMHASH_BITS // SIMHASH_BANDS
+    mask = (1 << width) - 1
+    return [(i, (fp >> (i * width)) & mask) for i in range(SIMHASH_BANDS)]
+
+
+class DedupIndex:
+    """In-memory near-duplicate index: dupe keys, project keys and SimHash fingerprints bucketed by band."""
+
+    def __init__(self):
+        self.keys: set[str] = set()
+        self.projects: set[str] = set()
+        self._buckets: dict[tuple[int, int], list[tuple[int, str | None]]] = {}
+
+    def add(self, dupe_key: str | None = None, project: str | None = None, fp: str | None = None) -> None:
+        if dupe_key:
+            self.keys.add(dupe_key)
+        if project:
+            self.projects.add(project)
+        if fp:
+            x = int(fp, 16)
+            for band in _bands(x):
+                self._buckets.setdefault(band, []).append((x, project))
+
+    def near(self, fp: str | None, project: str | None = None) -> bool:
+        if not fp:
+            return False
+        x = int(fp, 16)
+        for band in _bands(x):
+            for y, other in self._buckets.get(band, ()):
+                if project and other and project != other:
+                    continue
+                if bin(x ^ y).count("1") <= SIMHASH_MAX_DISTANCE:
+                    return True
+        return False
+
+    def match(self, project: str | None = None, fp: str | None = None, dupe_key: str | None = None) -> str | None:
+        """Why this candidate is a duplicate ("key" / "project" / "text"), or None."""
+        if dupe_key and dupe_key in self.keys:
+            return "key"
+        if project and project in self.projects:
+            return "project"
+        if self.near(fp, project):
+            return "text"
+        return None
+
+    @classmethod
+    def load(cls, conn, recent_days: int | None = None) -> "DedupIndex":
+        """Dupe keys of every drop / queue item; project keys and fingerprints only of those younger than recent_days."""
+        idx = cls()
+        cut = (datetime.now(timezone.utc) - timedelta(days=recent_days)).isoformat() if recent_days else ""
+        for r in conn.execute("SELECT dupe_key, official_url, fingerprint, created_at >= ? AS recent FROM drops "
+                              "WHERE failed_at IS NULL", (cut,)):
+            if r["recent"]:
+                idx.add(r["dupe_key"], project_key(r["official_url"]), r["fingerprint"])
+            else:
+                idx.add(r["dupe_key"])
+        for r in conn.execute("SELECT dupe_key, official_url, fingerprint, source_text, created_at >= ? AS recent "
+                              "FROM review_queue", (cut,)):
+            if r["recent"]:
+                idx.add(r["dupe_key"], project_key(r["official_url"]), r["fingerprint"] or fingerprint(r["source_text"]))
+            else:
+                idx.add(r["dupe_key"])
+        return idx
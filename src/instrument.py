@@ -0,0 +1,137 @@
+from __future__ import annotations
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+from pathlib import Path
+
+# latency histogram upper bounds (ms); the last bucket is +Inf
+BUCKETS_MS = (1, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000, 30000)
+PROM_PREFIX = "airdrop_bot"
+
+
+def _pct(xs: list[float], q: float) -> float:
+    if not xs:
+        return 0.0
+    s = sorted(xs)
+    return s[min(len(s) - 1, int(q * len(s)))]
+
+
+class Recorder:
+    """Per-run stage timings (ms) and counters; thread-safe, reset() starts a fresh one."""
+
+    def __init__(self, mode: str = "run"):
+        self.mode = mode
+        self.started_at = time.time()
+        self._t0 = time.perf_counter()
+        self.counters: dict[str, int] = {}
+        self.timings: dict[str, list[float]] = {}
+        self._lock = threading.Lock()
+
+    def count(self, name: str, n: int = 1) -> None:
+        with self._lock:
+            self.counters[name] = self.counters.get(name, 0) + n
+
+    def observe(self, stage: str, ms: float) -> None:
+        with self._lock:
+            self.timings.setdefault(stage, []).append(ms)
+
+    @contextmanager
+    def stage(self, name: str):
+        t0 = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(name, (time.perf_counter() - t0) * 1000)
+
+    def report(self, **extra) -> dict:
+        with self._lock:
+            timings = {k: list(v) for k, v in self.timings.items()}
+            counters = dict(self.counters)
+        stages = {}
+        for name, xs in sorted(timings.items()):
+            buckets = {str(b): sum(1 for x in xs if x <= b) for b in BUCKETS_MS}
+            buckets["+Inf"] = len(xs)
+            stages[name] = {
+                "count": len(xs),
+                "total_ms": round(sum(xs), 3),
+                "p50_ms": round(_pct(xs, 0.5), 3),
+                "p95_ms": round(_pct(xs, 0.95), 3),
+                "max_ms": round(max(xs), 3),
+                "buckets": buckets,
+            }
+        return {
+            "mode": self.mode,
+            "started_at": self.started_at,
+            "duration_s": round(time.perf_counter() - self._t0, 3),
+            "stages": stages,
+            "counters": dict(sorted(counters.items())),
+            **extra,
+        }
+
+
+def _atomic_write(path: str | Path, text: str) -> None:
+    p = Path(path)
+    p.parent.mkdir(parents=True, exist_ok=True)
+    tmp = p.with_name(p.name + f".{os.getpid()}.tmp")
+    tmp.write_text(text, encoding="utf-8")
+    os.replace(tmp, p)
+
+
+def write_json(path: str | Path, report: dict) -> None:
+    _atomic_write(path, json.dumps(report, indent=2, sort_keys=True) + "\n")
+
+
+def _label(v: str) -> str:
+    return str(v).replace("\\", "\\\\").replace('"', '\\"')
+
+
+def prometheus_text(report: dict, prefix: str = PROM_PREFIX) -> str:
+    """Prometheus text exposition (for node_exporter's textfile collector)."""
+    m = report.get("mode", "run")
+    out = [
+        f"# TYPE {prefix}_stage_duration_ms histogram",
+    ]
+    for name, s in report["stages"].items():
+        lab = f'mode="{_label(m)}",stage="{_label(name)}"'
+        for le, n in s["buckets"].items():
+            out.append(f'{prefix}_stage_duration_ms_bucket{{{lab},le="{le}"}} {n}')
+        out.append(f"{prefix}_stage_duration_ms_sum{{{lab}}} {s['total_ms']}")
+        out.append(f"{prefix}_stage_duration_ms_count{{{lab}}} {s['count']}")
+    out.append(f"# TYPE {prefix}_events gauge")
+    for name, n in report["counters"].items():
+        out.append(f'{prefix}_events{{mode="{_label(m)}",event="{_label(name)}"}} {n}')
+    out.append(f"# TYPE {prefix}_api_calls gauge")
+    for name, n in (report.get("api_calls") or {}).items():
+        out.append(f'{prefix}_api_calls{{mode="{_label(m)}",endpoint="{_label(name)}"}} {n}')
+    out.append(f"# TYPE {prefix}_run_duration_seconds gauge")
+    out.append(f'{prefix}_run_duration_seconds{{mode="{_label(m)}"}} {report["duration_s"]}')
+    out.append(f"# TYPE {prefix}_run_timestamp_seconds gauge")
+    out.append(f'{prefix}_run_timestamp_seconds{{mode="{_label(m)}"}} {report["started_at"]:.0f}')
+    return "\n".join(out) + "\n"
+
+
+def write_prometheus(path: str | Path, report: dict) -> None:
+    _atomic_write(path, prometheus_text(report))
+
+
+_current = Recorder()
+
+
+def current() -> Recorder:
+    return _current
+
+
+def reset(mode: str = "run") -> Recorder:
+    global _current
+    _current = Recorder(mode)
+    return _current
+
+
+def stage(name: str):
+    return _current.stage(name)
+
+
+def count(name: str, n: int = 1) -> None:
+    _current.count(name, n)
@@ -0,0 +1,90 @@
+from __future__ import annotations
+import random
+import threading
+import time
+from contextlib import contextmanager
+from urllib.parse import urlparse
+
+import requests
+from requests.adapters import HTTPAdapter
+
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+MAX_RETRY_AFTER_S = 10.0
+
+
+class HttpClient:
+    """Pooled HTTP client for page fetches with timeouts, retries and a per-host concurrency cap."""
+
+    def __init__(self, pool_size: int = 16, connect_timeout: float = 4.0, read_timeout: float = 8.0,
+                 total_timeout: float = 15.0, retries: int = 2, backoff: float = 0.5, per_host: int = 2,
+                 user_agent: str = "Mozilla/5.0", session: requests.Session | None = None):
+        self.timeout = (connect_timeout, read_timeout)
+        self.total_timeout = total_timeout  # body reads stop after this many seconds
+        self.retries = max(0, retries)
+        self.backoff = backoff
+        self.per_host = max(1, per_host)
+        self.session = session or requests.Session()
+        self.session.headers["User-Agent"] = user_agent
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size, max_retries=0)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+        self._hosts: dict[str, threading.BoundedSemaphore] = {}
+        self._lock = threading.Lock()
+
+    def _host_slot(self, url: str) -> threading.BoundedSemaphore:
+        h = (urlparse(url).netloc or "").lower()
+        with self._lock:
+            sem = self._hosts.get(h)
+            if sem is None:
+                sem = self._hosts[h] = threading.BoundedSemaphore(self.per_host)
+            return sem
+
+    def _sleep_before_retry(self, attempt: int, resp: requests.Response | None) -> None:
+        delay = self.backoff * (2 ** attempt)
+        ra = resp.headers.get("Retry-After") if resp is not None else None
+        if ra and ra.strip().isdigit():
+            delay = max(delay, min(float(ra), MAX_RETRY_AFTER_S))
+        time.sleep(delay * random.uniform(0.5, 1.5))
+
+    @contextmanager
+    def open(self, url: str, headers: dict | None = None):
+        """
+        Streaming GET. Yields the response and holds the per-host slot until
+        the caller is done reading the body.
+        """
+        with self._host_slot(url):
+            attempt = 0
+            while True:
+                try:
+                    r = self.session.get(url, headers=headers, timeout=self.timeout, stream=True)
+                except (requests.ConnectionError, requests.Timeout):
+                    if attempt >= self.retries:
+                        raise
+                    self._sleep_before_retry(attempt, None)
+                    attempt += 1
+                    continue
+                if r.status_code in RETRY_STATUSES and attempt < self.retries:
+                    r.close()
+                    self._sleep_before_retry(attempt, r)
+                    attempt += 1
+                    continue
+                break
+            try:
+                yield r
+            finally:
+                r.close()
+
+    def close(self) -> None:
+        self.session.close()
+
+
+_default: HttpClient | None = None
+_default_lock = threading.Lock()
+
+
+def default_http() -> HttpClient:
+    global _default
+    with _default_lock:
+        if _default is None:
+            _default = HttpClient()
+        return _default
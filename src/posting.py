@@ -1,24 +1,183 @@
+from __future__ import annotations
+import re
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+
 import tweepy
-from src.card import make_card
+from src import instrument
+from src.card import make_card, card_key
+from src.db import (
+    get_media_cache, put_media_cache, drop_media_cache,
+    plan_post_job, get_post_job, get_post_steps, set_post_step, close_post_job,
+)
 
-def post_thread(client: tweepy.Client, api_v1: tweepy.API, thread: list[str],
-                card_title: str, card_project: str, card_footer: str,
-                self_reply_enabled: bool, self_reply_text: str) -> str:
-    card = make_card(card_title, card_project, card_footer)
-    media = api_v1.media_upload(filename=str(card))
+# media ids are reused until shortly before X expires them
+MEDIA_EXPIRY_MARGIN_S = 3600
+DEFAULT_MEDIA_TTL_S = 86400
+# a journaled step that keeps failing gives up the job after this many sends
+POST_MAX_ATTEMPTS = 3
+# own recent tweets scanned when a step's outcome is unknown
+RECONCILE_LOOKBACK = 20
 
-    root = client.create_tweet(text=thread[0], media_ids=[media.media_id_string])
-    root_id = root.data["id"]
 
-    prev = root_id
-    for t in thread[1:]:
-        r = client.create_tweet(text=t, in_reply_to_tweet_id=prev)
-        prev = r.data["id"]
+class PostAbandoned(RuntimeError):
+    """The thread's job was given up (a step kept failing); posting it again does nothing."""
+
+
+_uploads = ThreadPoolExecutor(max_workers=2, thread_name_prefix="media")
+_URL_RE = re.compile(r"https?://\S+")
+
+
+def _upload(api_v1: tweepy.API, title: str, project: str, footer: str) -> tuple[str, str, int]:
+    key, png = make_card(title, project, footer)
+    with instrument.stage("media_upload"):
+        media = api_v1.media_upload(filename=f"card_{key}.png", file=png)
+    ttl = int(getattr(media, "expires_after_secs", 0) or DEFAULT_MEDIA_TTL_S)
+    return key, media.media_id_string, ttl
+
+
+def _done(result) -> Future:
+    fut = Future()
+    fut.set_result(result)
+    return fut
+
+
+def prepare_media(api_v1: tweepy.API, conn, card_title: str, card_project: str, card_footer: str) -> Future:
+    """Card media for a thread as a future of (card key, media id, ttl seconds); reuses a still-valid upload."""
+    if conn is not None:
+        key = card_key(card_title, card_project, card_footer)
+        mid = get_media_cache(conn, key)
+        if mid:
+            return _done((key, mid, 0))
+    return _uploads.submit(_upload, api_v1, card_title, card_project, card_footer)
+
+
+def _post_root(client: tweepy.Client, api_v1: tweepy.API, conn, text: str, card: tuple[str, str, str],
+               media: Future | None) -> str:
+    if media is None:
+        media = prepare_media(api_v1, conn, *card)
+    key, media_id, ttl = media.result()
+    if conn is not None and ttl:
+        put_media_cache(conn, key, media_id, max(0, ttl - MEDIA_EXPIRY_MARGIN_S))
+    try:
+        with instrument.stage("create_tweet"):
+            root = client.create_tweet(text=text, media_ids=[media_id])
+    except tweepy.BadRequest:
+        if ttl or conn is None:
+            raise
+        # cached media id no longer accepted: upload again once
+        drop_media_cache(conn, key)
+        key, media_id, ttl = _upload(api_v1, *card)
+        put_media_cache(conn, key, media_id, max(0, ttl - MEDIA_EXPIRY_MARGIN_S))
+        root = client.create_tweet(text=text, media_ids=[media_id])
+    return str(root.data["id"])
 
+
+def thread_steps(thread: list[str], self_reply_enabled: bool, self_reply_text: str) -> list[tuple[str, str]]:
+    steps = [("root", thread[0])] + [("reply", t) for t in thread[1:]]
     if self_reply_enabled and self_reply_text:
+        steps.append(("self_reply", self_reply_text[:275]))
+    return steps
+
+
+def _norm(text: str) -> str:
+    # X rewrites links to t.co, so compare the text around them
+    return " ".join(_URL_RE.sub(" ", text or "").split())
+
+
+def _find_sent(client: tweepy.Client, text: str, reply_to: str | None) -> str | None:
+    """Id of our own recent tweet with this text (replying to reply_to), if the send went through."""
+    me = client.get_me(user_auth=True).data.id
+    r = client.get_users_tweets(me, max_results=RECONCILE_LOOKBACK, tweet_fields=["referenced_tweets"],
+                                user_auth=True)
+    want = _norm(text)
+    for t in r.data or []:
+        if _norm(t.text) != want:
+            continue
+        parent = next((str(x.id) for x in (t.referenced_tweets or []) if x.type == "replied_to"), None)
+        if parent == (str(reply_to) if reply_to else None):
+            return str(t.id)
+    return None
+
+
+def resume_thread(client: tweepy.Client, api_v1: tweepy.API, conn, job_key: str,
+                  media: Future | None = None) -> str:
+    """Post the unsent steps of a journaled thread and return the root id."""
+    job = get_post_job(conn, job_key)
+    if job["status"] == "done":
+        return job["root_tweet_id"]
+    if job["status"] == "abandoned":
+        raise PostAbandoned(f"post job {job_key} was abandoned")
+    card = (job["card_title"], job["card_project"], job["card_footer"])
+    root_id = prev = None
+    timings = []
+    for s in get_post_steps(conn, job_key):
+        n, kind = s["step"], s["kind"]
+        reply_to = None if kind == "root" else (root_id if kind == "self_reply" else prev)
+        if s["status"] == "skipped":
+            continue
+        tid = s["tweet_id"] if s["status"] == "sent" else None
+        if s["status"] == "sending":
+            tid = _find_sent(client, s["text"], reply_to)
+            if tid:
+                set_post_step(conn, job_key, n, "sent", tid)
+        if tid is None:
+            if s["attempts"] >= POST_MAX_ATTEMPTS:
+                if kind == "self_reply":
+                    set_post_step(conn, job_key, n, "skipped")
+                    continue
+                close_post_job(conn, job_key, "abandoned", root_id)
+                raise PostAbandoned(f"post job {job_key} abandoned at step {n} after {s['attempts']} attempts")
+            set_post_step(conn, job_key, n, "sending")
+            t0 = time.perf_counter()
+            try:
+                if kind == "root":
+                    tid = _post_root(client, api_v1, conn, s["text"], card, media)
+                else:
+                    with instrument.stage("create_tweet"):
+                        tid = str(client.create_tweet(text=s["text"], in_reply_to_tweet_id=reply_to).data["id"])
+            except Exception as e:
+                if kind == "self_reply":
+                    set_post_step(conn, job_key, n, "skipped")
+                    continue
+                if isinstance(e, tweepy.HTTPException) and not isinstance(e, tweepy.TwitterServerError):
+                    set_post_step(conn, job_key, n, "failed")  # rejected, nothing was created
+                raise
+            ms = int((time.perf_counter() - t0) * 1000)
+            set_post_step(conn, job_key, n, "sent", tid, ms)
+            timings.append(f"{kind}#{n} {ms}ms")
+        if kind == "root":
+            root_id = tid
+        if kind != "self_reply":
+            prev = tid
+    close_post_job(conn, job_key, "done", root_id)
+    if timings:
+        print(f"Posted {job_key}: " + ", ".join(timings))
+    return root_id
+
+
+def post_thread(client: tweepy.Client, api_v1: tweepy.API, thread: list[str],
+                card_title: str, card_project: str, card_footer: str,
+                self_reply_enabled: bool, self_reply_text: str,
+                conn=None, media: Future | None = None, job_key: str | None = None) -> str:
+    """
+    Post a thread with its card. With conn and job_key the thread is
+    journaled and posting the same job_key again only finishes what is left.
+    """
+    steps = thread_steps(thread, self_reply_enabled, self_reply_text)
+    if conn is not None and job_key:
+        plan_post_job(conn, job_key, card_title, card_project, card_footer, steps)
+        return resume_thread(client, api_v1, conn, job_key, media)
+
+    root_id = _post_root(client, api_v1, conn, thread[0], (card_title, card_project, card_footer), media)
+    prev = root_id
+    for kind, t in steps[1:]:
         try:
-            client.create_tweet(text=self_reply_text[:275], in_reply_to_tweet_id=root_id)
+            with instrument.stage("create_tweet"):
+                r = client.create_tweet(text=t, in_reply_to_tweet_id=root_id if kind == "self_reply" else prev)
         except Exception:
-            pass
-
+            if kind == "self_reply":
+                continue
+            raise
+        prev = r.data["id"]
     return str(root_id)
@@ -0,0 +1,171 @@
+from __future__ import annotations
+import re
+import threading
+import time
+from dataclasses import dataclass
+from urllib.parse import urlparse
+
+import tweepy
+
+# call priorities: lower runs first / waits instead of being dropped
+POST, VERIFY, SEARCH = 0, 1, 2
+# a POST-priority call never sleeps longer than this for a window to reset (default; per limiter)
+MAX_POST_WAIT_S = 900.0
+
+# (method, path regex) -> endpoint bucket; X rate-limits per endpoint
+ENDPOINTS = [
+    ("GET", re.compile(r"^/2/tweets/search/recent$"), "search"),
+    ("GET", re.compile(r"^/2/users/me$"), "me"),
+    ("GET", re.compile(r"^/2/users/\d+/tweets$"), "timeline"),
+    ("GET", re.compile(r"^/2/users(/by(/username/[^/]+)?)?$"), "users"),
+    ("POST", re.compile(r"^/2/tweets$"), "post"),
+    ("POST", re.compile(r"^/1\.1/media/upload\.json$"), "media"),
+]
+
+# client method -> (endpoint bucket, priority)
+ROUTES = {
+    "search_recent_tweets": ("search", SEARCH),
+    "get_users": ("users", VERIFY),
+    "get_user": ("users", VERIFY),
+    "get_me": ("me", POST),
+    "get_users_tweets": ("timeline", POST),
+    "create_tweet": ("post", POST),
+    "media_upload": ("media", POST),
+}
+
+
+def endpoint_of(method: str, url: str) -> str | None:
+    path = urlparse(url).path
+    for m, rx, name in ENDPOINTS:
+        if m == method and rx.match(path):
+            return name
+    return None
+
+
+class RateLimited(Exception):
+    """A lower-priority call was deferred because its endpoint has no budget left."""
+
+    def __init__(self, endpoint: str, reset_at: float):
+        super().__init__(f"{endpoint} rate limit exhausted, resets in {max(0, reset_at - time.time()):.0f}s")
+        self.endpoint = endpoint
+        self.reset_at = reset_at
+
+
+@dataclass
+class Budget:
+    limit: int
+    remaining: int
+    reset_at: float  # epoch seconds
+
+    def left(self, now: float) -> int | None:
+        """Calls left in the current window; None once the window has reset (unknown until next response)."""
+        return self.remaining if now < self.reset_at else None
+
+
+class RateLimiter:
+    """Per-endpoint quota tracker fed by x-rate-limit-* headers; posting waits, everything else raises RateLimited."""
+
+    def __init__(self, clock=time.time, sleep=time.sleep, max_post_wait_s: float = MAX_POST_WAIT_S):
+        self.max_post_wait_s = max_post_wait_s
+        self.budgets: dict[str, Budget] = {}
+        self.calls: dict[str, int] = {}
+        self.deferred: dict[str, int] = {}
+        self._lock = threading.Lock()
+        self._clock = clock
+        self._sleep = sleep
+
+    def observe(self, resp, *args, **kwargs):
+        """requests response hook: record the endpoint's window from the headers."""
+        if resp is None or resp.request is None:
+            return resp
+        name = endpoint_of(resp.request.method, resp.request.url)
+        h = resp.headers
+        if name is None or "x-rate-limit-remaining" not in h:
+            return resp
+        try:
+            b = Budget(int(h.get("x-rate-limit-limit", 0)), int(h["x-rate-limit-remaining"]),
+                       float(h.get("x-rate-limit-reset", 0)))
+        except ValueError:
+            return resp
+        with self._lock:
+            self.budgets[name] = b
+        return resp
+
+    def install(self, session) -> None:
+        session.hooks.setdefault("response", []).append(self.observe)
+
+    def left(self, endpoint: str) -> int | None:
+        """Known calls left for an endpoint in its current window, or None when unknown."""
+        with self._lock:
+            b = self.budgets.get(endpoint)
+        return b.left(self._clock()) if b is not None else None
+
+    def reset_in(self, endpoint: str) -> float:
+        with self._lock:
+            b = self.budgets.get(endpoint)
+        return max(0.0, b.reset_at - self._clock()) if b is not None else 0.0
+
+    def _defer(self, endpoint: str) -> RateLimited:
+        with self._lock:
+            self.deferred[endpoint] = self.deferred.get(endpoint, 0) + 1
+            b = self.budgets.get(endpoint)
+        return RateLimited(endpoint, b.reset_at if b is not None else self._clock())
+
+    def _wait(self, endpoint: str) -> None:
+        wait = self.reset_in(endpoint) + 1.0
+        if wait > self.max_post_wait_s:
+            raise self._defer(endpoint)
+        print(f"[ratelimit] {endpoint} exhausted, waiting {wait:.0f}s")
+        self._sleep(wait)
+
+    def call(self, endpoint: str, priority: int, fn, *args, **kwargs):
+        if self.left(endpoint) == 0:
+            if priority != POST:
+                raise self._defer(endpoint)
+            self._wait(endpoint)
+        with self._lock:
+            self.calls[endpoint] = self.calls.get(endpoint, 0) + 1
+            b = self.budgets.get(endpoint)
+            if b is not None and b.remaining > 0:
+                b.remaining -= 1  # until the response headers say otherwise
+        try:
+            return fn(*args, **kwargs)
+        except tweepy.TooManyRequests as e:
+            self.observe(e.response)
+            if priority != POST:
+                raise self._defer(endpoint) from e
+            self._wait(endpoint)
+            return fn(*args, **kwargs)
+
+    def summary(self) -> str:
+        now = self._clock()
+        parts = []
+        for name in sorted(set(self.budgets) | set(self.calls)):
+            b = self.budgets.get(name)
+            left = b.left(now) if b is not None else None
+            parts.append(f"{name}={self.calls.get(name, 0)} used/{'?' if left is None else left} left"
+                         + (f"/{self.deferred[name]} deferred" if self.deferred.get(name) else ""))
+        return ", ".join(parts)
+
+
+class Scheduled:
+    """
+    Wraps a tweepy Client or API so every routed call goes through the
+    limiter with its priority; everything else passes straight through.
+    """
+
+    def __init__(self, client, limiter: RateLimiter):
+        self._client = client
+        self.limiter = limiter
+        limiter.install(client.session)
+
+    def __getattr__(self, name):
+        attr = getattr(self._client, name)
+        route = ROUTES.get(name)
+        if route is None or not callable(attr):
+            return attr
+        endpoint, priority = route
+
+        def call(*args, **kwargs):
+            return self.limiter.call(endpoint, priority, attr, *args, **kwargs)
+        return call
@@ -0,0 +1,456 @@
+from __future__ import annotations
+import dataclasses
+import gzip
+import hashlib
+import io
+import json
+import os
+import re
+import sqlite3
+import threading
+import time
+from pathlib import Path
+from types import SimpleNamespace
+
+import requests
+import tweepy
+from requests.adapters import BaseAdapter
+
+from src.bot import make_clients, make_http, run
+from src.db import connect
+from src.net import HttpClient
+from src.ratelimit import RateLimiter, Scheduled, endpoint_of
+
+# corpus layout (directory): one JSON document per line in each file, optionally gzip'd (*.jsonl.gz)
+SEARCH_FILE = "search.jsonl"  # search response pages or stream payloads ({"data", "includes": {"users"}})
+USERS_FILE = "users.jsonl"    # v2 user objects, answer get_users/get_user lookups
+PAGES_FILE = "pages.jsonl"    # {"url", "status", "content_type", "etag", "location", "body" | "sha"}
+BLOB_DIR = "blobs"            # page bodies as <sha256>.gz, stored once however many urls serve them
+INDEX_FILE = "index.json"     # what a recorded corpus holds
+
+# corpus layout (SQLite capture)
+CAPTURE_SCHEMA = """
+CREATE TABLE IF NOT EXISTS tweets (id TEXT PRIMARY KEY, payload TEXT NOT NULL);
+CREATE TABLE IF NOT EXISTS users (username TEXT PRIMARY KEY, payload TEXT NOT NULL);
+CREATE TABLE IF NOT EXISTS pages (url TEXT PRIMARY KEY, status INTEGER NOT NULL, content_type TEXT,
+                                  etag TEXT, body TEXT);
+"""
+
+_TERM_RE = re.compile(r'"([^"]+)"|(\S+)')
+
+
+def page_key(url: str) -> str:
+    return url.rstrip("/")
+
+
+def query_terms(query: str) -> list[str]:
+    """Lower-cased keywords of a build_query() query: '(a OR "b c") -is:retweet ...' -> ['a', 'b c']."""
+    m = re.match(r"\s*\((.*)\)", query)
+    body = m.group(1) if m else query
+    return [(q or w).lower() for q, w in _TERM_RE.findall(body) if (q or w) != "OR"]
+
+
+class Corpus:
+    """Recorded tweets, user profiles and page bodies, from a fixtures directory or a SQLite capture."""
+
+    def __init__(self):
+        self.tweets: dict[str, dict] = {}
+        self.authors: dict[str, dict] = {}
+        self.users: dict[str, dict] = {}
+        self.pages: dict[str, dict] = {}
+        self.blob_dir: Path | None = None
+
+    def add_user(self, u: dict) -> None:
+        if u.get("username"):
+            self.users[u["username"].lower()] = u
+        if u.get("id") is not None:
+            self.authors[str(u["id"])] = u
+
+    def add_payload(self, p: dict) -> None:
+        """One search response page or stream payload."""
+        data = p.get("data")
+        for t in data if isinstance(data, list) else [data] if isinstance(data, dict) else []:
+            if "id" in t:
+                self.tweets[str(t["id"])] = t
+        for u in (p.get("includes") or {}).get("users", []):
+            self.add_user(u)
+
+    def add_page(self, url: str, body: str | None, status: int = 200, content_type: str = "text/html; charset=utf-8",
+                 etag: str | None = None, sha: str | None = None, location: str | None = None) -> None:
+        self.pages[page_key(url)] = {"url": url, "status": status, "content_type": content_type,
+                                     "etag": etag, "body": body, "sha": sha, "location": location}
+
+    def body(self, pg: dict) -> bytes:
+        """Page body bytes, inline or from its blob."""
+        if pg["body"] is not None:
+            return pg["body"].encode("utf-8")
+        if pg["sha"] and self.blob_dir is not None:
+            try:
+                return gzip.decompress((self.blob_dir / f"{pg['sha']}.gz").read_bytes())
+            except OSError:
+                return b""
+        return b""
+
+    @classmethod
+    def load(cls, path: str | Path) -> Corpus:
+        p = Path(path)
+        c = cls()
+        if p.is_dir():
+            c._load_dir(p)
+        elif p.is_file():
+            c._load_capture(p)
+        else:
+            raise FileNotFoundError(f"replay corpus not found: {p}")
+        return c
+
+    def _load_dir(self, p: Path) -> None:
+        def lines(name: str):
+            for f, opener in ((p / name, open), (p / (name + ".gz"), gzip.open)):
+                if not f.exists():
+                    continue
+                with opener(f, "rt", encoding="utf-8") as fh:
+                    for line in fh:
+                        if line.strip():
+                            yield json.loads(line)
+        self.blob_dir = p / BLOB_DIR
+        for payload in lines(SEARCH_FILE):
+            self.add_payload(payload)
+        for u in lines(USERS_FILE):
+            self.add_user(u)
+        for pg in lines(PAGES_FILE):
+            self.add_page(pg["url"], pg.get("body"), int(pg.get("status", 200)), pg.get("content_type"),
+                          pg.get("etag"), pg.get("sha"), pg.get("location"))
+
+    def _load_capture(self, p: Path) -> None:
+        conn = sqlite3.connect(f"file:{p}?mode=ro", uri=True)
+        try:
+            for (payload,) in conn.execute("SELECT payload FROM tweets"):
+                self.add_payload(json.loads(payload))
+            for (payload,) in conn.execute("SELECT payload FROM users"):
+                self.add_user(json.loads(payload))
+            for url, status, ct, etag, body in conn.execute("SELECT url, status, content_type, etag, body FROM pages"):
+                self.add_page(url, body or "", status, ct, etag)
+        finally:
+            conn.close()
+
+    def save(self, path: str | Path) -> None:
+        """Write as a fixtures directory, or as a SQLite capture when path ends in .sqlite/.db."""
+        p = Path(path)
+        tweets = [{"data": t, "includes": {"users": [self.authors[str(t["author_id"])]]}}
+                  if str(t.get("author_id")) in self.authors else {"data": t} for t in self.tweets.values()]
+        if p.suffix in (".sqlite", ".sqlite3", ".db"):
+            p.parent.mkdir(parents=True, exist_ok=True)
+            conn = sqlite3.connect(p)
+            with conn:
+                conn.executescript(CAPTURE_SCHEMA)
+                conn.executemany("INSERT OR REPLACE INTO tweets VALUES (?,?)",
+                                 [(x["data"]["id"], json.dumps(x)) for x in tweets])
+                conn.executemany("INSERT OR REPLACE INTO users VALUES (?,?)",
+                                 [(k, json.dumps(u)) for k, u in self.users.items()])
+                conn.executemany("INSERT OR REPLACE INTO pages VALUES (?,?,?,?,?)",
+                                 [(pg["url"], pg["status"], pg["content_type"], pg["etag"],
+                                   self.body(pg).decode("utf-8", "replace")) for pg in self.pages.values()])
+            conn.close()
+            return
+        p.mkdir(parents=True, exist_ok=True)
+        pages = [{**pg, "body": self.body(pg).decode("utf-8", "replace"), "sha": None} for pg in self.pages.values()]
+        for name, rows in ((SEARCH_FILE, tweets), (USERS_FILE, self.users.values()), (PAGES_FILE, pages)):
+            with open(p / name, "w", encoding="utf-8") as fh:
+                for r in rows:
+                    fh.write(json.dumps(r) + "\n")
+
+    def summary(self) -> str:
+        return f"{len(self.tweets)} tweets, {len(self.users)} users, {len(self.pages)} pages"
+
+
+def _tweet(d: dict) -> tweepy.Tweet:
+    return tweepy.Tweet({"edit_history_tweet_ids": [str(d["id"])], "text": "", **d})
+
+
+def _user(d: dict) -> tweepy.User:
+    return tweepy.User({"name": d.get("username", ""), **d})
+
+
+class ReplayClient:
+    """Stand-in for tweepy.Client answering from a Corpus, with latency_s per call."""
+
+    def __init__(self, corpus: Corpus, latency_s: float = 0.0, user_id: str = "1", username: str = "replay"):
+        self.corpus = corpus
+        self.latency_s = latency_s
+        self.me = {"id": user_id, "username": username}
+        self.session = requests.Session()  # Scheduled installs its rate-limit hook here
+        self.posted: list[dict] = []
+        self._matches: dict[str, list[dict]] = {}
+        self._lock = threading.Lock()
+        self._next_id = 10 ** 18
+
+    def _wait(self) -> None:
+        if self.latency_s > 0:
+            time.sleep(self.latency_s)
+
+    def _matching(self, query: str) -> list[dict]:
+        with self._lock:
+            hit = self._matches.get(query)
+            if hit is None:
+                terms = query_terms(query)
+                hit = [t for t in self.corpus.tweets.values()
+                       if not terms or any(k in (t.get("text") or "").lower() for k in terms)]
+                hit.sort(key=lambda t: int(t["id"]), reverse=True)
+                self._matches[query] = hit
+            return hit
+
+    def search_recent_tweets(self, query: str, max_results: int = 10, since_id=None, next_token=None, **kw):
+        self._wait()
+        ts = self._matching(query)
+        if since_id:
+            ts = [t for t in ts if int(t["id"]) > int(since_id)]
+        off = int(next_token or 0)
+        page = ts[off:off + max_results]
+        meta = {"result_count": len(page)}
+        if page:
+            meta["newest_id"], meta["oldest_id"] = str(page[0]["id"]), str(page[-1]["id"])
+        if off + max_results < len(ts):
+            meta["next_token"] = str(off + max_results)
+        authors = {str(t.get("author_id")) for t in page}
+        users = [_user(self.corpus.authors[a]) for a in authors if a in self.corpus.authors]
+        return tweepy.Response([_tweet(t) for t in page] or None, {"users": users} if users else {}, [], meta)
+
+    def get_users(self, usernames=None, ids=None, **kw):
+        self._wait()
+        found = [self.corpus.users[u.lower()] for u in usernames or [] if u.lower() in self.corpus.users]
+        return tweepy.Response([_user(u) for u in found] or None, {}, [], {})
+
+    def get_user(self, username=None, id=None, **kw):
+        self._wait()
+        u = self.corpus.users.get((username or "").lower())
+        return tweepy.Response(_user(u) if u else None, {}, [], {})
+
+    def get_me(self, **kw):
+        self._wait()
+        return tweepy.Response(_user(self.me), {}, [], {})
+
+    def get_users_tweets(self, id, max_results: int = 10, **kw):
+        self._wait()
+        with self._lock:
+            own = list(reversed(self.posted[-max_results:]))
+        return tweepy.Response([_tweet(t) for t in own] or None, {}, [], {"result_count": len(own)})
+
+    def create_tweet(self, text: str, in_reply_to_tweet_id=None, media_ids=None, **kw):
+        self._wait()
+        with self._lock:
+            self._next_id += 1
+            t = {"id": str(self._next_id), "text": text, "author_id": self.me["id"]}
+            if in_reply_to_tweet_id:
+                t["referenced_tweets"] = [{"type": "replied_to", "id": str(in_reply_to_tweet_id)}]
+            self.posted.append(t)
+        return tweepy.Response({"id": t["id"], "text": text}, {}, [], {})
+
+
+class ReplayAPI:
+    """Stand-in for the v1.1 tweepy.API: media uploads only."""
+
+    def __init__(self, latency_s: float = 0.0):
+        self.latency_s = latency_s
+        self.session = requests.Session()
+        self.uploads = 0
+        self._lock = threading.Lock()
+
+    def media_upload(self, filename: str, file=None, **kw):
+        if self.latency_s > 0:
+            time.sleep(self.latency_s)
+        with self._lock:
+            self.uploads += 1
+            n = self.uploads
+        return SimpleNamespace(media_id_string=f"replay-media-{n}", expires_after_secs=86400)
+
+
+class ReplayAdapter(BaseAdapter):
+    """requests transport serving Corpus pages (404 for anything unrecorded) after latency_s."""
+
+    def __init__(self, corpus: Corpus, latency_s: float = 0.0):
+        super().__init__()
+        self.corpus = corpus
+        self.latency_s = latency_s
+        self.requests = 0
+        self._lock = threading.Lock()
+
+    def send(self, request, stream=False, timeout=None, verify=True, cert=None, proxies=None):
+        if self.latency_s > 0:
+            time.sleep(self.latency_s)
+        with self._lock:
+            self.requests += 1
+        pg = self.corpus.pages.get(page_key(request.url))
+        r = requests.Response()
+        r.url = request.url
+        r.request = request
+        body = b""
+        if pg is None:
+            r.status_code = 404
+        elif pg["etag"] and request.headers.get("If-None-Match") == pg["etag"]:
+            r.status_code = 304
+        else:
+            r.status_code = pg["status"]
+            body = self.corpus.body(pg)
+            for h, k in (("Content-Type", "content_type"), ("ETag", "etag"), ("Location", "location")):
+                if pg.get(k):
+                    r.headers[h] = pg[k]
+        r.encoding = requests.utils.get_encoding_from_headers(r.headers)
+        r.raw = io.BytesIO(body)
+        return r
+
+    def close(self) -> None:
+        pass
+
+
+def _is_html(content_type: str | None) -> bool:
+    ct = (content_type or "").lower()
+    return not ct or "html" in ct or "xml" in ct
+
+
+class CorpusWriter:
+    """Response hooks appending live X and page traffic to a corpus directory; close() writes index.json."""
+
+    def __init__(self, path: str | Path):
+        self.path = Path(path)
+        (self.path / BLOB_DIR).mkdir(parents=True, exist_ok=True)
+        self.counts = {"search_pages": 0, "users": 0, "pages": 0, "blobs": 0, "blob_bytes": 0}
+        self._files = {name: gzip.open(self.path / (name + ".gz"), "at", encoding="utf-8")
+                       for name in (SEARCH_FILE, USERS_FILE, PAGES_FILE)}
+        self._lock = threading.Lock()
+
+    def install(self, api_session, page_session) -> None:
+        api_session.hooks.setdefault("response", []).append(self.on_api)
+        page_session.hooks.setdefault("response", []).append(self.on_page)
+
+    def _write(self, name: str, obj: dict, counter: str) -> None:
+        line = json.dumps(obj, separators=(",", ":")) + "\n"
+        with self._lock:
+            self._files[name].write(line)
+            self.counts[counter] += 1
+
+    def on_api(self, resp, *args, **kwargs):
+        if resp is None or resp.request is None or resp.status_code != 200:
+            return resp
+        name = endpoint_of(resp.request.method, resp.request.url)
+        if name not in ("search", "users"):
+            return resp
+        try:
+            payload = resp.json()
+        except ValueError:
+            return resp
+        if name == "search":
+            self._write(SEARCH_FILE, payload, "search_pages")
+            return resp
+        data = payload.get("data")
+        for u in data if isinstance(data, list) else [data] if isinstance(data, dict) else []:
+            self._write(USERS_FILE, u, "users")
+        return resp
+
+    def on_page(self, resp, *args, **kwargs):
+        if resp is None or resp.request is None or resp.status_code == 304:
+            return resp  # a 304 carries no body to replay
+        ct = resp.headers.get("Content-Type")
+        # reads the whole body, also for streamed requests (requests replays it to iter_content)
+        body = resp.content if resp.status_code == 200 and _is_html(ct) else b""
+        sha = None
+        if body:
+            sha = hashlib.sha256(body).hexdigest()
+            blob = self.path / BLOB_DIR / f"{sha}.gz"
+            with self._lock:
+                if not blob.exists():
+                    tmp = blob.with_name(blob.name + f".{os.getpid()}.tmp")
+                    data = gzip.compress(body, mtime=0)
+                    tmp.write_bytes(data)
+                    os.replace(tmp, blob)
+                    self.counts["blobs"] += 1
+                    self.counts["blob_bytes"] += len(data)
+        self._write(PAGES_FILE, {"url": resp.request.url, "status": resp.status_code, "content_type": ct,
+                                 "etag": resp.headers.get("ETag"), "location": resp.headers.get("Location"),
+                                 "sha": sha}, "pages")
+        return resp
+
+    def close(self) -> dict:
+        """Flush the files and fold this session's counts into index.json; returns the index."""
+        with self._lock:
+            for fh in self._files.values():
+                fh.close()
+        f = self.path / INDEX_FILE
+        try:
+            index = json.loads(f.read_text(encoding="utf-8"))
+        except (OSError, ValueError):
+            index = {"format": 1, "created_at": time.time(), "sessions": 0}
+        index["sessions"] = index.get("sessions", 0) + 1
+        index["updated_at"] = time.time()
+        for k, n in self.counts.items():
+            index[k] = index.get(k, 0) + n
+        tmp = f.with_name(f.name + f".{os.getpid()}.tmp")
+        tmp.write_text(json.dumps(index, indent=2, sort_keys=True) + "\n", encoding="utf-8")
+        os.replace(tmp, f)
+        return index
+
+    def summary(self) -> str:
+        c = self.counts
+        return (f"{c['search_pages']} search pages, {c['users']} users, {c['pages']} page fetches "
+                f"({c['blobs']} new bodies, {c['blob_bytes'] / 1024:.0f} KiB)")
+
+
+def replay_clients(corpus: Corpus, latency_s: float = 0.0):
+    """(read_client, write_client, api_v1) as make_clients() returns them, answered from the corpus."""
+    client = ReplayClient(corpus, latency_s)
+    limiter = RateLimiter()
+    return Scheduled(client, limiter), Scheduled(client, limiter), Scheduled(ReplayAPI(latency_s), limiter)
+
+
+def replay_http(cfg, corpus: Corpus, latency_s: float = 0.0) -> HttpClient:
+    """make_http() with its transport swapped for the corpus pages."""
+    http = make_http(cfg)
+    adapter = ReplayAdapter(corpus, latency_s)
+    http.session.mount("http://", adapter)
+    http.session.mount("https://", adapter)
+    return http
+
+
+def _scratch_db(path: str) -> sqlite3.Connection:
+    db = Path(path)
+    for p in (db, db.with_name(db.name + "-wal"), db.with_name(db.name + "-shm")):
+        p.unlink(missing_ok=True)
+    return connect(db)
+
+
+def replay(cfg) -> int:
+    """MODE=replay: one discovery run over REPLAY_PATH with fake clients against a scratch database."""
+    try:
+        corpus = Corpus.load(cfg.replay_path)
+    except (OSError, ValueError, sqlite3.Error) as e:
+        print(f"Replay corpus load failed: {e}")
+        return 2
+    print(f"Replaying {cfg.replay_path}: {corpus.summary()}")
+    conn = _scratch_db(cfg.replay_db_path)
+    clients = replay_clients(corpus, cfg.replay_api_latency_ms / 1000)
+    http = replay_http(cfg, corpus, cfg.replay_page_latency_ms / 1000)
+    try:
+        return run(cfg, clients, conn, http, scheduled=False)
+    finally:
+        http.close()
+        conn.close()
+
+
+def record(cfg) -> int:
+    """MODE=record: one live dry run against a scratch database, appending what it reads to RECORD_PATH."""
+    cfg = dataclasses.replace(cfg, dry_run=True, queue_max_per_run=0)
+    try:
+        clients = make_clients(cfg)
+    except Exception as e:
+        print(str(e))
+        return 2
+    http = make_http(cfg)
+    writer = CorpusWriter(cfg.record_path)
+    writer.install(clients[0].session, http.session)
+    conn = _scratch_db(cfg.record_db_path)
+    try:
+        return run(cfg, clients, conn, http, scheduled=False)
+    finally:
+        writer.close()
+        http.close()
+        conn.close()
+        print(f"Recorded into {cfg.record_path}: {writer.summary()}")
@@ -0,0 +1,107 @@
+from __future__ import annotations
+import csv
+import os
+import time
+from datetime import datetime
+from pathlib import Path
+
+from src.config import load_accounts
+from src.db import connect, queue_rows, apply_review_decisions, reprioritize_queue, decayed_priority
+
+# reviewers fill in `decision`; everything else is for reading (dupe_key identifies the item)
+EXPORT_COLUMNS = ["decision", "dupe_key", "name", "official_url", "verified", "handle", "score", "priority",
+                  "age_h", "approved", "reason", "source_text"]
+DECISIONS = {
+    "approve": "approve", "a": "approve", "y": "approve", "yes": "approve",
+    "hold": "hold", "h": "hold",
+    "reject": "reject", "r": "reject", "n": "reject", "no": "reject",
+    "": None, "skip": None,
+}
+# spreadsheet apps run cells starting with these as formulas; tweet text is attacker-controlled
+FORMULA_START = ("=", "+", "-", "@", "\t", "\r")
+
+
+def _cell(v) -> str:
+    """Text cell that a spreadsheet shows as text: a leading ' disarms formula characters."""
+    v = "" if v is None else str(v)
+    return "'" + v if v.startswith(FORMULA_START) else v
+
+
+def _uncell(v: str) -> str:
+    """Undo _cell() for values read back (spreadsheets usually drop the ' themselves on save)."""
+    return v[1:] if v.startswith("'") and v[1:].startswith(FORMULA_START) else v
+
+
+def export_queue(conn, path: str | Path, half_life_h: float) -> int:
+    """Write the whole review queue as CSV, highest current priority first. Returns rows written."""
+    p = Path(path)
+    p.parent.mkdir(parents=True, exist_ok=True)
+    at = time.time()
+    rows = queue_rows(conn)
+    tmp = p.with_name(p.name + f".{os.getpid()}.tmp")
+    with open(tmp, "w", encoding="utf-8", newline="") as fh:
+        w = csv.writer(fh)
+        w.writerow(EXPORT_COLUMNS)
+        for r in rows:
+            age_h = (at - datetime.fromisoformat(r["created_at"]).timestamp()) / 3600
+            w.writerow(["", _cell(r["dupe_key"]), _cell(r["name"]), _cell(r["official_url"]), r["verified"],
+                        _cell(r["handle"]), r["score"], f"{decayed_priority(r['priority'], half_life_h, at):.1f}",
+                        f"{age_h:.1f}", r["approved"], _cell(r["reason"]), _cell(r["source_text"])])
+    os.replace(tmp, p)
+    return len(rows)
+
+
+def read_decisions(path: str | Path) -> tuple[dict[str, str], list[str]]:
+    """
+    ({dupe_key: approve | hold | reject}, errors) from a reviewed export.
+    Blank / skip rows are left out; a key decided twice keeps the last decision.
+    """
+    out: dict[str, str] = {}
+    errors = []
+    with open(path, "r", encoding="utf-8-sig", newline="") as fh:
+        rd = csv.DictReader(fh)
+        if not rd.fieldnames or "decision" not in rd.fieldnames or "dupe_key" not in rd.fieldnames:
+            return {}, ["missing decision/dupe_key columns"]
+        for n, row in enumerate(rd, start=2):
+            raw = (row.get("decision") or "").strip().lower()
+            if raw not in DECISIONS:
+                errors.append(f"line {n}: unknown decision {raw!r}")
+                continue
+            key = _uncell((row.get("dupe_key") or "").strip())
+            if DECISIONS[raw] is None:
+                continue
+            if not key:
+                errors.append(f"line {n}: missing dupe_key")
+                continue
+            out[key] = DECISIONS[raw]
+    return out, errors
+
+
+def review_export(cfg, conn=None) -> int:
+    """MODE=review_export: write the queue to QUEUE_FILE for offline review (one file per account with ACCOUNTS)."""
+    if cfg.accounts and conn is None:
+        return max(review_export(a, connect(Path(a.account_db_path))) for a in load_accounts(cfg))
+    conn = conn or connect()
+    reprioritize_queue(conn, cfg.queue_half_life_h)
+    n = export_queue(conn, cfg.queue_file, cfg.queue_half_life_h)
+    print(f"Exported {n} queue items to {cfg.queue_file}")
+    return 0
+
+
+def review_import(cfg, conn=None) -> int:
+    """MODE=review_import: apply QUEUE_FILE's decisions in one transaction; any bad row aborts it."""
+    if cfg.accounts and conn is None:
+        return max(review_import(a, connect(Path(a.account_db_path))) for a in load_accounts(cfg))
+    try:
+        decisions, errors = read_decisions(cfg.queue_file)
+    except OSError as e:
+        print(f"Review import failed: {e}")
+        return 2
+    if errors:
+        print(f"Review import aborted, {len(errors)} bad row(s):")
+        for e in errors[:20]:
+            print("  " + e)
+        return 2
+    counts = apply_review_decisions(conn or connect(), decisions)
+    print(f"Review import ({cfg.queue_file}): " + ", ".join(f"{k}={v}" for k, v in counts.items()))
+    return 0
@@ -0,0 +1,162 @@
+from __future__ import annotations
+import json
+import os
+import re
+from functools import lru_cache
+from pathlib import Path
+
+DEFAULT_RULES_PATH = Path(__file__).with_name("rules.json")
+
+
+_WORD_RE = re.compile(r"\w+")
+
+
+def _words(p: str) -> tuple[tuple[str, ...], bool]:
+    """Pattern -> (words, last word is a prefix). A trailing * matches any word suffix."""
+    p = p.strip().lower()
+    return tuple(_WORD_RE.findall(p)), p.endswith("*")
+
+
+def _alts(p) -> list[str]:
+    return [str(x).lower() for x in (p if isinstance(p, list) else [p])]
+
+
+def _tail_matches(toks: list[str], i: int, words: tuple[str, ...], is_prefix: bool) -> bool:
+    last = len(words) - 1
+    for j in range(1, last):
+        if toks[i + j] != words[j]:
+            return False
+    return toks[i + last].startswith(words[last]) if is_prefix else toks[i + last] == words[last]
+
+
+class RuleSet:
+    """Block / hint / penalty rules (see src/rules.json) compiled into a word-level automaton."""
+
+    def __init__(self, spec: dict):
+        self.base = int(spec.get("base", 50))
+        self.verified_bonus = int(spec.get("verified_bonus", 20))
+        self.https_bonus = int(spec.get("https_bonus", 5))
+        lt = spec.get("long_text") or {}
+        self.long_min = int(lt.get("min_chars", 220))
+        self.long_weight = int(lt.get("weight", 0))
+
+        self.block = [str(p).lower() for p in spec.get("block", [])]
+        self.hints = [(_alts(h["pattern"]), int(h["weight"])) for h in spec.get("hints", [])]
+        self.penalties = [
+            (_alts(h["pattern"]), int(h["weight"]), [str(u).lower() for u in h.get("unless", [])])
+            for h in spec.get("penalties", [])
+        ]
+
+        # pattern -> rules it triggers, so evaluation walks the hits, not the rule list
+        self._block_set = frozenset(self.block)
+        self._hint_of: dict[str, list[int]] = {}
+        self._penalty_of: dict[str, list[int]] = {}
+        for n, (ps, _) in enumerate(self.hints):
+            for p in ps:
+                self._hint_of.setdefault(p, []).append(n)
+        for n, (ps, _, _) in enumerate(self.penalties):
+            for p in ps:
+                self._penalty_of.setdefault(p, []).append(n)
+        patterns = set(self.block) | set(self._hint_of) | set(self._penalty_of)
+        for _, _, unless in self.penalties:
+            patterns.update(unless)
+        # first word -> [(words, is_prefix, pattern)]; prefix length -> {prefix: [...]} for `word*`
+        self._by_word: dict[str, list[tuple[tuple[str, ...], bool, str]]] = {}
+        self._by_prefix: dict[int, dict[str, list[tuple[tuple[str, ...], bool, str]]]] = {}
+        for p in patterns:
+            words, is_prefix = _words(p)
+            if not words:
+                continue
+            entry = (words, is_prefix, p)
+            if is_prefix and len(words) == 1:
+                self._by_prefix.setdefault(len(words[0]), {}).setdefault(words[0], []).append(entry)
+            else:
+                self._by_word.setdefault(words[0], []).append(entry)
+        self._scan = lru_cache(maxsize=4096)(self._scan_uncached)
+
+    @classmethod
+    def from_file(cls, path: str | Path) -> "RuleSet":
+        with open(path, "r", encoding="utf-8") as fh:
+            return cls(json.load(fh))
+
+    def _scan_uncached(self, text: str) -> frozenset[str]:
+        toks = _WORD_RE.findall(text.lower())
+        found = set()
+        by_word, by_prefix = self._by_word, self._by_prefix
+        n = len(toks)
+        for i, tok in enumerate(toks):
+            cands = by_word.get(tok)
+            if cands:
+                for words, is_prefix, p in cands:
+                    k = len(words)
+                    if k == 1:
+                        found.add(p)
+                    elif i + k <= n and _tail_matches(toks, i, words, is_prefix):
+                        found.add(p)
+            for plen, table in by_prefix.items():
+                for _, _, p in table.get(tok[:plen], ()):
+                    found.add(p)
+        return frozenset(found)
+
+    def hits(self, text: str | None) -> frozenset[str]:
+        """Every rule pattern present in text (one pass over its words, memoized per text)."""
+        return self._scan(text or "")
+
+    def blocked(self, text: str | None) -> bool:
+        return not self._block_set.isdisjoint(self.hits(text))
+
+    def _text_features(self, t: str, h: frozenset[str]) -> dict[str, int]:
+        out = {}
+        for n in sorted({n for p in h for n in self._hint_of.get(p, ())}):
+            ps, w = self.hints[n]
+            out[f"hint:{ps[0]}"] = w
+        if self.long_weight and len(" ".join(t.split())) > self.long_min:
+            out["long_text"] = self.long_weight
+        for n in sorted({n for p in h for n in self._penalty_of.get(p, ())}):
+            ps, w, unless = self.penalties[n]
+            if not any(u in h for u in unless):
+                out[f"penalty:{ps[0]}"] = w
+        return out
+
+    def features(self, text: str | None, official_url: str | None, verified: bool) -> dict[str, int]:
+        """Per-feature score contributions; the score is their clamped sum."""
+        t = text or ""
+        out = {"base": self.base}
+        if verified:
+            out["verified"] = self.verified_bonus
+        if official_url and official_url.startswith("https://"):
+            out["https"] = self.https_bonus
+        out.update(self._text_features(t, self.hits(t)))
+        return out
+
+    def feature_columns(self, texts: list[str | None], official_urls: list[str | None],
+                        verified: list[bool]) -> dict[str, list[int]]:
+        """features() for a whole batch, one column per feature, bypassing the per-text memo."""
+        n = len(texts)
+        cols: dict[str, list[int]] = {
+            "base": [self.base] * n,
+            "verified": [self.verified_bonus if v else 0 for v in verified],
+            "https": [self.https_bonus if (u and u.startswith("https://")) else 0 for u in official_urls],
+        }
+        for i, text in enumerate(texts):
+            t = text or ""
+            for k, w in self._text_features(t, self._scan_uncached(t)).items():
+                col = cols.get(k)
+                if col is None:
+                    col = cols[k] = [0] * n
+                col[i] = w
+        return cols
+
+    def score(self, text: str | None, official_url: str | None, verified: bool) -> int:
+        return max(0, min(100, sum(self.features(text, official_url, verified).values())))
+
+
+_default: RuleSet | None = None
+
+
+def default_rules() -> RuleSet:
+    """Rules from RULES_PATH (env) or the bundled src/rules.json, loaded once per process."""
+    global _default
+    if _default is None:
+        _default = RuleSet.from_file(os.getenv("RULES_PATH", "").strip() or DEFAULT_RULES_PATH)
+    return _default
@@ -1,34 +1,34 @@
-import re
+from src.rules import default_rules
+from src import instrument
 
-BLOCK_PATTERNS = [
-    "seed phrase", "private key", "send usdt", "send eth", "activation fee",
-    "processing fee", "gift card", "guaranteed profit"
-]
+try:  # optional: vectorized sum/clip for large batches
+    import numpy as np
+except ImportError:  # pragma: no cover
+    np = None
 
-GOOD_HINTS = ["docs", "official", "blog", "github", "mirror", "snapshot", "quest", "points"]
+# Rule data lives in src/rules.json (override with RULES_PATH); kept here for reference/imports.
+BLOCK_PATTERNS = default_rules().block
 
-def hard_block(text: str) -> bool:
-    t = (text or "").lower()
-    return any(p in t for p in BLOCK_PATTERNS)
-
-def score(text: str, official_url: str | None, verified: bool) -> int:
-    t = (text or "").lower()
-    s = 50
-
-    if verified:
-        s += 20
+GOOD_HINTS = [ps[0] for ps, _ in default_rules().hints]
 
-    for h in GOOD_HINTS:
-        if h in t:
-            s += 6
-
-    if official_url and official_url.startswith("https://"):
-        s += 5
-
-    if len(re.sub(r"\s+", " ", t)) > 220:
-        s += 8
+def hard_block(text: str) -> bool:
+    return default_rules().blocked(text)
 
-    if "dm" in t and "link" not in t:
-        s -= 8
+def score_features(text: str, official_url: str | None, verified: bool) -> dict[str, int]:
+    return default_rules().features(text, official_url, verified)
 
-    return max(0, min(100, s))
+def score(text: str, official_url: str | None, verified: bool) -> int:
+    return default_rules().score(text, official_url, verified)
+
+def score_batch(texts: list[str | None], official_urls: list[str | None],
+                verified: list[bool]) -> tuple[list[int], dict[str, list[int]]]:
+    """Score many candidates at once. Returns (scores, {feature: per-row points})."""
+    with instrument.stage("scoring"):
+        cols = default_rules().feature_columns(texts, official_urls, verified)
+        if not texts:
+            return [], cols
+        if np is not None:
+            m = np.asarray(list(cols.values()), dtype=np.int32)
+            return np.clip(m.sum(axis=0), 0, 100).tolist(), cols
+        sums = [sum(vals) for vals in zip(*cols.values())]
+        return [max(0, min(100, x)) for x in sums], cols
@@ -1,9 +1,16 @@
 from __future__ import annotations
+import codecs
 import re
+import time
 import requests
+from concurrent.futures import ThreadPoolExecutor
 from urllib.parse import urlparse
 import tweepy
 
+from src.net import HttpClient, default_http
+from src.ratelimit import RateLimited
+from src import instrument
+
 SHORTENERS = {
     "bit.ly","t.co","tinyurl.com","goo.gl","ow.ly","buff.ly","cutt.ly","is.gd","rebrand.ly","linktr.ee"
 }
@@ -40,38 +47,122 @@ def domain_allowed(allowlist: list[str], domain: str | None) -> bool:
         return False
     return any(d == a or d.endswith("." + a) for a in allowlist)
 
-def fetch_html(url: str) -> str:
-    r = requests.get(url, timeout=12, headers={"User-Agent":"Mozilla/5.0"})
-    r.raise_for_status()
-    return r.text[:400_000]
+FETCH_MAX_BYTES = 400_000
+FETCH_CHUNK = 16_384
+SCAN_OVERLAP = 512  # chars carried between chunks so a tag split across them still matches
 
-def extract_x_handle_from_html(html: str) -> str | None:
-    patterns = [
-        r'https?://(?:www\.)?x\.com/([A-Za-z0-9_]{2,15})(?!/status)',
-        r'https?://(?:www\.)?twitter\.com/([A-Za-z0-9_]{2,15})(?!/status)',
-    ]
-    for p in patterns:
-        m = re.search(p, html, re.IGNORECASE)
-        if m:
-            return m.group(1)
+# Most authoritative first: twitter:site/creator meta, then rel=me links, then any profile link.
+HANDLE_PATTERNS = [
+    re.compile(r'<meta[^>]+(?:name|property)=["\']twitter:(?:site|creator)["\'][^>]*?content=["\']@?([A-Za-z0-9_]{1,15})["\']', re.I),
+    re.compile(r'<meta[^>]+content=["\']@?([A-Za-z0-9_]{1,15})["\'][^>]*?(?:name|property)=["\']twitter:(?:site|creator)["\']', re.I),
+    re.compile(r'<(?:a|link)[^>]+rel=["\'][^"\']*\bme\b[^"\']*["\'][^>]*?href=["\']https?://(?:www\.|mobile\.)?(?:x|twitter)\.com/@?([A-Za-z0-9_]{1,15})(?![A-Za-z0-9_])', re.I),
+    re.compile(r'<(?:a|link)[^>]+href=["\']https?://(?:www\.|mobile\.)?(?:x|twitter)\.com/@?([A-Za-z0-9_]{1,15})(?![A-Za-z0-9_])[^>]*?rel=["\'][^"\']*\bme\b', re.I),
+    re.compile(r'https?://(?:www\.|mobile\.)?(?:x|twitter)\.com/(?:#!/)?@?([A-Za-z0-9_]{2,15})(?![A-Za-z0-9_])(?!/status)', re.I),
+]
+NOT_HANDLES = {"intent", "share", "home", "i", "search", "hashtag", "explore", "login", "signup", "settings", "privacy", "tos"}
+
+def _is_html(content_type: str | None) -> bool:
+    ct = (content_type or "").lower()
+    return not ct or "html" in ct or "xml" in ct
+
+def _open(http: HttpClient | None, url: str, etag: str | None, last_modified: str | None):
+    headers = {}
+    if etag:
+        headers["If-None-Match"] = etag
+    if last_modified:
+        headers["If-Modified-Since"] = last_modified
+    return (http or default_http()).open(url, headers)
+
+def _iter_text(r: requests.Response, max_bytes: int, deadline: float):
+    """Decoded text chunks of the body, stopping after max_bytes raw bytes or at deadline."""
+    dec = codecs.getincrementaldecoder(r.encoding or "utf-8")(errors="replace")
+    got = 0
+    for chunk in r.iter_content(chunk_size=FETCH_CHUNK):
+        if not chunk:
+            continue
+        chunk = chunk[:max_bytes - got]
+        got += len(chunk)
+        yield dec.decode(chunk)
+        if got >= max_bytes or time.monotonic() > deadline:
+            return
+    yield dec.decode(b"", final=True)
+
+def _deadline(http: HttpClient | None) -> float:
+    return time.monotonic() + (http or default_http()).total_timeout
+
+def fetch_page(url: str, etag: str | None = None, last_modified: str | None = None,
+               max_bytes: int = FETCH_MAX_BYTES, http: HttpClient | None = None) -> tuple[int, str, str | None, str | None]:
+    """GET with optional conditional headers. Returns (status, html, etag, last_modified)."""
+    with _open(http, url, etag, last_modified) as r:
+        if r.status_code == 304:
+            return (304, "", etag, last_modified)
+        r.raise_for_status()
+        ok = _is_html(r.headers.get("Content-Type"))
+        html = "".join(_iter_text(r, max_bytes, _deadline(http))) if ok else ""
+        return (r.status_code, html, r.headers.get("ETag"), r.headers.get("Last-Modified"))
+
+def fetch_html(url: str, http: HttpClient | None = None) -> str:
+    return fetch_page(url, http=http)[1]
+
+def _find_handle(text: str) -> str | None:
+    for p in HANDLE_PATTERNS:
+        for m in p.finditer(text):
+            if m.group(1).lower() not in NOT_HANDLES:
+                return m.group(1)
     return None
 
-def user_profile_matches_domain(client: tweepy.Client, username: str, domain: str) -> bool:
-    resp = client.get_user(username=username, user_fields=["description","url","entities"])
-    if not resp or not resp.data:
+def extract_x_handle_from_html(html: str) -> str | None:
+    return _find_handle(html)
+
+def scan_page_for_handle(url: str, etag: str | None = None, last_modified: str | None = None,
+                         max_bytes: int = FETCH_MAX_BYTES,
+                         http: HttpClient | None = None) -> tuple[int, str | None, str | None, str | None]:
+    """
+    fetch_page + extract_x_handle_from_html, stopping at the first handle or max_bytes.
+    Returns (status, handle, etag, last_modified).
+    """
+    with _open(http, url, etag, last_modified) as r:
+        if r.status_code == 304:
+            return (304, None, etag, last_modified)
+        r.raise_for_status()
+        validators = (r.headers.get("ETag"), r.headers.get("Last-Modified"))
+        if not _is_html(r.headers.get("Content-Type")):
+            return (r.status_code, None) + validators
+
+        tail = ""
+        for text in _iter_text(r, max_bytes, _deadline(http)):
+            window = tail + text
+            handle = _find_handle(window)
+            if handle:
+                return (r.status_code, handle) + validators
+            tail = window[-SCAN_OVERLAP:]
+        return (r.status_code, None) + validators
+
+USER_FIELDS = ["description", "url", "entities"]
+USER_LOOKUP_BATCH = 100  # max usernames per GET /2/users/by
+
+def profile_from_user(u) -> dict:
+    return {
+        "username": getattr(u, "username", None),
+        "url": getattr(u, "url", None),
+        "description": getattr(u, "description", None),
+        "entities": getattr(u, "entities", None),
+    }
+
+def profile_matches_domain(profile: dict | None, domain: str) -> bool:
+    if not profile:
         return False
-    u = resp.data
 
     urls = []
-    if getattr(u, "url", None):
-        urls.append(u.url)
-    ent = getattr(u, "entities", None) or {}
+    if profile.get("url"):
+        urls.append(profile["url"])
+    ent = profile.get("entities") or {}
     if "url" in ent and ent["url"] and "urls" in ent["url"]:
         for x in ent["url"]["urls"]:
             if x.get("expanded_url"):
                 urls.append(x["expanded_url"])
 
-    desc = (getattr(u, "description", "") or "").lower()
+    desc = (profile.get("description") or "").lower()
 
     for uurl in urls:
         if domain in (host(uurl) or ""):
@@ -80,22 +171,125 @@ def user_profile_matches_domain(client: tweepy.Client, username: str, domain: st
         return True
     return False
 
-def verify_official(client: tweepy.Client, official_url: str) -> tuple[bool, str | None, str | None]:
+def user_profile_matches_domain(client: tweepy.Client, username: str, domain: str) -> bool:
+    resp = client.get_user(username=username, user_fields=USER_FIELDS)
+    if not resp or not resp.data:
+        return False
+    return profile_matches_domain(profile_from_user(resp.data), domain)
+
+def lookup_profiles(client: tweepy.Client, usernames: list[str]) -> tuple[dict[str, dict], set[str], set[str]]:
+    """
+    Resolve usernames in batched user lookups.
+    Returns ({username: profile}, {failed usernames}, {usernames skipped on rate limit}), lower-cased.
+    """
+    found: dict[str, dict] = {}
+    failed: set[str] = set()
+    names = sorted({u.lower() for u in usernames if u})
+    for start in range(0, len(names), USER_LOOKUP_BATCH):
+        chunk = names[start:start + USER_LOOKUP_BATCH]
+        try:
+            with instrument.stage("handle_lookup"):
+                resp = client.get_users(usernames=chunk, user_fields=USER_FIELDS)
+        except RateLimited:
+            return found, failed, set(names[start:])
+        except Exception:
+            failed.update(chunk)
+            continue
+        for u in (resp.data or []) if resp else []:
+            p = profile_from_user(u)
+            if p["username"]:
+                found[p["username"].lower()] = p
+    return found, failed, set()
+
+def fetch_handle(official_url: str, cached=None, max_bytes: int = FETCH_MAX_BYTES,
+                 http: HttpClient | None = None) -> dict:
+    """
+    Fetch the page (conditionally, given an expired `cached` row) and extract the handle.
+    Returns a verify_cache row; outcome "lookup" still needs the profile match.
+    """
     d = host(official_url)
+    res = {"domain": d, "url": official_url, "handle": None, "verified": False, "outcome": "error",
+           "http_status": None, "etag": None, "last_modified": None}
     if not d:
-        return (False, None, None)
+        return res
+
+    etag = last_modified = None
+    if cached is not None and (cached["etag"] or cached["last_modified"]):
+        official_url = cached["url"] or official_url
+        etag, last_modified = cached["etag"], cached["last_modified"]
+        res["url"] = official_url
 
     try:
-        html = fetch_html(official_url)
+        with instrument.stage("fetch_page"):
+            status, handle, res["etag"], res["last_modified"] = scan_page_for_handle(
+                official_url, etag, last_modified, max_bytes, http
+            )
+        res["http_status"] = status
+    except requests.HTTPError as e:
+        res["http_status"] = e.response.status_code if e.response is not None else None
+        return res
     except Exception:
-        return (False, d, None)
+        return res
+
+    if status == 304:
+        # page unchanged -> same handle, but the cached verdict has run out, so
+        # its profile is checked again; only "no handle on the page" carries over
+        if cached["handle"]:
+            res["handle"] = cached["handle"]
+            res["outcome"] = "lookup"
+        elif cached["outcome"] == "no_handle":
+            res["outcome"] = "no_handle"
+        else:
+            res["etag"] = res["last_modified"] = None  # nothing to carry over: fetch in full next time
+        return res
 
-    handle = extract_x_handle_from_html(html)
     if not handle:
-        return (False, d, None)
+        res["outcome"] = "no_handle"
+        return res
+    res["handle"] = handle
+    res["outcome"] = "lookup"
+    return res
 
-    try:
-        ok = user_profile_matches_domain(client, handle, d)
-        return (ok, d, handle)
-    except Exception:
-        return (False, d, handle)
+def verify_many(client: tweepy.Client, jobs: list[tuple[str, object]], workers: int,
+                known_profiles: dict[str, dict] | None = None, max_bytes: int = FETCH_MAX_BYTES,
+                http: HttpClient | None = None) -> list[dict]:
+    """
+    Verify (url, cached_row) jobs: pages on a thread pool, then batched handle lookups.
+    Returns verify_cache rows in input order; rate_limited ones are not to be cached.
+    """
+    if not jobs:
+        return []
+    workers = max(1, min(workers, len(jobs)))
+    if workers == 1:
+        results = [fetch_handle(u, c, max_bytes, http) for u, c in jobs]
+    else:
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            results = list(pool.map(lambda j: fetch_handle(j[0], j[1], max_bytes, http), jobs))
+
+    known = known_profiles or {}
+    pending = [r for r in results if r["outcome"] == "lookup"]
+    missing = [r["handle"] for r in pending if r["handle"].lower() not in known]
+    profiles, failed, limited = lookup_profiles(client, missing) if missing else ({}, set(), set())
+    profiles.update(known)
+
+    for r in pending:
+        h = r["handle"].lower()
+        if h in limited and h not in profiles:
+            r["outcome"] = "rate_limited"
+            continue
+        if h in failed:
+            r["outcome"] = "error"
+            continue
+        r["verified"] = profile_matches_domain(profiles.get(h), r["domain"])
+        r["outcome"] = "verified" if r["verified"] else "no_match"
+    for r in results:
+        instrument.count("verify_" + r["outcome"])
+    return results
+
+def check_official(client: tweepy.Client, official_url: str, cached=None, http: HttpClient | None = None) -> dict:
+    return verify_many(client, [(official_url, cached)], 1, http=http)[0]
+
+def verify_official(client: tweepy.Client, official_url: str,
+                    http: HttpClient | None = None) -> tuple[bool, str | None, str | None]:
+    r = check_official(client, official_url, http=http)
+    return (r["verified"], r["domain"], r["handle"])
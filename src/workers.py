@@ -0,0 +1,223 @@
+from __future__ import annotations
+import os
+import signal
+import socket
+import threading
+import time
+from pathlib import Path
+
+from src.db import (
+    connect, enqueue_work, lease_work, finish_work, renew_work, release_work, work_counts, work_posted,
+    add_work_posted, acquire_lease, release_lease, update_shard_stats,
+)
+from src.bot import (
+    make_read_client, make_write_clients, make_http, search_pass, union_keywords, process_candidates,
+    prefetch_verification, resume_posts, maybe_prune, api_calls_since, write_report, emit,
+)
+from src.config import load_accounts
+from src.ratelimit import RateLimiter, RateLimited
+from src.x_search import matches_keywords
+from src import instrument
+
+
+# X calls in one posted thread (media upload, four tweets, self-reply), each of which
+# may wait up to WORK_POST_WAIT_S for its rate window plus this long for the call itself
+POST_CALLS_MAX = 6
+POST_CALL_ALLOWANCE_S = 30.0
+
+
+class LeaseLost(RuntimeError):
+    pass
+
+
+def leader_lease(a) -> str:
+    return f"post_leader:{a.account or 'default'}"
+
+
+def worst_post_s(cfg) -> float:
+    """Longest one fenced post can take; the leader lease has to outlive it."""
+    return POST_CALLS_MAX * (cfg.work_post_wait_s + POST_CALL_ALLOWANCE_S)
+
+
+def hold_lead(cfg, shared, name: str, owner: str) -> None:
+    """Renew the leader lease for another WORK_LEADER_TTL_S, or raise LeaseLost if another worker has it."""
+    if not acquire_lease(shared, name, owner, cfg.work_leader_ttl_s):
+        raise LeaseLost(name)
+
+
+def produce(cfg) -> int:
+    """MODE=produce: one search pass whose candidates go to the work queue, one item per matching account."""
+    profiles = load_accounts(cfg) or [cfg]
+    try:
+        read_client = make_read_client(cfg, RateLimiter())
+    except Exception as e:
+        print(str(e))
+        return 2
+
+    conn = connect()
+    rec = instrument.reset("produce")
+    limiter = getattr(read_client, "limiter", None)
+    calls_before = dict(limiter.calls) if limiter is not None else {}
+    candidates, shard_runs = search_pass(cfg, read_client, conn, union_keywords(profiles))
+    run_id, added = enqueue_work(conn, {
+        a.account: [c for c in candidates if not cfg.accounts or matches_keywords(c["text"], a.keywords)]
+        for a in profiles
+    })
+    # the candidates are durable in the work queue, so the high-water marks can move on
+    update_shard_stats(conn, shard_runs)
+    maybe_prune(cfg, conn)
+
+    counts = work_counts(conn)
+    print(f"Produced work run {run_id}: {added} new item(s) from {len(candidates)} candidates; queue "
+          + ", ".join(f"{k}={v}" for k, v in sorted(counts.items())))
+    write_report(cfg, rec, api_calls_since(limiter, calls_before), candidates=len(candidates),
+                 work_run=run_id, work_items=added, work_queue=counts)
+    emit(cfg, conn, "work_produced", ref=run_id, value=added)
+    return 0
+
+
+def lead_batch(cfg, a, clients, conn, shared, http, owner: str) -> tuple[int, int, int, int] | None:
+    """
+    As posting leader of account a, score/queue/post a leased batch of a's items.
+    Returns (items, posted, queued, rejected), None when there was nothing to do.
+    """
+    run_id, items = lease_work(shared, owner, cfg.work_batch, cfg.work_lease_s, ("verified",),
+                               account=a.account, max_attempts=cfg.work_max_attempts)
+    if not items:
+        run_id, items = lease_work(shared, owner, cfg.work_batch, cfg.work_lease_s, ("ready",),
+                                   account=a.account, max_attempts=cfg.work_max_attempts)
+    if not items:
+        return None
+
+    def fence() -> None:
+        hold_lead(cfg, shared, leader_lease(a), owner)
+        renew_work(shared, owner, items, cfg.work_lease_s)
+        add_work_posted(shared, run_id, a.account, 1)
+
+    budget = max(0, a.max_posts_per_run - work_posted(shared, run_id, a.account))
+    deferred: list[dict] = []
+    try:
+        posted, queued, rejected = process_candidates(a, clients, conn, http, items, vconn=shared,
+                                                      max_posts=budget, before_post=fence, deferred=deferred)
+    except (LeaseLost, RateLimited) as e:
+        # not the batch's fault: hand it back without using up an attempt
+        release_work(shared, owner, items)
+        print(f"[work {owner}] {a.account or 'default'}: batch stopped ({e!r}), {len(items)} items released")
+        if isinstance(e, LeaseLost):
+            raise
+        return None  # counts as idle, so the loop backs off before the next try
+    except Exception as e:
+        # the attempt counts, so a batch that keeps failing ends up failed after WORK_MAX_ATTEMPTS
+        release_work(shared, owner, items, count_attempt=True)
+        print(f"[work {owner}] {a.account or 'default'}: batch failed ({e!r}), {len(items)} items released")
+        return None
+    # items left unverified by a rate-limited lookup go back to the queue as they were
+    release_work(shared, owner, deferred)
+    finish_work(shared, owner, items)
+    if len(deferred) == len(items):
+        return None  # nothing could be done before the lookup window resets: back off
+    return len(items) - len(deferred), posted, queued, rejected
+
+
+def verify_batch(cfg, profiles: dict, read_client, shared, http, owner: str) -> int | None:
+    """Pre-verify a leased batch into the shared verify_cache. Returns urls verified, None when idle."""
+    _, items = lease_work(shared, owner, cfg.work_batch, cfg.work_lease_s, ("ready",),
+                          max_attempts=cfg.work_max_attempts)
+    if not items:
+        return None
+    n = 0
+    for account, a in profiles.items():
+        mine = [c for c in items if c["account"] == account]
+        if mine:
+            n += prefetch_verification(a, read_client, shared, http, mine)
+    finish_work(shared, owner, items, "verified")
+    return n
+
+
+def work(cfg, stop=None) -> int:
+    """MODE=work: one of any number of worker processes draining the work queue."""
+    if cfg.work_leader_ttl_s <= worst_post_s(cfg):
+        print(f"WORK_LEADER_TTL_S ({cfg.work_leader_ttl_s:g}s) must be longer than the worst-case post "
+              f"({worst_post_s(cfg):g}s: {POST_CALLS_MAX} calls x (WORK_POST_WAIT_S + {POST_CALL_ALLOWANCE_S:g}s))")
+        return 2
+    owner = cfg.worker_id or f"{socket.gethostname()}:{os.getpid()}"
+    profiles = load_accounts(cfg) or [cfg]
+    try:
+        # search/lookup limits are per app, posting limits per account; posting never waits
+        # longer than WORK_POST_WAIT_S, so a fenced post always ends within the leader lease
+        read_client = make_read_client(cfg, RateLimiter())
+        write_clients = [make_write_clients(a, RateLimiter(max_post_wait_s=cfg.work_post_wait_s)) for a in profiles]
+    except Exception as e:
+        print(str(e))
+        return 2
+
+    shared = connect()
+    accounts = [(a, (read_client,) + wc, connect(Path(a.account_db_path)) if cfg.accounts else shared)
+                for a, wc in zip(profiles, write_clients)]
+    http = make_http(cfg)
+    stop = stop or threading.Event()
+    if threading.current_thread() is threading.main_thread():
+        signal.signal(signal.SIGTERM, lambda *_: stop.set())
+        signal.signal(signal.SIGINT, lambda *_: stop.set())
+
+    rec = instrument.reset("work")
+    limiter = getattr(read_client, "limiter", None)
+    calls_before = dict(limiter.calls) if limiter is not None else {}
+    totals = {"items": 0, "verified": 0, "posted": 0, "queued": 0, "rejected": 0}
+    leading: set[str] = set()
+    idle_since = time.monotonic()
+    print(f"[work {owner}] started for {len(accounts)} account(s)")
+    try:
+        while not stop.is_set():
+            busy = False
+            for a, clients, conn in accounts:
+                name = leader_lease(a)
+                if not acquire_lease(shared, name, owner, cfg.work_leader_ttl_s):
+                    if name in leading:
+                        leading.discard(name)
+                        print(f"[work {owner}] lost {name}")
+                    continue
+                if name not in leading:
+                    leading.add(name)
+                    print(f"[work {owner}] took {name}")
+                    if not a.dry_run:
+                        resume_posts(a, conn, clients[1], clients[2],
+                                     before_post=lambda: hold_lead(cfg, shared, name, owner))
+                try:
+                    res = lead_batch(cfg, a, clients, conn, shared, http, owner)
+                except LeaseLost:
+                    leading.discard(name)
+                    print(f"[work {owner}] lost {name}")
+                    continue
+                if res is None:
+                    continue
+                busy = True
+                n, posted, queued, rejected = res
+                for k, v in zip(("items", "posted", "queued", "rejected"), res):
+                    totals[k] += v
+                print(f"[work {owner}] {a.account or 'default'}: {n} items, posted {posted} | queued {queued} | "
+                      f"rejected {rejected}")
+                if cfg.accounts:
+                    maybe_prune(a, conn)
+            if not busy:
+                n = verify_batch(cfg, {a.account: a for a, _, _ in accounts}, read_client, shared, http, owner)
+                if n is not None:
+                    busy = True
+                    totals["verified"] += n
+                    print(f"[work {owner}] pre-verified {n} url(s)")
+            if busy:
+                idle_since = time.monotonic()
+                continue
+            if cfg.work_idle_exit_s and time.monotonic() - idle_since >= cfg.work_idle_exit_s:
+                break
+            stop.wait(cfg.work_poll_s)
+    finally:
+        for name in leading:
+            release_lease(shared, name, owner)
+        http.close()
+
+    print(f"[work {owner}] done. items {totals['items']} | pre-verified {totals['verified']} | "
+          f"posted {totals['posted']} | queued {totals['queued']} | rejected {totals['rejected']}")
+    report = write_report(cfg, rec, api_calls_since(limiter, calls_before), worker=owner, **totals)
+    emit(cfg, shared, "work_done", owner, value=report["duration_s"])
+    return 0
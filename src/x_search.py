@@ -1,35 +1,214 @@
 from __future__ import annotations
+import hashlib
+import time
 import tweepy
+from concurrent.futures import ThreadPoolExecutor
 from typing import Any
 
+from src.verify import USER_FIELDS, profile_from_user
+from src.ratelimit import RateLimited
+from src import instrument
+
+QUERY_MAX_LEN = 512  # recent search query length limit (basic/pro access)
+
+def _kw(k: str) -> str:
+    return f'"{k}"' if " " in k else k
+
 def build_query(keywords: list[str], lang: str) -> str:
-    or_kw = " OR ".join([f'"{k}"' if " " in k else k for k in keywords])
+    or_kw = " OR ".join([_kw(k) for k in keywords])
     return f"({or_kw}) -is:retweet -is:reply lang:{lang}"
 
-def search_candidates(client: tweepy.Client, keywords: list[str], lang: str, max_results: int) -> list[dict[str, Any]]:
-    q = build_query(keywords, lang)
-    resp = client.search_recent_tweets(
-        query=q,
-        max_results=min(max_results, 100),
-        tweet_fields=["created_at", "text", "entities", "author_id"],
-        expansions=["author_id"],
-    )
-    users = {u.id: u for u in (resp.includes.get("users", []) if resp and resp.includes else [])}
+def build_queries(keywords: list[str], lang: str, max_len: int = QUERY_MAX_LEN) -> tuple[list[str], list[str]]:
+    """
+    Pack keywords into as few queries of at most max_len as possible, in order.
+    Returns (queries, keywords too long for a query of their own).
+    """
+    shards: list[list[str]] = []
+    dropped: list[str] = []
+    cur: list[str] = []
+    for k in keywords:
+        if len(build_query(cur + [k], lang)) <= max_len:
+            cur.append(k)
+            continue
+        if cur:
+            shards.append(cur)
+        if len(build_query([k], lang)) > max_len:
+            dropped.append(k)
+            cur = []
+            continue
+        cur = [k]
+    if cur:
+        shards.append(cur)
+    return [build_query(ks, lang) for ks in shards], dropped
+
+def shard_key(query: str) -> str:
+    return hashlib.sha1(query.encode("utf-8")).hexdigest()[:16]
+
+SEARCH_PAGE_MIN = 10   # search_recent_tweets max_results bounds
+SEARCH_PAGE_MAX = 100
+TWITTER_EPOCH_MS = 1288834974657
+RECENT_WINDOW_S = 7 * 24 * 3600 - 3600  # recent search rejects since_id older than 7 days
+
+def tweet_id_time(tweet_id: str | int) -> float:
+    """Unix seconds encoded in a snowflake tweet id."""
+    return ((int(tweet_id) >> 22) + TWITTER_EPOCH_MS) / 1000.0
+
+def usable_since_id(since_id: str | None) -> str | None:
+    if not since_id:
+        return None
+    try:
+        if time.time() - tweet_id_time(since_id) > RECENT_WINDOW_S:
+            return None
+    except ValueError:
+        return None
+    return since_id
+
+TWEET_FIELDS = ["created_at", "text", "entities", "author_id"]
+
+def candidate_from(t, u) -> dict[str, Any]:
+    """Pipeline candidate dict for a tweet and its expanded author (search or stream)."""
+    return {
+        "tweet_id": str(t.id),
+        "text": t.text or "",
+        "author_id": str(t.author_id) if t.author_id else None,
+        "author_username": getattr(u, "username", None),
+        "author_profile": profile_from_user(u) if u is not None else None,
+        "entities": getattr(t, "entities", None),
+    }
+
+def search_query(client: tweepy.Client, q: str, max_results: int,
+                 since_id: str | None = None) -> tuple[list[dict[str, Any]], str | None]:
+    """
+    Page through recent search newer than since_id, up to max_results (in whole pages).
+    Returns (candidates, newest_id).
+    """
+    since_id = usable_since_id(since_id)
     out = []
-    if not resp or not resp.data:
-        return out
-
-    for t in resp.data:
-        u = users.get(t.author_id)
-        out.append({
-            "tweet_id": str(t.id),
-            "text": t.text or "",
-            "author_id": str(t.author_id) if t.author_id else None,
-            "author_username": getattr(u, "username", None),
-            "entities": getattr(t, "entities", None),
-        })
+    newest_id = None
+    next_token = None
+
+    while len(out) < max_results:
+        page_size = max(SEARCH_PAGE_MIN, min(SEARCH_PAGE_MAX, max_results - len(out)))
+        try:
+            with instrument.stage("search_page"):
+                resp = client.search_recent_tweets(
+                    query=q,
+                    max_results=page_size,
+                    since_id=since_id,
+                    next_token=next_token,
+                    tweet_fields=TWEET_FIELDS,
+                    expansions=["author_id"],
+                    user_fields=["username"] + USER_FIELDS,
+                )
+        except RateLimited:
+            break  # out of search budget: keep what this shard got so far
+        if not resp or not resp.data:
+            break
+
+        users = {u.id: u for u in (resp.includes.get("users", []) if resp.includes else [])}
+        for t in resp.data:
+            out.append(candidate_from(t, users.get(t.author_id)))
+            if newest_id is None or int(t.id) > int(newest_id):
+                newest_id = str(t.id)
+
+        next_token = (resp.meta or {}).get("next_token")
+        if not next_token:
+            break
+
+    return out, newest_id
+
+def allocate_budget(total: int, weights: list[float]) -> list[int]:
+    """Split `total` results across shards by weight, at least a page each, never more than `total`."""
+    n = len(weights)
+    if not n:
+        return []
+    if total <= n * SEARCH_PAGE_MIN:
+        return [total // n + (1 if k < total % n else 0) for k in range(n)]
+    w = [max(0.0, x) for x in weights]
+    floored: set[int] = set()
+    while True:
+        free = [k for k in range(n) if k not in floored]
+        left = total - SEARCH_PAGE_MIN * len(floored)
+        wsum = sum(w[k] for k in free)
+        share = {k: left * w[k] / wsum if wsum > 0 else left / len(free) for k in free}
+        low = {k for k, v in share.items() if v < SEARCH_PAGE_MIN}
+        if not low:
+            break
+        floored |= low
+    out = [SEARCH_PAGE_MIN] * n
+    for k, v in share.items():
+        out[k] = int(v)
+    # hand the rounding remainder to the largest fractions
+    for k in sorted(share, key=lambda k: share[k] - int(share[k]), reverse=True)[:total - sum(out)]:
+        out[k] += 1
     return out
 
+def search_candidates(client: tweepy.Client, queries: list[str], max_results: int,
+                      stats: dict[str, Any] | None = None, workers: int = 1) -> tuple[list[dict[str, Any]], list[dict[str, Any]]]:
+    """
+    Run the shard queries the budget has room for and merge the results, newest first.
+    Returns (candidates, shard_runs) for update_shard_stats.
+    """
+    stats = stats or {}
+    keys = [shard_key(q) for q in queries]
+    room = max(1, max_results // SEARCH_PAGE_MIN)
+    if room < len(queries):
+        # not a page per shard: this run takes the shards that have waited longest,
+        # the others keep their since_id and catch up on a later run
+        waited = sorted(range(len(queries)), key=lambda i: (stats[keys[i]]["updated_at"] or "") if keys[i] in stats else "")
+        take = sorted(waited[:room])
+        queries, keys = [queries[i] for i in take], [keys[i] for i in take]
+    weights = []
+    for k in keys:
+        row = stats.get(k)
+        ewma = row["yield_ewma"] if row is not None and row["yield_ewma"] is not None else None
+        # yield is unique results per result fetched; a new shard starts at the best possible one
+        weights.append(ewma if ewma is not None else 1.0)
+    budgets = allocate_budget(max_results, weights)
+
+    def one(i: int):
+        row = stats.get(keys[i])
+        return search_query(client, queries[i], budgets[i], row["since_id"] if row is not None else None)
+
+    workers = max(1, min(workers, len(queries)))
+    if workers == 1:
+        results = [one(i) for i in range(len(queries))]
+    else:
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            results = list(pool.map(one, range(len(queries))))
+
+    # a tweet found by k shards counts 1/k towards each one's unique results,
+    # so the credit does not depend on the order the shards are merged in
+    found: dict[str, int] = {}
+    for tweets, _ in results:
+        for c in tweets:
+            found[c["tweet_id"]] = found.get(c["tweet_id"], 0) + 1
+    merged: dict[str, dict[str, Any]] = {}
+    runs = []
+    for i, (tweets, newest_id) in enumerate(results):
+        for c in tweets:
+            merged.setdefault(c["tweet_id"], c)
+        unique = sum(1 / found[c["tweet_id"]] for c in tweets)
+        runs.append({"shard": keys[i], "query": queries[i], "budget": budgets[i],
+                     "fetched": len(tweets), "unique": unique, "newest_id": newest_id,
+                     "tweet_ids": [c["tweet_id"] for c in tweets]})
+
+    out = sorted(merged.values(), key=lambda c: int(c["tweet_id"]), reverse=True)
+    return out, runs
+
+def hold_back(runs: list[dict[str, Any]], tweet_ids) -> None:
+    """Keep each shard's new since_id below the oldest of tweet_ids it returned, so they are fetched again."""
+    held = set(tweet_ids)
+    for r in runs:
+        mine = [int(t) for t in r["tweet_ids"] if t in held]
+        if mine:
+            r["newest_id"] = str(min(mine) - 1)
+
+def matches_keywords(text: str, keywords: list[str]) -> bool:
+    """Would a search for `keywords` have returned this text (case-insensitive, like recent search)?"""
+    t = (text or "").lower()
+    return any(k.lower() in t for k in keywords)
+
 def extract_best_url(candidate: dict[str, Any]) -> str | None:
     ent = candidate.get("entities") or {}
     urls = ent.get("urls") or []
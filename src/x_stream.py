@@ -0,0 +1,191 @@
+from __future__ import annotations
+import json
+import queue
+import random
+import threading
+import time
+from types import SimpleNamespace
+from typing import Any, Iterator
+
+import requests
+
+from src.verify import USER_FIELDS
+from src.x_search import TWEET_FIELDS, build_queries, candidate_from, shard_key
+
+STREAM_BASE_URL = "https://api.twitter.com"
+STREAM_PATH = "/2/tweets/search/stream"
+RULE_TAG_PREFIX = "kw:"
+# X sends a keep-alive newline every ~20s; a silent connection this long is dead
+STREAM_READ_TIMEOUT = 90.0
+
+# reconnect backoff, as recommended for the v2 stream
+NET_BACKOFF_START, NET_BACKOFF_MAX = 0.25, 16.0        # TCP/IP level errors: linear
+HTTP_BACKOFF_START, HTTP_BACKOFF_MAX = 5.0, 320.0      # HTTP errors: exponential
+RATE_BACKOFF_START = 60.0                              # 429: exponential from a minute
+FATAL_STATUSES = (401, 403)  # bad token / no filtered-stream access: retrying cannot help
+
+
+def build_rules(keywords: list[str], lang: str, max_len: int) -> tuple[list[dict[str, str]], list[str]]:
+    """Tagged stream rules from the KEYWORDS sharding. Returns (rules, keywords too long for a rule)."""
+    queries, dropped = build_queries(keywords, lang, max_len)
+    return [{"value": q, "tag": RULE_TAG_PREFIX + shard_key(q)} for q in queries], dropped
+
+
+class StreamClient:
+    """Minimal v2 filtered stream client; base_url can point at bench/fake_stream.py."""
+
+    def __init__(self, bearer: str, base_url: str = STREAM_BASE_URL, session: requests.Session | None = None,
+                 connect_timeout: float = 5.0, read_timeout: float = STREAM_READ_TIMEOUT):
+        self.url = base_url.rstrip("/") + STREAM_PATH
+        self.session = session or requests.Session()
+        self.session.headers["Authorization"] = f"Bearer {bearer}"
+        self.timeout = (connect_timeout, read_timeout)
+
+    def get_rules(self) -> list[dict]:
+        r = self.session.get(self.url + "/rules", timeout=self.timeout)
+        r.raise_for_status()
+        return r.json().get("data") or []
+
+    def sync_rules(self, rules: list[dict[str, str]]) -> tuple[int, int]:
+        """Make our tagged rules exactly `rules`; rules owned by anything else are left alone. Returns (added, deleted)."""
+        want = {r["value"]: r for r in rules}
+        have = [r for r in self.get_rules() if (r.get("tag") or "").startswith(RULE_TAG_PREFIX)]
+        stale = [r["id"] for r in have if r["value"] not in want]
+        have_values = {r["value"] for r in have}
+        add = [r for v, r in want.items() if v not in have_values]
+        if stale:
+            r = self.session.post(self.url + "/rules", json={"delete": {"ids": stale}}, timeout=self.timeout)
+            r.raise_for_status()
+        if add:
+            r = self.session.post(self.url + "/rules", json={"add": add}, timeout=self.timeout)
+            r.raise_for_status()
+        return len(add), len(stale)
+
+    def connect(self) -> requests.Response:
+        params = {
+            "tweet.fields": ",".join(TWEET_FIELDS),
+            "expansions": "author_id",
+            "user.fields": ",".join(["username"] + USER_FIELDS),
+        }
+        return self.session.get(self.url, params=params, stream=True, timeout=self.timeout)
+
+    @staticmethod
+    def payloads(r: requests.Response) -> Iterator[dict]:
+        for line in r.iter_lines(chunk_size=None):
+            if not line or not line.strip():
+                continue  # keep-alive
+            try:
+                yield json.loads(line)
+            except ValueError:
+                continue
+
+    def close(self) -> None:
+        self.session.close()
+
+
+def candidate_from_payload(p: dict) -> dict[str, Any] | None:
+    """Candidate dict for one stream payload; field access matches the tweepy models search returns."""
+    d = p.get("data")
+    if not isinstance(d, dict) or "id" not in d:
+        return None
+    t = SimpleNamespace(id=d["id"], text=d.get("text"), author_id=d.get("author_id"), entities=d.get("entities"))
+    users = {str(u.get("id")): u for u in (p.get("includes") or {}).get("users", [])}
+    u = users.get(str(d.get("author_id")))
+    return candidate_from(t, SimpleNamespace(**u) if u else None)
+
+
+class StreamIngestor:
+    """Reads the stream on a background thread into a bounded queue; `error` is set on 401/403."""
+
+    def __init__(self, client: StreamClient, queue_max: int = 1000):
+        self.client = client
+        self.q: queue.Queue[dict] = queue.Queue(maxsize=max(1, queue_max))
+        self._stop = threading.Event()
+        self._thread: threading.Thread | None = None
+        self.connects = 0
+        self.received = 0
+        self.error: str | None = None
+
+    def start(self) -> "StreamIngestor":
+        self._thread = threading.Thread(target=self._run, name="stream", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self, timeout: float = 5.0) -> None:
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+
+    def _put(self, c: dict) -> bool:
+        while not self._stop.is_set():
+            try:
+                self.q.put(c, timeout=0.5)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def _sleep(self, s: float) -> None:
+        self._stop.wait(s * random.uniform(0.8, 1.2))
+
+    def _run(self) -> None:
+        net_wait, http_wait = 0.0, 0.0
+        while not self._stop.is_set():
+            try:
+                r = self.client.connect()
+            except (requests.ConnectionError, requests.Timeout) as e:
+                net_wait = min(NET_BACKOFF_MAX, net_wait + NET_BACKOFF_START)
+                print(f"[stream] connect failed ({e.__class__.__name__}), retry in {net_wait:.2f}s")
+                self._sleep(net_wait)
+                continue
+            if r.status_code in FATAL_STATUSES:
+                self.error = f"HTTP {r.status_code}: {r.text[:200]}"
+                print(f"[stream] {self.error}; not retrying")
+                r.close()
+                self._stop.set()
+                return
+            if r.status_code != 200:
+                start = RATE_BACKOFF_START if r.status_code == 429 else HTTP_BACKOFF_START
+                http_wait = min(HTTP_BACKOFF_MAX, http_wait * 2 if http_wait else start)
+                print(f"[stream] HTTP {r.status_code}, retry in {http_wait:.0f}s")
+                r.close()
+                self._sleep(http_wait)
+                continue
+            self.connects += 1
+            net_wait, http_wait = 0.0, 0.0
+            try:
+                for p in self.client.payloads(r):
+                    c = candidate_from_payload(p)
+                    if c is None:
+                        continue
+                    self.received += 1
+                    if not self._put(c):
+                        break
+                    if self._stop.is_set():
+                        break
+            except (requests.ConnectionError, requests.Timeout, requests.exceptions.ChunkedEncodingError) as e:
+                print(f"[stream] disconnected ({e.__class__.__name__})")
+            finally:
+                r.close()
+            if not self._stop.is_set():
+                net_wait = min(NET_BACKOFF_MAX, net_wait + NET_BACKOFF_START)
+                self._sleep(net_wait)
+
+    def drain(self, max_items: int, wait_s: float, linger_s: float = 1.0) -> list[dict]:
+        """
+        Block up to wait_s for the first tweet, then keep collecting for up to
+        linger_s (or until max_items) so bursts are processed as one batch.
+        """
+        out = []
+        try:
+            out.append(self.q.get(timeout=wait_s))
+        except queue.Empty:
+            return out
+        deadline = time.monotonic() + linger_s
+        while len(out) < max_items:
+            left = deadline - time.monotonic()
+            try:
+                out.append(self.q.get(timeout=left) if left > 0 else self.q.get_nowait())
+            except queue.Empty:
+                break
+        return out